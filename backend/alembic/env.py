@@ -2,6 +2,7 @@ from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy import text
 
 from alembic import context
 
@@ -26,6 +27,10 @@ config.set_main_option('sqlalchemy.url', settings.DATABASE_URL + "?async_fallbac
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Ключ advisory-блокировки миграций: параллельные запуски upgrade
+# (несколько контейнеров, серверов) выполняются по очереди
+MIGRATIONS_LOCK = 721_004_020
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -70,6 +75,10 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # Сессионная блокировка снимается при закрытии соединения
+        connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATIONS_LOCK})
+        connection.commit()
+
         context.configure(
             connection=connection, target_metadata=target_metadata
         )
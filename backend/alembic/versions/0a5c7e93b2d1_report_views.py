@@ -0,0 +1,82 @@
+"""report views
+
+Revision ID: 0a5c7e93b2d1
+Revises: f2b6d8a41c73
+Create Date: 2026-10-18 13:48:15.204917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a5c7e93b2d1'
+down_revision: Union[str, None] = 'f2b6d8a41c73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Агрегаты разложены по дням, чтобы фильтр по периоду работал по представлению
+REPORT_VIEWS = {
+    'report_category_units': ('''
+        SELECT product_category_id,
+               date_trunc('day', process_start) AS day,
+               count(*) AS products,
+               coalesce(sum(count), 0) AS units
+        FROM product
+        WHERE process_finish IS NULL
+        GROUP BY product_category_id, date_trunc('day', process_start)
+    ''', ['product_category_id', 'day']),
+    'report_laboratory_products': ('''
+        SELECT test_laboratories.id AS laboratory_id,
+               date_trunc('day', test_laboratories.test_date_start) AS day,
+               count(product.id) AS products
+        FROM test_laboratories
+        JOIN product ON product.laboratory_id = test_laboratories.id
+        GROUP BY test_laboratories.id
+    ''', ['laboratory_id']),
+    'report_product_works': ('''
+        SELECT product.id AS product_id,
+               date_trunc('day', product.process_start) AS day,
+               count(works_with_product.id) AS works
+        FROM product
+        JOIN works_with_product ON works_with_product.product_id = product.id
+        GROUP BY product.id
+    ''', ['product_id']),
+    'report_headcount': ('''
+        SELECT workshop_id, status,
+               sum(engineers) AS engineers,
+               sum(workers) AS workers
+        FROM (
+            SELECT workshop_id, status, count(*) AS engineers, 0 AS workers
+            FROM engineer_personal GROUP BY workshop_id, status
+            UNION ALL
+            SELECT workshop_id, status, 0 AS engineers, count(*) AS workers
+            FROM personal_workers GROUP BY workshop_id, status
+        ) AS headcount
+        GROUP BY workshop_id, status
+    ''', ['workshop_id', 'status']),
+}
+
+
+def upgrade() -> None:
+    for name, (query, key) in REPORT_VIEWS.items():
+        op.execute(f'CREATE MATERIALIZED VIEW {name} AS {query}')
+        # Уникальный индекс нужен для REFRESH ... CONCURRENTLY
+        op.create_index(f'ix_{name}_key', name, key, unique=True)
+
+    refreshes = ''.join(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {name};\n' for name in REPORT_VIEWS)
+    op.execute(f'''
+        CREATE FUNCTION refresh_report_views() RETURNS void AS $$
+        BEGIN
+            {refreshes}
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+
+
+def downgrade() -> None:
+    op.execute('DROP FUNCTION refresh_report_views()')
+    for name in reversed(list(REPORT_VIEWS)):
+        op.execute(f'DROP MATERIALIZED VIEW {name}')
@@ -0,0 +1,152 @@
+"""native dates
+
+Revision ID: 1b8e4f6a9c02
+Revises: 0a5c7e93b2d1
+Create Date: 2026-10-18 14:32:40.118356
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b8e4f6a9c02'
+down_revision: Union[str, None] = '0a5c7e93b2d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FINISH_COLUMNS = (('product', 'process_finish'), ('test_laboratories', 'test_date_finish'))
+BIRTHDAY_TABLES = ('engineer_personal', 'personal_workers', 'personal_laboratories')
+
+# Представление отчета читает process_finish, поэтому на время смены типа его пересоздаем
+CATEGORY_UNITS_VIEW = '''
+    CREATE MATERIALIZED VIEW report_category_units AS
+    SELECT product_category_id,
+           date_trunc('day', process_start) AS day,
+           count(*) AS products,
+           coalesce(sum(count), 0) AS units
+    FROM product
+    WHERE process_finish IS NULL
+    GROUP BY product_category_id, date_trunc('day', process_start)
+'''
+
+# Сколько нераспознанных значений на колонку показывается в ошибке
+UNPARSED_SHOWN = 20
+
+
+def find_unparsed(connection, table: str, column: str, required: bool) -> list:
+    # У необязательной колонки пустая строка — это «нет даты», а не ошибка
+    present = 'true' if required else f"nullif(btrim({column}), '') IS NOT NULL"
+    return connection.execute(sa.text(f'''
+        SELECT id, {column} AS value
+        FROM {table}
+        WHERE {present} AND parse_legacy_timestamp({column}) IS NULL
+        ORDER BY id
+        LIMIT {UNPARSED_SHOWN}
+    ''')).all()
+
+
+def create_category_units_view() -> None:
+    op.execute(CATEGORY_UNITS_VIEW)
+    op.create_index('ix_report_category_units_key', 'report_category_units',
+                    ['product_category_id', 'day'], unique=True)
+
+
+def upgrade() -> None:
+    # Строки без часового пояса считаем UTC, как и process_start/test_date_start
+    op.execute("SET LOCAL TIME ZONE 'UTC'")
+    # Разбирает форматы, которые встречаются в строковых колонках:
+    # ДД.ММ.ГГГГ и ДД/ММ/ГГГГ с необязательным временем, ISO 8601 и все,
+    # что понимает сам Postgres. Нераспознанное значение превращается в NULL,
+    # такие строки ищет find_unparsed до смены типа
+    op.execute(r'''
+        CREATE FUNCTION parse_legacy_timestamp(value text) RETURNS timestamptz AS $$
+        DECLARE
+            time_format text;
+        BEGIN
+            value := nullif(btrim(value), '');
+            IF value IS NULL THEN
+                RETURN NULL;
+            END IF;
+
+            time_format := CASE
+                WHEN value ~ '\d{1,2}:\d{2}:\d{2}$' THEN ' HH24:MI:SS'
+                WHEN value ~ '\d{1,2}:\d{2}$' THEN ' HH24:MI'
+                ELSE ''
+            END;
+            IF value ~ '^\d{1,2}\.\d{1,2}\.\d{4}' THEN
+                RETURN to_timestamp(value, 'DD.MM.YYYY' || time_format);
+            END IF;
+            IF value ~ '^\d{1,2}/\d{1,2}/\d{4}' THEN
+                RETURN to_timestamp(value, 'DD/MM/YYYY' || time_format);
+            END IF;
+
+            RETURN value::timestamptz;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+
+    # NULL в process_finish/test_date_finish значит «в работе»: нераспознанная дата окончания
+    # вернула бы завершенное в отчет незавершенных, а исходная строка была бы потеряна.
+    # Поэтому миграция останавливается и перечисляет такие строки, вместе с нераспознанными birthday
+    connection = op.get_bind()
+    checked = [*((table, column, False) for table, column in FINISH_COLUMNS),
+               *((table, 'birthday', True) for table in BIRTHDAY_TABLES)]
+    problems = [f'{table}.{column}: {row.id} {row.value!r}'
+                for table, column, required in checked
+                for row in find_unparsed(connection, table, column, required)]
+    if problems:
+        raise RuntimeError('Нераспознанные даты, исправьте значения и повторите миграцию:\n'
+                           + '\n'.join(problems))
+
+    op.execute('DROP MATERIALIZED VIEW report_category_units')
+    for table, column in FINISH_COLUMNS:
+        op.alter_column(table, column, server_default=None)
+        op.alter_column(table, column,
+                   existing_type=sa.String(),
+                   type_=sa.DateTime(timezone=True),
+                   existing_nullable=True,
+                   postgresql_using=f'parse_legacy_timestamp({column})')
+
+    for table in BIRTHDAY_TABLES:
+        op.alter_column(table, 'birthday',
+                   existing_type=sa.String(),
+                   type_=sa.Date(),
+                   existing_nullable=False,
+                   postgresql_using='parse_legacy_timestamp(birthday)::date')
+
+    op.execute('DROP FUNCTION parse_legacy_timestamp(text)')
+    create_category_units_view()
+
+    # Время старта растет вместе с id, для него хватает компактного BRIN;
+    # время окончания проставляется позже обновлением, поэтому B-tree
+    op.create_index('ix_product_process_start_brin', 'product', ['process_start'], postgresql_using='brin')
+    op.create_index('ix_test_laboratories_test_date_start_brin', 'test_laboratories', ['test_date_start'],
+                    postgresql_using='brin')
+    op.create_index('ix_product_process_finish', 'product', ['process_finish'])
+    op.create_index('ix_test_laboratories_test_date_finish', 'test_laboratories', ['test_date_finish'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_test_laboratories_test_date_finish', table_name='test_laboratories')
+    op.drop_index('ix_product_process_finish', table_name='product')
+    op.drop_index('ix_test_laboratories_test_date_start_brin', table_name='test_laboratories')
+    op.drop_index('ix_product_process_start_brin', table_name='product')
+
+    for table in BIRTHDAY_TABLES:
+        op.alter_column(table, 'birthday',
+                   existing_type=sa.Date(),
+                   type_=sa.String(),
+                   existing_nullable=False)
+
+    op.execute('DROP MATERIALIZED VIEW report_category_units')
+    for table, column in FINISH_COLUMNS:
+        op.alter_column(table, column,
+                   existing_type=sa.DateTime(timezone=True),
+                   type_=sa.String(),
+                   existing_nullable=True)
+    create_category_units_view()
@@ -0,0 +1,46 @@
+"""trigram search
+
+Revision ID: 2c9d5e7f1a36
+Revises: 1b8e4f6a9c02
+Create Date: 2026-10-18 16:05:12.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c9d5e7f1a36'
+down_revision: Union[str, None] = '1b8e4f6a9c02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Колонки, по которым ищет /search
+SEARCH_COLUMNS = (
+    ('product', 'name'),
+    ('product_category', 'name'),
+    ('personal_category', 'name'),
+    ('workshop', 'name'),
+    ('brigades', 'name'),
+    ('test_laboratories', 'name'),
+    ('tools', 'name'),
+    ('works_with_product', 'name'),
+    ('engineer_personal', 'full_name'),
+    ('personal_workers', 'full_name'),
+    ('personal_laboratories', 'full_name'),
+)
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in SEARCH_COLUMNS:
+        op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    for table, column in SEARCH_COLUMNS:
+        op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+    # Расширение не удаляется: им могут пользоваться объекты вне этой схемы
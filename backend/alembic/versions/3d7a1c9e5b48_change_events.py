@@ -0,0 +1,74 @@
+"""change events
+
+Revision ID: 3d7a1c9e5b48
+Revises: 2c9d5e7f1a36
+Create Date: 2026-10-18 17:20:41.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d7a1c9e5b48'
+down_revision: Union[str, None] = '2c9d5e7f1a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Канал слушает src.events.ChangeFeed
+CHANNEL = 'entity_changes'
+
+EVENT_TABLES = (
+    'product',
+    'product_category',
+    'personal_category',
+    'engineer_personal',
+    'personal_workers',
+    'brigades',
+    'workshop',
+    'test_laboratories',
+    'personal_laboratories',
+    'tools',
+    'works_with_product',
+)
+
+
+def upgrade() -> None:
+    # Полезная нагрузка NOTIFY ограничена 8000 байт: слишком большая строка
+    # уходит без содержимого, только с id, и клиент перечитывает её сам
+    op.execute(f'''
+        CREATE FUNCTION notify_entity_change() RETURNS trigger AS $$
+        DECLARE
+            record_data jsonb;
+            payload text;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                record_data := to_jsonb(OLD);
+            ELSE
+                record_data := to_jsonb(NEW);
+            END IF;
+            payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP),
+                                          'id', record_data->'id', 'row', record_data)::text;
+            IF octet_length(payload) > 7900 THEN
+                payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP),
+                                              'id', record_data->'id')::text;
+            END IF;
+            PERFORM pg_notify('{CHANNEL}', payload);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in EVENT_TABLES:
+        op.execute(f'''
+            CREATE TRIGGER {table}_notify_change
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION notify_entity_change()
+        ''')
+
+
+def downgrade() -> None:
+    for table in reversed(EVENT_TABLES):
+        op.execute(f'DROP TRIGGER {table}_notify_change ON {table}')
+    op.execute('DROP FUNCTION notify_entity_change()')
@@ -0,0 +1,139 @@
+"""soft delete and history
+
+Revision ID: 5a9c3e1f7d24
+Revises: 4e2b8d6f0a17
+Create Date: 2026-10-18 19:10:36.845112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9c3e1f7d24'
+down_revision: Union[str, None] = '4e2b8d6f0a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SOFT_DELETE_TABLES = ('product', 'works_with_product')
+
+LIVE_ROWS = sa.text('deleted_at IS NULL')
+
+# Представления отчетов из 0a5c7e93b2d1, которые читают мягко удаляемые таблицы:
+# (запрос до миграции, запрос после, ключ уникального индекса)
+REPORT_VIEWS = {
+    'report_category_units': ('''
+        SELECT product_category_id,
+               date_trunc('day', process_start) AS day,
+               count(*) AS products,
+               coalesce(sum(count), 0) AS units
+        FROM product
+        WHERE process_finish IS NULL
+        GROUP BY product_category_id, date_trunc('day', process_start)
+    ''', '''
+        SELECT product_category_id,
+               date_trunc('day', process_start) AS day,
+               count(*) AS products,
+               coalesce(sum(count), 0) AS units
+        FROM product
+        WHERE process_finish IS NULL AND deleted_at IS NULL
+        GROUP BY product_category_id, date_trunc('day', process_start)
+    ''', ['product_category_id', 'day']),
+    'report_laboratory_products': ('''
+        SELECT test_laboratories.id AS laboratory_id,
+               date_trunc('day', test_laboratories.test_date_start) AS day,
+               count(product.id) AS products
+        FROM test_laboratories
+        JOIN product ON product.laboratory_id = test_laboratories.id
+        GROUP BY test_laboratories.id
+    ''', '''
+        SELECT test_laboratories.id AS laboratory_id,
+               date_trunc('day', test_laboratories.test_date_start) AS day,
+               count(product.id) AS products
+        FROM test_laboratories
+        JOIN product ON product.laboratory_id = test_laboratories.id
+        WHERE product.deleted_at IS NULL
+        GROUP BY test_laboratories.id
+    ''', ['laboratory_id']),
+    'report_product_works': ('''
+        SELECT product.id AS product_id,
+               date_trunc('day', product.process_start) AS day,
+               count(works_with_product.id) AS works
+        FROM product
+        JOIN works_with_product ON works_with_product.product_id = product.id
+        GROUP BY product.id
+    ''', '''
+        SELECT product.id AS product_id,
+               date_trunc('day', product.process_start) AS day,
+               count(works_with_product.id) AS works
+        FROM product
+        JOIN works_with_product ON works_with_product.product_id = product.id
+        WHERE product.deleted_at IS NULL AND works_with_product.deleted_at IS NULL
+        GROUP BY product.id
+    ''', ['product_id']),
+}
+
+
+def create_report_views(version: int) -> None:
+    for name, (*queries, key) in REPORT_VIEWS.items():
+        op.execute(f'DROP MATERIALIZED VIEW {name}')
+        op.execute(f'CREATE MATERIALIZED VIEW {name} AS {queries[version]}')
+        op.create_index(f'ix_{name}_key', name, key, unique=True)
+
+
+def upgrade() -> None:
+    for table in SOFT_DELETE_TABLES:
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+        # Уникальность имени только среди живых строк
+        op.drop_index(f'ix_{table}_name', table_name=table)
+        op.create_index(f'ix_{table}_name', table, ['name'], unique=True, postgresql_where=LIVE_ROWS)
+        op.create_index(f'ix_{table}_live_id', table, ['id'], postgresql_where=LIVE_ROWS)
+
+    create_report_views(1)
+
+    # Секции по месяцам создает архивация по мере надобности
+    op.create_table('product_history',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.Column('process_start', sa.DateTime(), nullable=False),
+    sa.Column('process_finish', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('product_category_id', sa.Integer(), nullable=False),
+    sa.Column('laboratory_id', sa.Integer(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'process_finish'),
+    postgresql_partition_by='RANGE (process_finish)'
+    )
+    op.create_index('ix_product_history_product_category_id', 'product_history', ['product_category_id'])
+    op.create_table('works_with_product_history',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('product_process_finish', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'product_process_finish'),
+    postgresql_partition_by='RANGE (product_process_finish)'
+    )
+    op.create_index('ix_works_with_product_history_product_id', 'works_with_product_history', ['product_id'])
+
+
+def downgrade() -> None:
+    # Секции удаляются вместе с родительскими таблицами
+    op.drop_index('ix_works_with_product_history_product_id', table_name='works_with_product_history')
+    op.drop_table('works_with_product_history')
+    op.drop_index('ix_product_history_product_category_id', table_name='product_history')
+    op.drop_table('product_history')
+
+    create_report_views(0)
+
+    for table in reversed(SOFT_DELETE_TABLES):
+        # Мягко удаленные строки не вернуть в таблицу без deleted_at
+        op.execute(f'DELETE FROM {table} WHERE deleted_at IS NOT NULL')
+        op.drop_index(f'ix_{table}_live_id', table_name=table)
+        op.drop_index(f'ix_{table}_name', table_name=table, postgresql_where=LIVE_ROWS)
+        op.create_index(f'ix_{table}_name', table, ['name'], unique=True)
+        op.drop_column(table, 'deleted_at')
@@ -0,0 +1,43 @@
+"""soft delete brigades
+
+Revision ID: 6b1d4f8a2c59
+Revises: 5a9c3e1f7d24
+Create Date: 2026-10-18 21:05:12.407318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b1d4f8a2c59'
+down_revision: Union[str, None] = '5a9c3e1f7d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE_ROWS = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    op.add_column('brigades', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    # Бригады уже удаленных продуктов помечаются так же, как это делает удаление продукта
+    op.execute('''
+        UPDATE brigades SET deleted_at = product.deleted_at
+        FROM product
+        WHERE product.id = brigades.product_id AND product.deleted_at IS NOT NULL
+    ''')
+    # Уникальность имени только среди живых строк
+    op.drop_index('ix_brigades_name', table_name='brigades')
+    op.create_index('ix_brigades_name', 'brigades', ['name'], unique=True, postgresql_where=LIVE_ROWS)
+    op.create_index('ix_brigades_live_id', 'brigades', ['id'], postgresql_where=LIVE_ROWS)
+
+
+def downgrade() -> None:
+    # Мягко удаленные строки не вернуть в таблицу без deleted_at
+    op.execute('DELETE FROM brigades WHERE deleted_at IS NOT NULL')
+    op.drop_index('ix_brigades_live_id', table_name='brigades')
+    op.drop_index('ix_brigades_name', table_name='brigades', postgresql_where=LIVE_ROWS)
+    op.create_index('ix_brigades_name', 'brigades', ['name'], unique=True)
+    op.drop_column('brigades', 'deleted_at')
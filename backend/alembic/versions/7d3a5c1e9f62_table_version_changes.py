@@ -0,0 +1,60 @@
+"""table version changes
+
+Revision ID: 7d3a5c1e9f62
+Revises: 6b1d4f8a2c59
+Create Date: 2026-10-18 22:14:03.552910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3a5c1e9f62'
+down_revision: Union[str, None] = '6b1d4f8a2c59'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOLD_CHANGES = '''
+    WITH folded AS (DELETE FROM table_version_changes RETURNING table_name),
+         counts AS (SELECT table_name, count(*) AS changes FROM folded GROUP BY table_name)
+    UPDATE table_versions SET version = version + counts.changes
+    FROM counts
+    WHERE table_versions.table_name = counts.table_name
+'''
+
+
+def upgrade() -> None:
+    op.create_table('table_version_changes',
+    sa.Column('id', sa.BigInteger(), sa.Identity(always=True), nullable=False),
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_table_version_changes_table_name', 'table_version_changes', ['table_name'])
+    # UPDATE строки версии держал её блокировку до commit и выстраивал всех писателей
+    # таблицы в очередь. Вставка в журнал ни с кем не конфликтует, версия — это
+    # table_versions.version плюс число видимых строк журнала
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO table_version_changes (table_name) VALUES (TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+
+
+def downgrade() -> None:
+    op.execute(FOLD_CHANGES)
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    op.drop_index('ix_table_version_changes_table_name', table_name='table_version_changes')
+    op.drop_table('table_version_changes')
@@ -0,0 +1,54 @@
+"""live parent product
+
+Revision ID: 8f4b2d6e1a73
+Revises: 7d3a5c1e9f62
+Create Date: 2026-10-19 10:42:37.190846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f4b2d6e1a73'
+down_revision: Union[str, None] = '7d3a5c1e9f62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHILD_TABLES = ('works_with_product', 'brigades')
+
+
+def upgrade() -> None:
+    # Внешний ключ проверяет только существование продукта, а мягко удаленный продукт
+    # остается в таблице до архивации. Живая работа или бригада у такого продукта
+    # отклоняется той же ошибкой, что и ссылка на несуществующий.
+    # FOR SHARE ждет конкурентное мягкое удаление продукта и читает его результат
+    op.execute('''
+        CREATE FUNCTION reject_deleted_product() RETURNS trigger AS $$
+        DECLARE
+            removed timestamptz;
+        BEGIN
+            SELECT deleted_at INTO removed FROM product WHERE id = NEW.product_id FOR SHARE;
+            IF removed IS NOT NULL THEN
+                RAISE EXCEPTION 'product % is deleted', NEW.product_id
+                    USING ERRCODE = 'foreign_key_violation',
+                          DETAIL = format('Key (product_id)=(%s) is deleted in table "product".', NEW.product_id);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in CHILD_TABLES:
+        op.execute(f'''
+            CREATE TRIGGER {table}_live_product
+            BEFORE INSERT OR UPDATE OF product_id ON {table}
+            FOR EACH ROW WHEN (NEW.deleted_at IS NULL) EXECUTE FUNCTION reject_deleted_product()
+        ''')
+
+
+def downgrade() -> None:
+    for table in reversed(CHILD_TABLES):
+        op.execute(f'DROP TRIGGER {table}_live_product ON {table}')
+    op.execute('DROP FUNCTION reject_deleted_product()')
@@ -0,0 +1,64 @@
+"""unique names
+
+Revision ID: c1f3a7d2e9b4
+Revises: a0834fe77f0a
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1f3a7d2e9b4'
+down_revision: Union[str, None] = 'a0834fe77f0a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблицы, в которых create_func требует уникальное имя
+UNIQUE_NAME_TABLES = (
+    'product',
+    'product_category',
+    'personal_category',
+    'brigades',
+    'workshop',
+    'test_laboratories',
+    'works_with_product',
+)
+
+# Сколько повторяющихся имен на таблицу показывается в ошибке
+DUPLICATES_SHOWN = 20
+
+
+def find_duplicate_names(connection, table: str) -> list:
+    return connection.execute(sa.text(f'''
+        SELECT name, array_agg(id ORDER BY id) AS ids
+        FROM {table}
+        GROUP BY name
+        HAVING count(*) > 1
+        ORDER BY name
+        LIMIT {DUPLICATES_SHOWN}
+    ''')).all()
+
+
+def upgrade() -> None:
+    # Старая проверка в create_func не защищала от гонок, а изменение имени не проверялось
+    # вовсе, поэтому повторы в данных возможны. Какую из строк оставить, решает человек:
+    # миграция останавливается до создания первого индекса и перечисляет повторы
+    connection = op.get_bind()
+    duplicates = {table: find_duplicate_names(connection, table) for table in UNIQUE_NAME_TABLES}
+    problems = [f'{table}: {row.name!r} (id {", ".join(map(str, row.ids))})'
+                for table, rows in duplicates.items() for row in rows]
+    if problems:
+        raise RuntimeError('Повторяющиеся имена, переименуйте или удалите лишние строки '
+                           'и повторите миграцию:\n' + '\n'.join(problems))
+
+    for table in UNIQUE_NAME_TABLES:
+        op.create_index(op.f(f'ix_{table}_name'), table, ['name'], unique=True)
+
+
+def downgrade() -> None:
+    for table in reversed(UNIQUE_NAME_TABLES):
+        op.drop_index(op.f(f'ix_{table}_name'), table_name=table)
@@ -0,0 +1,44 @@
+"""fk keyset indexes
+
+Revision ID: d7e2b5c84f10
+Revises: c1f3a7d2e9b4
+Create Date: 2026-10-18 11:03:27.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e2b5c84f10'
+down_revision: Union[str, None] = 'c1f3a7d2e9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (таблица, внешний ключ): индекс (fk, id) обслуживает и фильтр, и ORDER BY id
+FK_COLUMNS = (
+    ('product', 'product_category_id'),
+    ('product', 'laboratory_id'),
+    ('engineer_personal', 'personal_category_id'),
+    ('engineer_personal', 'workshop_id'),
+    ('personal_workers', 'personal_category_id'),
+    ('personal_workers', 'workshop_id'),
+    ('brigades', 'workshop_id'),
+    ('brigades', 'product_id'),
+    ('workshop', 'product_category_id'),
+    ('personal_laboratories', 'laboratory_id'),
+    ('tools', 'laboratory_id'),
+    ('works_with_product', 'product_id'),
+)
+
+
+def upgrade() -> None:
+    for table, column in FK_COLUMNS:
+        op.create_index(f'ix_{table}_{column}_id', table, [column, 'id'])
+
+
+def downgrade() -> None:
+    for table, column in reversed(FK_COLUMNS):
+        op.drop_index(f'ix_{table}_{column}_id', table_name=table)
@@ -0,0 +1,32 @@
+"""product laboratory set null
+
+Revision ID: e4a9c1b07d35
+Revises: d7e2b5c84f10
+Create Date: 2026-10-18 12:21:09.517833
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9c1b07d35'
+down_revision: Union[str, None] = 'd7e2b5c84f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Удаление лаборатории одним DELETE больше не проходит через ORM,
+    # который раньше сам обнулял product.laboratory_id
+    op.drop_constraint('product_laboratory_id_fkey', 'product', type_='foreignkey')
+    op.create_foreign_key('product_laboratory_id_fkey', 'product', 'test_laboratories',
+                          ['laboratory_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    op.drop_constraint('product_laboratory_id_fkey', 'product', type_='foreignkey')
+    op.create_foreign_key('product_laboratory_id_fkey', 'product', 'test_laboratories',
+                          ['laboratory_id'], ['id'])
@@ -0,0 +1,62 @@
+"""table versions
+
+Revision ID: f2b6d8a41c73
+Revises: e4a9c1b07d35
+Create Date: 2026-10-18 13:05:52.671284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8a41c73'
+down_revision: Union[str, None] = 'e4a9c1b07d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = (
+    'product',
+    'product_category',
+    'personal_category',
+    'engineer_personal',
+    'personal_workers',
+    'brigades',
+    'workshop',
+    'test_laboratories',
+    'personal_laboratories',
+    'tools',
+    'works_with_product',
+)
+
+
+def upgrade() -> None:
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.execute('''
+        CREATE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in VERSIONED_TABLES:
+        op.execute(f"INSERT INTO table_versions (table_name, version) VALUES ('{table}', 1)")
+        op.execute(f'''
+            CREATE TRIGGER {table}_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        ''')
+
+
+def downgrade() -> None:
+    for table in reversed(VERSIONED_TABLES):
+        op.execute(f'DROP TRIGGER {table}_bump_version ON {table}')
+    op.execute('DROP FUNCTION bump_table_version()')
+    op.drop_table('table_versions')
@@ -0,0 +1,2 @@
+'''Нагрузочные тесты API: засев данных (seed), сценарии (scenarios) и запуск с отчётом (run),
+проверка, что писатели одной таблицы не блокируют друг друга (concurrency)'''
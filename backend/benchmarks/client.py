@@ -0,0 +1,112 @@
+import asyncio
+import random
+import re
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import httpx
+
+
+@dataclass
+class EndpointStats:
+    '''Замеры одного эндпоинта в рамках фазы нагрузки'''
+
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    # Из заголовка Server-Timing; None, если сервер его не отдаёт
+    db_queries: int | None = None
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        result = {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+            'latency_ms': None,
+            'db_queries_per_request': (round(self.db_queries / len(latencies), 2)
+                                       if self.db_queries is not None and latencies else None),
+        }
+        if len(latencies) >= 2:
+            percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+            result['latency_ms'] = {
+                'p50': round(percentiles[49] * 1000, 3),
+                'p95': round(percentiles[94] * 1000, 3),
+                'p99': round(percentiles[98] * 1000, 3),
+                'mean': round(statistics.fmean(latencies) * 1000, 3),
+                'max': round(latencies[-1] * 1000, 3),
+            }
+        return result
+
+
+# Число SQL-выражений, которое сервер пишет в Server-Timing: db;desc="queries=N rows=M"
+SERVER_TIMING_QUERIES = re.compile(r'queries=(\d+)')
+
+
+class Recorder:
+    '''Собирает задержки по меткам эндпоинтов вида "GET /products/"'''
+
+    def __init__(self):
+        self.endpoints: dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str,
+                      **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.endpoints[label].errors += 1
+            return None
+
+        stats = self.endpoints[label]
+        stats.latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            stats.errors += 1
+
+        match = SERVER_TIMING_QUERIES.search(response.headers.get('server-timing', ''))
+        if match:
+            stats.db_queries = (stats.db_queries or 0) + int(match.group(1))
+        return response
+
+
+@dataclass
+class Context:
+    '''Состояние, общее для воркеров одной фазы: клиент, замеры и объёмы засеянных таблиц'''
+
+    client: httpx.AsyncClient
+    recorder: Recorder
+    rng: random.Random
+    volumes: dict[str, int]
+
+    async def request(self, label: str, method: str, url: str, **kwargs):
+        return await self.recorder.request(self.client, label, method, url, **kwargs)
+
+
+Action = Callable[[Context], Awaitable[None]]
+
+
+async def run_phase(base_url: str, actions: list[tuple[Action, int]], volumes: dict[str, int],
+                    concurrency: int, duration: float, seed: int) -> tuple[Recorder, float]:
+    '''Гоняет взвешенный набор действий в concurrency воркеров в течение duration секунд'''
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(number: int):
+            # У каждого воркера свой генератор: последовательность запросов воспроизводима
+            context = Context(client, recorder, random.Random(seed * 1000 + number), volumes)
+            population = [action for action, _ in actions]
+            weights = [weight for _, weight in actions]
+            while time.perf_counter() < deadline:
+                action = context.rng.choices(population, weights)[0]
+                await action(context)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return recorder, elapsed
@@ -0,0 +1,73 @@
+'''Проверка, что писатели одной таблицы не ждут друг друга
+
+    python -m benchmarks.concurrency
+
+Две транзакции меняют разные строки одной таблицы; первая остаётся открытой, пока
+пишет вторая. Ожидание чужой блокировки (например, общей строки версии в table_versions)
+lock_timeout превращает в ошибку, и проверка завершается с кодом 1. Обе транзакции
+откатываются, засеянные данные не меняются. Нужна база после make bench-seed.
+'''
+import asyncio
+import sys
+
+import asyncpg
+
+from src.config import settings
+
+
+# Сколько вторая транзакция может ждать блокировку, прежде чем проверка провалится
+LOCK_TIMEOUT = '2s'
+
+# Пары выражений двух писателей: разные строки одной таблицы
+WRITES = {
+    'product': ('UPDATE product SET count = count WHERE id = 1',
+                'UPDATE product SET count = count WHERE id = 2'),
+    'works_with_product': ('UPDATE works_with_product SET name = name WHERE id = 1',
+                           'UPDATE works_with_product SET name = name WHERE id = 2'),
+    'personal_workers': ('UPDATE personal_workers SET status = status WHERE id = 1',
+                         'UPDATE personal_workers SET status = status WHERE id = 2'),
+}
+
+
+async def connect() -> asyncpg.Connection:
+    return await asyncpg.connect(user=settings.POSTGRES_USER,
+                                 password=settings.POSTGRES_PASSWORD,
+                                 host=settings.POSTGRES_HOST,
+                                 port=settings.POSTGRES_PORT,
+                                 database=settings.POSTGRES_NAME)
+
+async def writers_block(first: asyncpg.Connection, second: asyncpg.Connection, writes: tuple[str, str]) -> bool:
+    first_transaction, second_transaction = first.transaction(), second.transaction()
+    await first_transaction.start()
+    try:
+        await first.execute(writes[0])
+        await second_transaction.start()
+        try:
+            await second.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            await second.execute(writes[1])
+        except asyncpg.LockNotAvailableError:
+            return True
+        finally:
+            await second_transaction.rollback()
+    finally:
+        await first_transaction.rollback()
+    return False
+
+async def check() -> list[str]:
+    first, second = await connect(), await connect()
+    try:
+        return [table for table, writes in WRITES.items() if await writers_block(first, second, writes)]
+    finally:
+        await first.close()
+        await second.close()
+
+def main():
+    blocked = asyncio.run(check())
+    for table in WRITES:
+        print(f'{table}: {"писатели ждут друг друга" if table in blocked else "ok"}', file=sys.stderr)
+    if blocked:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
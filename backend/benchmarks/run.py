@@ -0,0 +1,229 @@
+'''Запуск сценариев нагрузки и отчёт в JSON
+
+    python -m benchmarks.run --scenario all --duration 30 --concurrency 32 --output bench.json
+    python -m benchmarks.run --spawn-server --workers 4 --baseline bench.json
+
+Задержки считаются на клиенте по каждому эндпоинту. Число запросов к БД на запрос
+берётся из заголовка Server-Timing, на фазу целиком - из pg_stat_statements,
+если расширение подключено, иначе в отчёте null.
+С --baseline прогон завершается с кодом 1, если p95 или число запросов к БД
+на действие выросли больше чем на --tolerance относительно прошлого отчёта.
+'''
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import asyncpg
+import httpx
+
+from benchmarks.client import run_phase
+from benchmarks.scenarios import MIXED_SCENARIOS, SCENARIOS
+from benchmarks.seed import scaled_volumes
+from src.config import settings
+
+
+class QueryCounter:
+    '''Суммарное число выполненных запросов в базе приложения по pg_stat_statements'''
+
+    def __init__(self):
+        self.connection: asyncpg.Connection | None = None
+
+    async def start(self):
+        try:
+            self.connection = await asyncpg.connect(user=settings.POSTGRES_USER,
+                                                    password=settings.POSTGRES_PASSWORD,
+                                                    host=settings.POSTGRES_HOST,
+                                                    port=settings.POSTGRES_PORT,
+                                                    database=settings.POSTGRES_NAME)
+            await self.snapshot()
+        except (OSError, asyncpg.PostgresError):
+            # Без pg_stat_statements отчёт остаётся полезным, просто без числа запросов
+            await self.stop()
+
+    async def stop(self):
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    async def snapshot(self) -> int | None:
+        if self.connection is None:
+            return None
+        return await self.connection.fetchval(
+            'SELECT coalesce(sum(calls), 0)::bigint FROM pg_stat_statements '
+            'WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())'
+        )
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('uvicorn завершился при запуске')
+        try:
+            if httpx.get(f'{base_url}/openapi.json').status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'сервер не ответил за {timeout} с')
+
+def spawn_server(base_url: str, workers: int) -> subprocess.Popen:
+    address = urlparse(base_url)
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'src.main:app',
+                                '--host', address.hostname, '--port', str(address.port or 80),
+                                '--workers', str(workers), '--no-access-log'])
+    try:
+        wait_for_server(base_url, process)
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process
+
+async def run_scenarios(args) -> dict:
+    volumes = scaled_volumes(args.scale)
+    counter = QueryCounter()
+    await counter.start()
+
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'base_url': args.base_url,
+            'duration_s': args.duration,
+            'concurrency': args.concurrency,
+            'scale': args.scale,
+            'seed': args.seed,
+            'query_counts': counter.connection is not None,
+        },
+        'scenarios': {},
+    }
+
+    names = list(SCENARIOS) if 'all' in args.scenario else args.scenario
+    try:
+        for name in names:
+            actions = SCENARIOS[name]
+            # Одиночные сценарии: по фазе на действие; смешанный: одна взвешенная фаза
+            if name in MIXED_SCENARIOS:
+                phases = [(name, actions)]
+            else:
+                phases = [(action.__name__, [(action, 1)]) for action, _ in actions]
+
+            results = []
+            for phase_name, phase_actions in phases:
+                if args.warmup:
+                    await run_phase(args.base_url, phase_actions, volumes,
+                                    args.concurrency, args.warmup, args.seed)
+
+                before = await counter.snapshot()
+                recorder, elapsed = await run_phase(args.base_url, phase_actions, volumes,
+                                                    args.concurrency, args.duration, args.seed)
+                after = await counter.snapshot()
+
+                endpoints = {label: stats.summary(elapsed) for label, stats in recorder.endpoints.items()}
+                actions_done = max((summary['requests'] for summary in endpoints.values()), default=0)
+                # Запрос самого снимка тоже попадает в pg_stat_statements
+                db_queries = after - before - 1 if before is not None else None
+                results.append({
+                    'phase': phase_name,
+                    'elapsed_s': round(elapsed, 3),
+                    'db_queries': db_queries,
+                    'db_queries_per_action': (round(db_queries / actions_done, 2)
+                                              if db_queries is not None and actions_done else None),
+                    'endpoints': endpoints,
+                })
+                print(f'{name}/{phase_name}: ' + ', '.join(
+                    f"{label} p95={summary['latency_ms']['p95'] if summary['latency_ms'] else '-'}ms"
+                    for label, summary in endpoints.items()), file=sys.stderr)
+
+            report['scenarios'][name] = results
+    finally:
+        await counter.stop()
+
+    return report
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    '''Список регрессий относительно прошлого отчёта'''
+
+    regressions = []
+    for name, phases in report['scenarios'].items():
+        baseline_phases = {phase['phase']: phase for phase in baseline.get('scenarios', {}).get(name, [])}
+        for phase in phases:
+            old_phase = baseline_phases.get(phase['phase'])
+            if old_phase is None:
+                continue
+
+            old_queries, new_queries = old_phase['db_queries_per_action'], phase['db_queries_per_action']
+            if old_queries and new_queries and new_queries > old_queries * (1 + tolerance):
+                regressions.append(f"{name}/{phase['phase']}: запросов к БД на действие "
+                                   f'{old_queries} -> {new_queries}')
+
+            for label, summary in phase['endpoints'].items():
+                old_summary = old_phase['endpoints'].get(label)
+                if not old_summary:
+                    continue
+
+                old_queries, new_queries = (old_summary.get('db_queries_per_request'),
+                                            summary['db_queries_per_request'])
+                if old_queries and new_queries and new_queries > old_queries * (1 + tolerance):
+                    regressions.append(f"{name}/{phase['phase']} {label}: запросов к БД "
+                                       f'{old_queries} -> {new_queries}')
+
+                if not old_summary['latency_ms'] or not summary['latency_ms']:
+                    continue
+                old_p95, new_p95 = old_summary['latency_ms']['p95'], summary['latency_ms']['p95']
+                if new_p95 > old_p95 * (1 + tolerance):
+                    regressions.append(f"{name}/{phase['phase']} {label}: p95 {old_p95} -> {new_p95} мс")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочные сценарии API')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--scenario', nargs='+', default=['all'], choices=['all', *SCENARIOS])
+    parser.add_argument('--duration', type=float, default=30, help='секунд на фазу')
+    parser.add_argument('--warmup', type=float, default=5, help='секунд прогрева перед фазой')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--scale', type=float, default=1.0, help='scale, с которым засеяна база')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл отчёта, по умолчанию stdout')
+    parser.add_argument('--baseline', help='прошлый отчёт для поиска регрессий')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимый рост, доля')
+    parser.add_argument('--spawn-server', action='store_true', help='запустить uvicorn на время прогона')
+    parser.add_argument('--workers', type=int, default=1, help='воркеры uvicorn для --spawn-server')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        # Читается до записи отчёта: --output может указывать на тот же файл
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    server = spawn_server(args.base_url, args.workers) if args.spawn_server else None
+    try:
+        report = asyncio.run(run_scenarios(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+    else:
+        print(output)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'РЕГРЕССИЯ {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
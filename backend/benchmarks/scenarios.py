@@ -0,0 +1,98 @@
+'''Сценарии нагрузки; каждое действие делает один или несколько запросов с метками эндпоинтов'''
+import uuid
+
+from benchmarks.client import Action, Context
+from benchmarks.seed import product_name
+
+
+def new_name(prefix: str) -> str:
+    return f'{prefix}-bench-{uuid.uuid4().hex}'
+
+def seeded_id(context: Context, table: str) -> int:
+    return context.rng.randint(1, context.volumes[table])
+
+
+async def list_products(context: Context):
+    after = context.rng.randint(0, context.volumes['product'])
+    await context.request('GET /products/', 'GET', '/products/', params={'after': after, 'limit': 100})
+
+async def list_products_by_category(context: Context):
+    params = {'product_category_id': seeded_id(context, 'product_category'), 'limit': 100}
+    await context.request('GET /products/?product_category_id', 'GET', '/products/', params=params)
+
+async def list_works(context: Context):
+    params = {'product_id': seeded_id(context, 'product')}
+    await context.request('GET /works_with_product/?product_id', 'GET', '/works_with_product/', params=params)
+
+async def list_personal_workers(context: Context):
+    params = {'workshop_id': seeded_id(context, 'workshop'), 'limit': 100}
+    await context.request('GET /personal_workers/', 'GET', '/personal_workers/', params=params)
+
+async def product_detail(context: Context):
+    # Несмотря на имя параметра в пути, карточка продукта ищется по id
+    product_id = seeded_id(context, 'product')
+    await context.request('GET /products/{product_name}', 'GET', f'/products/{product_id}')
+
+async def product_dossier(context: Context):
+    product_id = seeded_id(context, 'product')
+    await context.request('GET /products/{product_id}/dossier', 'GET', f'/products/{product_id}/dossier')
+
+async def brigade_detail(context: Context):
+    brigade_id = seeded_id(context, 'brigades')
+    await context.request('GET /brigades/{brigade_id}', 'GET', f'/brigades/{brigade_id}')
+
+async def create_product(context: Context):
+    body = {'name': new_name('product'), 'count': context.rng.randint(1, 500),
+            'product_category_id': seeded_id(context, 'product_category')}
+    await context.request('POST /products/', 'POST', '/products/', json=body)
+
+async def create_work(context: Context):
+    body = {'name': new_name('work'), 'product_id': seeded_id(context, 'product')}
+    await context.request('POST /works_with_product/', 'POST', '/works_with_product/', json=body)
+
+async def patch_product(context: Context):
+    product_id = seeded_id(context, 'product')
+    body = {'id': product_id, 'count': context.rng.randint(1, 500)}
+    await context.request('PATCH /products/{product_name}', 'PATCH',
+                          f'/products/{product_name(product_id)}', json=body)
+
+async def patch_worker(context: Context):
+    person_id = seeded_id(context, 'personal_workers')
+    body = {'id': person_id, 'status': context.rng.choice(('работает', 'в отпуске'))}
+    await context.request('PATCH /personal_workers/{person_id}', 'PATCH',
+                          f'/personal_workers/{person_id}', json=body)
+
+async def delete_work(context: Context):
+    # Удаляется только созданная здесь же запись, засеянные данные остаются нетронутыми
+    body = {'name': new_name('work'), 'product_id': seeded_id(context, 'product')}
+    response = await context.request('POST /works_with_product/', 'POST', '/works_with_product/', json=body)
+    if response is not None and response.status_code == 200:
+        work_id = response.json()['id']
+        await context.request('DELETE /works_with_product/{work_id}', 'DELETE', f'/works_with_product/{work_id}')
+
+async def delete_product(context: Context):
+    body = {'name': new_name('product'), 'count': 1,
+            'product_category_id': seeded_id(context, 'product_category')}
+    response = await context.request('POST /products/', 'POST', '/products/', json=body)
+    if response is not None and response.status_code == 200:
+        product_id = response.json()['id']
+        await context.request('DELETE /products/{product_id}', 'DELETE', f'/products/{product_id}')
+
+
+# Сценарий -> действия с весами. В одиночных сценариях каждое действие гоняется
+# отдельной фазой, чтобы число запросов к БД относилось к одному эндпоинту.
+SCENARIOS: dict[str, list[tuple[Action, int]]] = {
+    'list': [(list_products, 1), (list_products_by_category, 1), (list_works, 1),
+             (list_personal_workers, 1)],
+    'detail': [(product_detail, 1), (product_dossier, 1), (brigade_detail, 1)],
+    'create': [(create_product, 1), (create_work, 1)],
+    'patch': [(patch_product, 1), (patch_worker, 1)],
+    'delete': [(delete_work, 1), (delete_product, 1)],
+    # Смена цеха: в основном чтение карточек и списков, отметки о работах и редкие правки
+    'mixed': [(product_detail, 30), (list_products_by_category, 15), (list_works, 15),
+              (product_dossier, 10), (create_work, 15), (patch_product, 10),
+              (patch_worker, 3), (delete_work, 2)],
+}
+
+# Смешанный сценарий гоняется одной фазой, запросы к БД считаются на весь сценарий
+MIXED_SCENARIOS = {'mixed'}
@@ -0,0 +1,152 @@
+'''Заполнение базы воспроизводимым набором данных для нагрузочных тестов
+
+    python -m benchmarks.seed --scale 1.0 --seed 42
+
+При scale=1.0 объёмы соответствуют рабочему предприятию: 1M продуктов и 5M работ.
+Таблицы очищаются перед загрузкой, строки грузятся через COPY.
+'''
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from src.database import engine
+
+
+# Объёмы при scale=1.0; справочники масштабируются не меньше чем до одной строки
+VOLUMES = {
+    'product_category': 50,
+    'personal_category': 20,
+    'workshop': 200,
+    'test_laboratories': 100,
+    'product': 1_000_000,
+    'works_with_product': 5_000_000,
+    'brigades': 20_000,
+    'engineer_personal': 20_000,
+    'personal_workers': 100_000,
+    'personal_laboratories': 2_000,
+    'tools': 10_000,
+}
+
+# Порядок загрузки учитывает внешние ключи
+COLUMNS = {
+    'product_category': ('id', 'name'),
+    'personal_category': ('id', 'name'),
+    'workshop': ('id', 'name', 'product_category_id'),
+    'test_laboratories': ('id', 'name', 'test_date_start', 'test_date_finish'),
+    'product': ('id', 'name', 'count', 'process_start', 'process_finish',
+                'product_category_id', 'laboratory_id'),
+    'works_with_product': ('id', 'name', 'product_id'),
+    'brigades': ('id', 'name', 'workshop_id', 'product_id'),
+    'engineer_personal': ('id', 'full_name', 'birthday', 'status',
+                          'personal_category_id', 'workshop_id'),
+    'personal_workers': ('id', 'full_name', 'birthday', 'status',
+                         'personal_category_id', 'workshop_id'),
+    'personal_laboratories': ('id', 'full_name', 'birthday', 'status', 'laboratory_id'),
+    'tools': ('id', 'name', 'laboratory_id'),
+}
+
+STATUSES = ('работает', 'в отпуске', 'на больничном', 'уволен')
+
+# Сколько строк передаётся в одном COPY
+COPY_BATCH_SIZE = 50_000
+
+# Данные распределены по последнему году до фиксированной даты, чтобы прогоны совпадали
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def product_name(product_id: int) -> str:
+    return f'product-{product_id:07d}'
+
+def scaled_volumes(scale: float) -> dict[str, int]:
+    return {table: max(1, int(count * scale)) for table, count in VOLUMES.items()}
+
+def moment(rng: random.Random) -> datetime:
+    return EPOCH + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+def birthday(rng: random.Random) -> date:
+    return date(1960, 1, 1) + timedelta(days=rng.randrange(40 * 365))
+
+def generate_rows(table: str, volumes: dict[str, int], rng: random.Random):
+    '''Генератор строк таблицы; ссылки выбираются из уже загруженных диапазонов id'''
+
+    pick = lambda parent: rng.randint(1, volumes[parent])
+    for row_id in range(1, volumes[table] + 1):
+        if table in ('product_category', 'personal_category'):
+            yield row_id, f'{table}-{row_id}'
+        elif table == 'workshop':
+            yield row_id, f'workshop-{row_id}', pick('product_category')
+        elif table == 'test_laboratories':
+            start = moment(rng)
+            finish = start + timedelta(days=rng.randint(1, 30)) if rng.random() < 0.8 else None
+            yield row_id, f'laboratory-{row_id}', start.replace(tzinfo=None), finish
+        elif table == 'product':
+            start = moment(rng)
+            finish = start + timedelta(hours=rng.randint(1, 24 * 14)) if rng.random() < 0.7 else None
+            laboratory_id = pick('test_laboratories') if rng.random() < 0.6 else None
+            yield (row_id, product_name(row_id), rng.randint(1, 500), start.replace(tzinfo=None),
+                   finish, pick('product_category'), laboratory_id)
+        elif table == 'works_with_product':
+            yield row_id, f'work-{row_id:08d}', pick('product')
+        elif table == 'brigades':
+            yield row_id, f'brigade-{row_id}', pick('workshop'), pick('product')
+        elif table in ('engineer_personal', 'personal_workers'):
+            yield (row_id, f'{table}-{row_id}', birthday(rng), rng.choice(STATUSES),
+                   pick('personal_category'), pick('workshop'))
+        elif table == 'personal_laboratories':
+            yield (row_id, f'lab-person-{row_id}', birthday(rng), rng.choice(STATUSES),
+                   pick('test_laboratories'))
+        elif table == 'tools':
+            yield row_id, f'tool-{row_id}', pick('test_laboratories')
+
+def batches(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def seed(scale: float, seed_value: int):
+    volumes = scaled_volumes(scale)
+    rng = random.Random(seed_value)
+
+    async with engine.connect() as conn:
+        await conn.execute(text(f'TRUNCATE {", ".join(COLUMNS)} RESTART IDENTITY CASCADE'))
+        await conn.commit()
+
+        raw = (await conn.get_raw_connection()).driver_connection
+        # Загрузка и обновление витрин дольше обычного statement_timeout приложения
+        await raw.execute('SET statement_timeout = 0')
+        # Триггеры NOTIFY срабатывают на каждую строку COPY: миллионы событий в канале
+        # entity_changes искажали бы последующие замеры. replica отключает триггеры на время загрузки
+        await raw.execute('SET session_replication_role = replica')
+        for table, columns in COLUMNS.items():
+            started = time.perf_counter()
+            for batch in batches(generate_rows(table, volumes, rng), COPY_BATCH_SIZE):
+                await raw.copy_records_to_table(table, records=batch, columns=columns)
+            # id задавались явно, последовательность нужно сдвинуть за них
+            await raw.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), {volumes[table]})")
+            print(f'{table}: {volumes[table]} строк за {time.perf_counter() - started:.1f} с')
+        await raw.execute('RESET session_replication_role')
+
+        await raw.execute('ANALYZE')
+        await raw.execute('SELECT refresh_report_views()')
+
+    await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description='Заполнение базы данными для нагрузочных тестов')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель объёмов VOLUMES')
+    parser.add_argument('--seed', type=int, default=42, help='зерно генератора случайных чисел')
+    args = parser.parse_args()
+    asyncio.run(seed(args.scale, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+# Разрешает потоковую репликацию для пользователя приложения (выполняется при первой инициализации primary)
+echo "host replication ${POSTGRES_USER} all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,141 @@
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable
+
+import asyncpg
+from pydantic import BaseModel
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.versions import table_version
+
+
+# Флаг в session.info: в транзакции были изменения справочников
+DIRTY_FLAG = 'reference_cache_dirty'
+
+
+class TTLCache:
+    '''In-process кэш с ограничением по времени жизни и вытеснением LRU'''
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Any) -> tuple[bool, Any]:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            self._data.pop(key, None)
+            self.misses += 1
+            return False, None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, item[1]
+
+    def set(self, key: Any, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+reference_cache = TTLCache(maxsize=settings.CACHE_MAXSIZE, ttl=settings.CACHE_TTL)
+
+
+def cache_key(func: Callable, args: tuple, version: int) -> tuple:
+    # Первый аргумент всегда сессия, в ключ она не входит
+    return (func.__qualname__, version, *(arg.model_dump_json() if isinstance(arg, BaseModel) else arg
+                                          for arg in args[1:]))
+
+def cached(schema: type[BaseModel], *table_names: str):
+    '''Кэширует результат get_* в виде pydantic-схем, не привязанных к сессии.
+    Ключ включает версию таблиц из table_versions, ту же, из которой etag() строит ETag'''
+
+    def decorator(func: Callable):
+        @wraps(func)
+        async def wrapper(*args):
+            # Запись в другом процессе меняет версию, и устаревшая запись кэша больше
+            # не находится — даже если сброс по NOTIFY до этого процесса не дошел
+            key = cache_key(func, args, await table_version(args[0], table_names))
+            found, value = reference_cache.get(key)
+            if found:
+                return value
+
+            result = await func(*args)
+            if isinstance(result, list):
+                value = [schema.model_validate(item, from_attributes=True) for item in result]
+            elif result is not None:
+                value = schema.model_validate(result, from_attributes=True)
+            else:
+                value = None
+
+            reference_cache.set(key, value)
+            return value
+
+        return wrapper
+
+    return decorator
+
+def invalidates(func: Callable):
+    '''Помечает транзакцию как изменяющую справочники; кэш сбрасывается после commit'''
+
+    @wraps(func)
+    async def wrapper(db: AsyncSession, *args):
+        db.info[DIRTY_FLAG] = True
+        if settings.CACHE_NOTIFY_CHANNEL:
+            # NOTIFY транзакционный: другие процессы получат его только после commit
+            await db.execute(text('SELECT pg_notify(:channel, :payload)'),
+                             {'channel': settings.CACHE_NOTIFY_CHANNEL, 'payload': func.__qualname__})
+        return await func(db, *args)
+
+    return wrapper
+
+@event.listens_for(Session, 'after_commit')
+def clear_after_commit(session: Session):
+    if session.info.pop(DIRTY_FLAG, False):
+        reference_cache.clear()
+
+@event.listens_for(Session, 'after_rollback')
+def reset_after_rollback(session: Session):
+    session.info.pop(DIRTY_FLAG, None)
+
+
+class CacheListener:
+    '''Отдельное соединение asyncpg, которое слушает канал сброса кэша от других процессов'''
+
+    def __init__(self):
+        self.connection: asyncpg.Connection | None = None
+
+    async def start(self):
+        if not settings.CACHE_NOTIFY_CHANNEL:
+            return
+
+        self.connection = await asyncpg.connect(user=settings.POSTGRES_USER,
+                                                password=settings.POSTGRES_PASSWORD,
+                                                host=settings.POSTGRES_HOST,
+                                                port=settings.POSTGRES_PORT,
+                                                database=settings.POSTGRES_NAME)
+        await self.connection.add_listener(settings.CACHE_NOTIFY_CHANNEL, self.on_notify)
+
+    async def stop(self):
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    def on_notify(self, connection, pid, channel, payload):
+        reference_cache.clear()
+
+
+cache_listener = CacheListener()
@@ -0,0 +1,97 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Literal
+
+from sqlalchemy import Column, Select, Table, delete, exists, func, select, update
+
+from src.config import settings
+from src.database import Base, session_factory
+
+
+@dataclass
+class CascadeStep:
+    '''Строки table, чей column ссылается на удаляемые родительские строки'''
+
+    table: Table
+    column: Column
+    parents: Select
+    action: Literal['delete', 'set_null']
+
+    def rows(self) -> Select:
+        return select(self.table.c.id).where(self.column.in_(self.parents))
+
+    def batch(self, size: int):
+        # SKIP LOCKED: строки, которые сейчас правит цех, не ждем — их заберет
+        # следующая пачка или каскад при удалении корня
+        ids = self.rows().limit(size).with_for_update(skip_locked=True)
+        if self.action == 'delete':
+            return delete(self.table).where(self.table.c.id.in_(ids))
+        return update(self.table).where(self.table.c.id.in_(ids)).values({self.column.name: None})
+
+
+class RestrictedDelete(Exception):
+    pass
+
+
+def referencing(table: Table):
+    for child in Base.metadata.sorted_tables:
+        for foreign_key in child.foreign_keys:
+            if foreign_key.column.table is table:
+                yield child, foreign_key
+
+def cascade_plan(table: Table, parents: Select, path: tuple[Table, ...] = ()):
+    '''Обходит граф внешних ключей так же, как ondelete в БД: сначала листья, затем родители.
+    Возвращает шаги и ссылки без ondelete, которые запрещают удаление'''
+
+    steps, restricted = [], []
+    for child, foreign_key in referencing(table):
+        if child in path:
+            continue
+        ondelete = (foreign_key.ondelete or '').upper()
+        if ondelete == 'CASCADE':
+            step = CascadeStep(child, foreign_key.parent, parents, 'delete')
+            child_steps, child_restricted = cascade_plan(child, step.rows(), (*path, table))
+            steps += [*child_steps, step]
+            restricted += child_restricted
+        elif ondelete == 'SET NULL':
+            steps.append(CascadeStep(child, foreign_key.parent, parents, 'set_null'))
+        else:
+            restricted.append(CascadeStep(child, foreign_key.parent, parents, 'delete'))
+    return steps, restricted
+
+async def delete_children(table: Table, root_id: int, progress=None):
+    '''Удаляет или отвязывает зависимые строки пачками по CASCADE_BATCH_SIZE, каждая в своей транзакции.
+    Сам корень не удаляется: это делает вызывающий, чтобы сбросить кэш и вернуть результат'''
+
+    steps, restricted = cascade_plan(table, select(table.c.id).where(table.c.id == root_id))
+
+    async with session_factory() as db:
+        # Запрет проверяется до первой пачки, иначе часть дерева удалилась бы до ошибки внешнего ключа
+        for step in restricted:
+            if await db.scalar(select(exists(step.rows()))):
+                raise RestrictedDelete(f'Есть связанные записи в таблице {step.table.name}')
+        counts = [await db.scalar(select(func.count()).select_from(step.rows().subquery())) for step in steps]
+
+    total, done = sum(counts), 0
+    if progress is not None:
+        await progress(done, total)
+
+    for step, count in zip(steps, counts):
+        if not count:
+            continue
+        while True:
+            async with session_factory() as db, db.begin():
+                affected = (await db.execute(step.batch(settings.CASCADE_BATCH_SIZE))).rowcount
+            if not affected:
+                break
+            done += affected
+            if progress is not None:
+                await progress(done)
+            # Пауза отдает блокировки и ввод-вывод обычным запросам
+            await asyncio.sleep(settings.CASCADE_PAUSE)
+
+    # Оценка total могла отличаться: строку с двумя путями (бригада через продукт и цех)
+    # посчитали дважды, а новые строки появились после подсчета
+    if progress is not None:
+        await progress(done, done)
+    return done
@@ -8,10 +8,79 @@ class Settings(BaseSettings):
     POSTGRES_PORT: int
     POSTGRES_NAME: str
 
+    # В отладке списки проходят полную валидацию pydantic вместо быстрого пути orjson
+    DEBUG: bool = False
+
+    # Сервер src.serve: WEB_WORKERS = 0 — по числу доступных процессору ядер.
+    # WEB_GRACEFUL_TIMEOUT — сколько секунд при остановке ждать незавершённые запросы
+    WEB_HOST: str = '0.0.0.0'
+    WEB_PORT: int = 8000
+    WEB_WORKERS: int = 0
+    WEB_GRACEFUL_TIMEOUT: int = 30
+
+    # Пул соединений и движок; размер пула считается на один процесс uvicorn
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_ECHO: bool = False
+    # Серверный statement_timeout в миллисекундах, 0 — без ограничения
+    DB_STATEMENT_TIMEOUT: int = 30000
+
+    # Реплики для чтения (полные URL postgresql+asyncpg, в .env списком JSON).
+    # Реплика, не ответившая на проверку за DB_REPLICA_HEALTH_TIMEOUT, исключается до следующей проверки
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_HEALTH_INTERVAL: float = 5
+    DB_REPLICA_HEALTH_TIMEOUT: float = 2
+
+    # Кэш справочников. Записи привязаны к версии таблиц, поэтому другие процессы не отдают
+    # устаревшее и без NOTIFY; канал лишь раньше освобождает память
+    CACHE_TTL: float = 60
+    CACHE_MAXSIZE: int = 256
+    CACHE_NOTIFY_CHANNEL: str | None = None
+
+    # Поток изменений /events: очередь на подписчика (переполнение отключает клиента),
+    # предел подписчиков на процесс и период ping в секундах для SSE и проверки соединения LISTEN
+    EVENTS_QUEUE_SIZE: int = 256
+    EVENTS_MAX_SUBSCRIBERS: int = 10000
+    EVENTS_HEARTBEAT: float = 15
+
+    # Очередь задач: воркеров на процесс (0 — задачи не выполняются этим процессом),
+    # период опроса и аренда задачи в секундах; после JOBS_MAX_ATTEMPTS взятий задача считается упавшей
+    JOBS_WORKERS: int = 2
+    JOBS_POLL_INTERVAL: float = 2
+    JOBS_LEASE: float = 60
+    JOBS_MAX_ATTEMPTS: int = 3
+
+    # Каскадное удаление категорий, цехов и лабораторий: строк в одной транзакции
+    # и пауза между транзакциями в секундах
+    CASCADE_BATCH_SIZE: int = 1000
+    CASCADE_PAUSE: float = 0.05
+
+    # Архивация в секционированные по месяцам таблицы истории: по умолчанию переносятся продукты,
+    # завершенные раньше ARCHIVE_AFTER_DAYS дней назад; продуктов в одной транзакции и пауза между ними
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_PAUSE: float = 0.05
+
+    # Период обновления материализованных представлений отчетов в секундах, 0 — выключено
+    REPORTS_REFRESH_INTERVAL: float = 0
+
+    # Период в секундах, с которым журнал table_version_changes сворачивается в table_versions
+    TABLE_VERSIONS_COMPACT_INTERVAL: float = 10
+
+    # Журнал медленных запросов: порог в миллисекундах (0 — выключен) и размер кольцевого буфера.
+    # SLOW_QUERY_EXPLAIN выполняет EXPLAIN (ANALYZE, BUFFERS) для медленных SELECT на отдельном соединении
+    SLOW_QUERY_THRESHOLD_MS: float = 500
+    SLOW_QUERY_LOG_SIZE: int = 200
+    SLOW_QUERY_EXPLAIN: bool = False
+
     @property
     def DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_NAME}"
     
     model_config = SettingsConfigDict(env_file='.env')
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,9 +1,22 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
 from fastapi import HTTPException
-from sqlalchemy import select
+from pydantic import BaseModel
+from sqlalchemy import (String, column, delete, exists, func, insert, literal, literal_column, or_, select, table,
+                        text, union_all, update)
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import src.models as models
-from .dependencies import db_create, db_delete, db_update
+from src.cache import cached, invalidates
+from src.cascade import delete_children
+from src.config import settings
+from src.database import Base, session_factory
+from src.jobs import enqueue, job_handler
+from .dependencies import (bulk_result, db_bulk_upsert, db_create, db_paginate,
+                           filter_range, filter_time_range, live_rows, naive_utc, run_bulk)
 from src.schemas import (CreateProduct, CreateProductCategory, 
                          CreatePersonalCategory, CreateLaboratory,
                          CreateEngineerPersonal, CreateWorkshop, 
@@ -13,14 +26,50 @@ from src.schemas import (CreateProduct, CreateProductCategory,
                          ProductCategory, TestLaboratories, UpdateBrigades,
                          UpdateEngineerPersonal, UpdatePersonalLaboratory, 
                          UpdatePersonalWorkers, UpdateProduct, UpdateTool, 
-                         UpdateWorkForProduct, UpdateWorkshop)
-
+                         UpdateWorkForProduct, UpdateWorkshop, Pagination,
+                         ProductFilter, EngineerPersonalFilter,
+                         PersonalWorkersFilter, BrigadesFilter, WorkshopFilter,
+                         PersonalLaboratoriesFilter, ToolsFilter,
+                         WorksWithProductFilter, OnConflict, Workshop,
+                         ReportPeriod, ProductWorksPeriod, LaboratoriesFilter,
+                         CreateProductionRun, ProductionRun, SearchParams,
+                         BulkRowResult, ProductHistoryFilter, WorksHistoryFilter)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Изменение и удаление одним запросом с RETURNING: None означает, что записи с таким id нет.
+# Функции crud не фиксируют транзакцию, commit выполняет get_db после обработчика
+async def update_by_id(model: type[Base], db: AsyncSession, something_id: int, something_data: BaseModel):
+    values = something_data.model_dump(exclude_unset=True, exclude={'id'})
+    if not values:
+        return await db.scalar(select(model).filter_by(id=something_id).where(*live_rows(model)))
+
+    statement = (update(model)
+                 .filter_by(id=something_id)
+                 .where(*live_rows(model))
+                 .values(**values)
+                 .returning(model)
+                 .execution_options(synchronize_session=False))
+    return await db.scalar(statement)
+
+async def delete_by_id(model: type[Base], db: AsyncSession, something_id: int):
+    return await db.scalar(delete(model).filter_by(id=something_id).where(*live_rows(model)).returning(model.id))
+
+async def soft_delete_by_id(model: type[Base], db: AsyncSession, something_id: int):
+    # Строка остается в таблице до архивации, повторное удаление вернет None
+    return await db.scalar(update(model)
+                           .filter_by(id=something_id)
+                           .where(*live_rows(model))
+                           .values(deleted_at=func.now())
+                           .returning(model.id))
 
 # Класс реализовывающий CRUD для продуктов
 class ProductOperations:
     # готово
     async def get_product(db: AsyncSession, product_id: int):
-        result = await db.execute(select(models.Product).filter_by(id=product_id))
+        result = await db.execute(select(models.Product).filter_by(id=product_id, deleted_at=None))
         return result.scalars().first()
 
     # готово
@@ -28,64 +77,126 @@ class ProductOperations:
         db_product = models.Product(**product.model_dump())
         return await db_create(db_product, db)
 
+    async def bulk_create_products(db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+        return await db_bulk_upsert(models.Product, db, rows, on_conflict)
+
     async def update_product(db: AsyncSession, product_id: int, product_data: UpdateProduct):
-        db_product = await db.execute(select(models.Product).filter_by(id=product_id))
-        return await db_update(db_product, db, product_data)
+        return await update_by_id(models.Product, db, product_id, product_data)
 
     async def delete_product(db: AsyncSession, product_id: int):
-        result = await db.execute(select(models.Product).filter_by(id=product_id))
-        return await db_delete(result, db)
+        # Мягкое удаление повторяет каскад внешнего ключа: работы и бригады продукта помечаются
+        # вместе с ним, в том же порядке product -> works, что и запуск производства
+        deleted = await soft_delete_by_id(models.Product, db, product_id)
+        if deleted is not None:
+            for dependent in (models.WorksWithProduct, models.Brigades):
+                await db.execute(update(dependent)
+                                 .filter_by(product_id=product_id, deleted_at=None)
+                                 .values(deleted_at=func.now()))
+        return deleted
     # готово
-    async def get_products(db: AsyncSession):
-        result = await db.execute(select(models.Product))
-        
+    def products_query(params: ProductFilter | None = None):
+        query = select(models.Product).filter_by(deleted_at=None)
+        # У продукта нет ссылки на цех, цех определяется через категорию продукта
+        if params is not None and params.workshop_id is not None:
+            workshop_category = (select(models.Workshop.product_category_id)
+                                 .filter_by(id=params.workshop_id)
+                                 .scalar_subquery())
+            query = query.where(models.Product.product_category_id == workshop_category)
+
+        query = filter_time_range(query, models.Product.process_start, models.Product.process_finish, params)
+        return db_paginate(query, models.Product, params, exclude={'workshop_id'})
+
+    async def get_products(db: AsyncSession, params: ProductFilter | None = None):
+        result = await db.execute(ProductOperations.products_query(params))
         return result.scalars().all()
 
+    # Граф досье грузится фиксированным числом запросов: продукт с категорией и
+    # лабораторией одним JOIN, затем по одному SELECT ... IN на инструменты,
+    # персонал лаборатории и работы, независимо от их количества
+    def dossier_query():
+        laboratory = joinedload(models.Product.laboratory)
+        return select(models.Product).filter_by(deleted_at=None).options(
+            joinedload(models.Product.product_category),
+            laboratory.selectinload(models.TestLaboratories.tools),
+            laboratory.selectinload(models.TestLaboratories.personal_lab),
+            selectinload(models.Product.works_for_product.and_(models.WorksWithProduct.deleted_at.is_(None))),
+        )
+
+    async def get_product_dossier(db: AsyncSession, product_id: int):
+        result = await db.execute(ProductOperations.dossier_query().filter_by(id=product_id))
+        return result.unique().scalars().first()
+
+    async def get_product_dossiers(db: AsyncSession, product_ids: list[int]):
+        query = ProductOperations.dossier_query().where(models.Product.id.in_(product_ids))
+        result = await db.execute(query.order_by(models.Product.id))
+        return result.unique().scalars().all()
+
 # Класс реализовывающий CRUD для категорий продуктов
 class ProductCategoryOperations:
     # готово
-    async def get_product_categories(db: AsyncSession):
-        result = await db.execute(select(models.ProductCategory))
+    def product_categories_query(params: Pagination | None = None):
+        return db_paginate(select(models.ProductCategory), models.ProductCategory, params)
+
+    @cached(ProductCategory, 'product_category')
+    async def get_product_categories(db: AsyncSession, params: Pagination | None = None):
+        result = await db.execute(ProductCategoryOperations.product_categories_query(params))
         return result.scalars().all()
 
     # готово
+    @invalidates
     async def create_product_category(db: AsyncSession, category: CreateProductCategory):
         db_category = models.ProductCategory(**category.model_dump())
         return await db_create(db_category, db)
 
+    @invalidates
+    async def bulk_create_product_categories(db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+        return await db_bulk_upsert(models.ProductCategory, db, rows, on_conflict)
+
+    @invalidates
     async def update_product_category(db: AsyncSession, category_id: int, category_data: ProductCategory):
-        db_category = await db.execute(select(models.ProductCategory).filter_by(id=category_id))
-        return await db_update(db_category, db, category_data)
+        return await update_by_id(models.ProductCategory, db, category_id, category_data)
 
+    @invalidates
     async def delete_product_category(db: AsyncSession, category_id: int):
-        result = await db.execute(select(models.ProductCategory).filter_by(id=category_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.ProductCategory, db, category_id)
 
 # Класс реализовывающий CRUD для категорий персонала
 class PersonalCategoryOperations:
     # готово
-    async def get_personal_categories(db: AsyncSession):
-        result = await db.execute(select(models.PersonalCategory))
+    def personal_categories_query(params: Pagination | None = None):
+        return db_paginate(select(models.PersonalCategory), models.PersonalCategory, params)
+
+    @cached(PersonalCategory, 'personal_category')
+    async def get_personal_categories(db: AsyncSession, params: Pagination | None = None):
+        result = await db.execute(PersonalCategoryOperations.personal_categories_query(params))
         return result.scalars().all()
 
     # готово
+    @invalidates
     async def create_personal_category(db: AsyncSession, category: CreatePersonalCategory):
         db_category = models.PersonalCategory(**category.model_dump())
         return await db_create(db_category, db)
+
+    @invalidates
+    async def bulk_create_personal_categories(db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+        return await db_bulk_upsert(models.PersonalCategory, db, rows, on_conflict)
     
+    @invalidates
     async def update_personal_category(db: AsyncSession, category_id: int, category_data: PersonalCategory):
-        db_category = await db.execute(select(models.PersonalCategory).filter_by(id=category_id))
-        return await db_update(db_category, db, category_data)
+        return await update_by_id(models.PersonalCategory, db, category_id, category_data)
 
+    @invalidates
     async def delete_personal_category(db: AsyncSession, category_id: int):
-        result = await db.execute(select(PersonalCategory).filter_by(id=category_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.PersonalCategory, db, category_id)
 
 # Класс реализовывающий CRUD для инженерного персонала
 class EngineerPersonalOperations:
     # готово
-    async def get_engineer_personal(db: AsyncSession):
-        result = await db.execute(select(models.EngineerPersonal))
+    def engineer_personal_query(params: EngineerPersonalFilter | None = None):
+        return db_paginate(select(models.EngineerPersonal), models.EngineerPersonal, params)
+
+    async def get_engineer_personal(db: AsyncSession, params: EngineerPersonalFilter | None = None):
+        result = await db.execute(EngineerPersonalOperations.engineer_personal_query(params))
         return result.scalars().all()
 
     # готово
@@ -99,18 +210,19 @@ class EngineerPersonalOperations:
         return result.scalars().first()
 
     async def update_engineer_personal(db: AsyncSession, person_id: int, personal_data: UpdateEngineerPersonal):
-        db_personal = await db.execute(select(models.EngineerPersonal).filter_by(id=person_id))
-        return await db_update(db_personal, db, personal_data)
+        return await update_by_id(models.EngineerPersonal, db, person_id, personal_data)
 
     async def delete_engineer_personal(db: AsyncSession, person_id: int):
-        result = await db.execute(select(models.EngineerPersonal).filter_by(id=person_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.EngineerPersonal, db, person_id)
 
 # Класс реализовывающий CRUD для обычного персонала
 class PersonalWorkersOperations:
     # готово
-    async def get_personal_workers(db: AsyncSession):
-        workers = await db.execute(select(models.PersonalWorkers))
+    def personal_workers_query(params: PersonalWorkersFilter | None = None):
+        return db_paginate(select(models.PersonalWorkers), models.PersonalWorkers, params)
+
+    async def get_personal_workers(db: AsyncSession, params: PersonalWorkersFilter | None = None):
+        workers = await db.execute(PersonalWorkersOperations.personal_workers_query(params))
         return workers.scalars().all()
 
     # готово
@@ -124,18 +236,19 @@ class PersonalWorkersOperations:
         return worker.scalars().first()
 
     async def update_personal_worker(db: AsyncSession, worker_id: int, worker_data: UpdatePersonalWorkers):
-        db_worker = await db.execute(select(models.PersonalWorkers).filter_by(id=worker_id))
-        return await db_update(db_worker, db, worker_data)
+        return await update_by_id(models.PersonalWorkers, db, worker_id, worker_data)
 
     async def delete_personal_worker(db: AsyncSession, worker_id: int):
-        result = await db.execute(select(models.PersonalWorkers).filter_by(id=worker_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.PersonalWorkers, db, worker_id)
 
 # Класс реализовывающий CRUD для бригад
 class BrigadesOperations:
     # готово
-    async def get_brigades(db: AsyncSession):
-        brigades = await db.execute(select(models.Brigades))
+    def brigades_query(params: BrigadesFilter | None = None):
+        return db_paginate(select(models.Brigades).filter_by(deleted_at=None), models.Brigades, params)
+
+    async def get_brigades(db: AsyncSession, params: BrigadesFilter | None = None):
+        brigades = await db.execute(BrigadesOperations.brigades_query(params))
         return brigades.scalars().all()
 
     # готово
@@ -143,69 +256,94 @@ class BrigadesOperations:
         brigade = models.Brigades(**brigade.model_dump())
         return await db_create(brigade, db)
 
+    async def bulk_create_brigades(db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+        return await db_bulk_upsert(models.Brigades, db, rows, on_conflict)
+
     # готово
     async def get_brigade(db: AsyncSession, brigade_id: int):
-        brigade = await db.execute(select(models.Brigades).filter_by(id=brigade_id))
+        brigade = await db.execute(select(models.Brigades).filter_by(id=brigade_id, deleted_at=None))
         return brigade.scalars().first()
 
     async def update_brigade(db: AsyncSession, brigade_id: int, brigade_data: UpdateBrigades):
-        db_brigade = await db.execute(select(models.Brigades).filter_by(id=brigade_id))
-        return await db_update(db_brigade, db, brigade_data)
+        return await update_by_id(models.Brigades, db, brigade_id, brigade_data)
 
     async def delete_brigade(db: AsyncSession, brigade_id: int):
-        result = await db.execute(select(models.Brigades).filter_by(id=brigade_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.Brigades, db, brigade_id)
 
 # Класс реализовывающий CRUD для цехов
 class WorkshopsOperations:
     # готово
-    async def get_workshops(db: AsyncSession):
-        workshops = await db.execute(select(models.Workshop))
+    def workshops_query(params: WorkshopFilter | None = None):
+        return db_paginate(select(models.Workshop), models.Workshop, params)
+
+    @cached(Workshop, 'workshop')
+    async def get_workshops(db: AsyncSession, params: WorkshopFilter | None = None):
+        workshops = await db.execute(WorkshopsOperations.workshops_query(params))
         return workshops.scalars().all()
 
     # готово
+    @invalidates
     async def create_workshop(db: AsyncSession, workshop: CreateWorkshop):
         db_workshop = models.Workshop(**workshop.model_dump())
         return await db_create(db_workshop, db)
 
+    @invalidates
+    async def bulk_create_workshops(db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+        return await db_bulk_upsert(models.Workshop, db, rows, on_conflict)
+
+    @invalidates
     async def update_workshop(db: AsyncSession, workshop_id: int, workshop_data: UpdateWorkshop):
-        db_workshop = await db.execute(select(models.Workshop).filter_by(id=workshop_id))
-        return await db_update(db_workshop, db, workshop_data)
+        return await update_by_id(models.Workshop, db, workshop_id, workshop_data)
 
+    @invalidates
     async def delete_workshop(db: AsyncSession, workshop_id: int):
-        result = await db.execute(select(models.Workshop).filter_by(id=workshop_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.Workshop, db, workshop_id)
 
 # Класс реализовывающий CRUD для лабораторий
 class LaboratoriesOperations:
     # готово
-    async def get_laboratories(db: AsyncSession):
-        result = await db.execute(select(models.TestLaboratories))
+    def laboratories_query(params: LaboratoriesFilter | None = None):
+        query = filter_time_range(select(models.TestLaboratories), models.TestLaboratories.test_date_start,
+                                  models.TestLaboratories.test_date_finish, params)
+        return db_paginate(query, models.TestLaboratories, params)
+
+    @cached(TestLaboratories, 'test_laboratories')
+    async def get_laboratories(db: AsyncSession, params: LaboratoriesFilter | None = None):
+        result = await db.execute(LaboratoriesOperations.laboratories_query(params))
         return result.scalars().all()
 
     # готово
+    @cached(TestLaboratories, 'test_laboratories')
     async def get_laboratory(db: AsyncSession, laboratory_id: int):
         result = await db.execute(select(models.TestLaboratories).filter_by(id=laboratory_id))
         return result.scalars().first()
 
     # готово
+    @invalidates
     async def create_laboratory(db: AsyncSession, laboratory: CreateLaboratory):
         db_laboratory = models.TestLaboratories(**laboratory.model_dump())
         return await db_create(db_laboratory, db)
 
+    @invalidates
+    async def bulk_create_laboratories(db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+        return await db_bulk_upsert(models.TestLaboratories, db, rows, on_conflict)
+
+    @invalidates
     async def update_laboratory(db: AsyncSession, laboratory_id: int, laboratory_data: TestLaboratories):
-        db_laboratory = await db.execute(select(models.TestLaboratories).filter_by(id=laboratory_id))
-        return await db_update(db_laboratory, db, laboratory_data)
+        return await update_by_id(models.TestLaboratories, db, laboratory_id, laboratory_data)
 
+    @invalidates
     async def delete_laboratory(db: AsyncSession, laboratory_id: int):
-        result = await db.execute(select(models.TestLaboratories).filter_by(id=laboratory_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.TestLaboratories, db, laboratory_id)
 
 # Класс реализовывающий CRUD для персональных лабораторий
 class PersonalLaboratoriesOperations:
     # готово
-    async def get_personal_laboratories(db: AsyncSession):
-        personal = await db.execute(select(models.PersonalLaboratories))
+    def personal_laboratories_query(params: PersonalLaboratoriesFilter | None = None):
+        return db_paginate(select(models.PersonalLaboratories), models.PersonalLaboratories, params)
+
+    async def get_personal_laboratories(db: AsyncSession, params: PersonalLaboratoriesFilter | None = None):
+        personal = await db.execute(PersonalLaboratoriesOperations.personal_laboratories_query(params))
         return personal.scalars().all()
 
     # готово
@@ -219,18 +357,19 @@ class PersonalLaboratoriesOperations:
         return await db_create(add_person, db)
 
     async def update_personal_laboratory(db: AsyncSession, person_id: int, personal_data: UpdatePersonalLaboratory):
-        db_personal = await db.execute(select(models.PersonalLaboratories).filter_by(id=person_id))
-        return await db_update(db_personal, db, personal_data)
+        return await update_by_id(models.PersonalLaboratories, db, person_id, personal_data)
 
     async def delete_personal_laboratory(db: AsyncSession, person_id: int):
-        result = await db.execute(select(models.PersonalLaboratories).filter_by(id=person_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.PersonalLaboratories, db, person_id)
 
 # Класс реализовывающий CRUD для инструментов
 class ToolsOperations:
     # готово
-    async def get_tools(db: AsyncSession):
-        tools = await db.execute(select(models.Tools))
+    def tools_query(params: ToolsFilter | None = None):
+        return db_paginate(select(models.Tools), models.Tools, params)
+
+    async def get_tools(db: AsyncSession, params: ToolsFilter | None = None):
+        tools = await db.execute(ToolsOperations.tools_query(params))
         return tools.scalars().all()
 
     # готово
@@ -239,18 +378,19 @@ class ToolsOperations:
         return await db_create(add_tool, db)
 
     async def update_tool(db: AsyncSession, tool_id: int, tool_data: UpdateTool):
-        db_tool = await db.execute(select(models.Tools).filter_by(id=tool_id))
-        return await db_update(db_tool, db, tool_data)
+        return await update_by_id(models.Tools, db, tool_id, tool_data)
 
     async def delete_tool(db: AsyncSession, tool_id: int):
-        result = await db.execute(select(models.Tools).filter_by(id=tool_id))
-        return await db_delete(result, db)
+        return await delete_by_id(models.Tools, db, tool_id)
 
 # Класс реализовывающий CRUD для работ с продуктами
 class WorksWithProductOperations:
     # готово
-    async def get_works_with_product(db: AsyncSession):
-        works = await db.execute(select(models.WorksWithProduct))
+    def works_with_product_query(params: WorksWithProductFilter | None = None):
+        return db_paginate(select(models.WorksWithProduct).filter_by(deleted_at=None), models.WorksWithProduct, params)
+
+    async def get_works_with_product(db: AsyncSession, params: WorksWithProductFilter | None = None):
+        works = await db.execute(WorksWithProductOperations.works_with_product_query(params))
         return works.scalars().all()
 
     # готово
@@ -258,10 +398,379 @@ class WorksWithProductOperations:
         add_work = models.WorksWithProduct(**work.model_dump())
         return await db_create(add_work, db)
 
+    async def bulk_create_works_for_product(db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+        return await db_bulk_upsert(models.WorksWithProduct, db, rows, on_conflict)
+
     async def update_work_with_product(db: AsyncSession, work_id: int, work_data: UpdateWorkForProduct):
-        db_work = await db.execute(select(models.WorksWithProduct).filter_by(id=work_id))
-        return await db_update(db_work, db, work_data)
+        return await update_by_id(models.WorksWithProduct, db, work_id, work_data)
 
     async def delete_work_with_product(db: AsyncSession, work_id: int):
-        result = await db.execute(select(models.WorksWithProduct).filter_by(id=work_id))
-        return await db_delete(result, db)
+        return await soft_delete_by_id(models.WorksWithProduct, db, work_id)
+
+# Класс реализовывающий запуск производства одной транзакцией
+class ProductionRunOperations:
+    async def create_production_run(db: AsyncSession, run: CreateProductionRun):
+        product_id = await db.scalar(insert(models.Product)
+                                     .values(**run.product.model_dump())
+                                     .returning(models.Product.id))
+
+        work_ids = []
+        if run.works:
+            # Один INSERT ... VALUES на все работы, id возвращаются в порядке тела запроса
+            work_ids = list(await db.scalars(
+                insert(models.WorksWithProduct).returning(models.WorksWithProduct.id,
+                                                          sort_by_parameter_order=True),
+                [{'name': name, 'product_id': product_id} for name in run.works],
+            ))
+
+        brigade_id = None
+        if run.brigade is not None:
+            brigade_id = await db.scalar(insert(models.Brigades)
+                                         .values(**run.brigade.model_dump(), product_id=product_id)
+                                         .returning(models.Brigades.id))
+        elif run.brigade_id is not None:
+            brigade_id = await db.scalar(update(models.Brigades)
+                                         .filter_by(id=run.brigade_id, deleted_at=None)
+                                         .values(product_id=product_id)
+                                         .returning(models.Brigades.id))
+            if brigade_id is None:
+                # Роутер отвечает 404, и транзакция запроса откатывается целиком
+                return None
+
+        return ProductionRun(product_id=product_id, work_ids=work_ids, brigade_id=brigade_id,
+                             laboratory_id=run.product.laboratory_id)
+
+# Ключ advisory lock: пачки архивации из разных процессов не идут одновременно
+# и не создают одну и ту же секцию
+ARCHIVE_LOCK = 721_004_025
+
+# Колонки продукта, которые переносятся в историю
+PRODUCT_HISTORY_COLUMNS = ('id', 'name', 'count', 'process_start', 'process_finish',
+                           'product_category_id', 'laboratory_id', 'deleted_at')
+
+# Сколько id продуктов, оставленных из-за бригад, попадает в результат задачи
+SKIPPED_SHOWN = 20
+
+def has_live_brigade():
+    # Продукт, на котором работает живая бригада, не переносится: удаление забрало бы её каскадом.
+    # Бригады удаленного продукта помечены вместе с ним и удаляются каскадом при переносе
+    return exists().where(models.Brigades.product_id == models.Product.id, models.Brigades.deleted_at.is_(None))
+
+def month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+# Класс реализовывающий архив завершенных продуктов и их работ
+class ArchiveOperations:
+    def product_history_query(params: ProductHistoryFilter | None = None):
+        query = select(models.ProductHistory)
+        if params is not None:
+            query = filter_range(query, models.ProductHistory.process_finish, params.finished_from, params.finished_to)
+        return db_paginate(query, models.ProductHistory, params)
+
+    async def get_product_history(db: AsyncSession, params: ProductHistoryFilter | None = None):
+        result = await db.execute(ArchiveOperations.product_history_query(params))
+        return result.scalars().all()
+
+    def works_history_query(params: WorksHistoryFilter | None = None):
+        query = select(models.WorksWithProductHistory)
+        if params is not None:
+            query = filter_range(query, models.WorksWithProductHistory.product_process_finish,
+                                 params.finished_from, params.finished_to)
+        return db_paginate(query, models.WorksWithProductHistory, params)
+
+    async def get_works_history(db: AsyncSession, params: WorksHistoryFilter | None = None):
+        result = await db.execute(ArchiveOperations.works_history_query(params))
+        return result.scalars().all()
+
+    async def ensure_partitions(db: AsyncSession, months: set[datetime]):
+        for month in sorted(months):
+            for history in (models.ProductHistory.__tablename__, models.WorksWithProductHistory.__tablename__):
+                await db.execute(text(f"CREATE TABLE IF NOT EXISTS {history}_{month:%Y_%m} PARTITION OF {history} "
+                                      f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"))
+
+    async def archive_batch(db: AsyncSession, finished_before: datetime, size: int):
+        # Переносит одну пачку продуктов вместе с работами; вызывается в отдельной транзакции
+        await db.execute(select(func.pg_advisory_xact_lock(ARCHIVE_LOCK)))
+
+        product, works = models.Product, models.WorksWithProduct
+        candidates = (select(product.id, product.process_finish)
+                      .where(product.process_finish < finished_before, ~has_live_brigade())
+                      .order_by(product.id)
+                      .limit(size)
+                      .with_for_update(of=product, skip_locked=True))
+        rows = (await db.execute(candidates)).all()
+        if not rows:
+            return 0
+
+        ids = [row.id for row in rows]
+        await ArchiveOperations.ensure_partitions(db, {month_start(row.process_finish) for row in rows})
+
+        # Блокировки в том же порядке, что у запуска производства и мягкого удаления:
+        # строки продукта, затем работы и бригады
+        for dependent in (works, models.Brigades):
+            await db.execute(select(dependent.id).where(dependent.product_id.in_(ids)).with_for_update())
+
+        columns = [product.__table__.c[name] for name in PRODUCT_HISTORY_COLUMNS]
+        await db.execute(insert(models.ProductHistory).from_select(
+            PRODUCT_HISTORY_COLUMNS, select(*columns).where(product.id.in_(ids))))
+        await db.execute(insert(models.WorksWithProductHistory).from_select(
+            ['id', 'name', 'product_id', 'deleted_at', 'product_process_finish'],
+            select(works.id, works.name, works.product_id, works.deleted_at, product.process_finish)
+            .join(product, product.id == works.product_id)
+            .where(works.product_id.in_(ids))))
+
+        # Работы и помеченные бригады удаляет каскад внешнего ключа, строки уже заблокированы
+        await db.execute(delete(product).where(product.id.in_(ids)))
+        return len(ids)
+
+    async def held_by_brigades(db: AsyncSession, finished_before: datetime):
+        # Завершенные продукты, которые архивация оставила из-за живых бригад
+        held = select(models.Product.id).where(models.Product.process_finish < finished_before, has_live_brigade())
+        count = await db.scalar(select(func.count()).select_from(held.subquery()))
+        ids = list(await db.scalars(held.order_by(models.Product.id).limit(SKIPPED_SHOWN)))
+        return count, ids
+
+# Массовые загрузки, которые может выполнить воркер; ключ — __qualname__ из payload задачи
+BULK_OPERATIONS = {operation.__qualname__: (operation, schema) for operation, schema in (
+    (ProductOperations.bulk_create_products, CreateProduct),
+    (ProductCategoryOperations.bulk_create_product_categories, CreateProductCategory),
+    (PersonalCategoryOperations.bulk_create_personal_categories, CreatePersonalCategory),
+    (BrigadesOperations.bulk_create_brigades, CreateBrigades),
+    (WorkshopsOperations.bulk_create_workshops, CreateWorkshop),
+    (LaboratoriesOperations.bulk_create_laboratories, CreateLaboratory),
+    (WorksWithProductOperations.bulk_create_works_for_product, CreateWorkForProduct),
+)}
+
+# Удаления с каскадом, которые выполняет воркер: таблица -> (модель, удаление корня, название)
+CASCADE_DELETES = {
+    'product_category': (models.ProductCategory, ProductCategoryOperations.delete_product_category, 'Категория продукта'),
+    'workshop': (models.Workshop, WorkshopsOperations.delete_workshop, 'Цех'),
+    'test_laboratories': (models.TestLaboratories, LaboratoriesOperations.delete_laboratory, 'Лаборатория'),
+}
+
+# Класс реализовывающий фоновые задачи: постановку в очередь и обработчики для воркеров
+class JobOperations:
+    async def get_job(db: AsyncSession, job_id: int):
+        return await db.scalar(select(models.Job).filter_by(id=job_id))
+
+    async def enqueue_cascade_delete(db: AsyncSession, model: type[Base], something_id: int):
+        # Несуществующая запись отсекается сразу, а не ошибкой задачи
+        if await db.scalar(select(model.id).filter_by(id=something_id)) is None:
+            return None
+        return await enqueue(db, 'cascade_delete', {'table': model.__tablename__, 'id': something_id})
+
+    @job_handler('cascade_delete')
+    async def cascade_delete(db: AsyncSession, payload: dict, progress):
+        model, delete_root, entity_name = CASCADE_DELETES[payload['table']]
+        # Зависимые строки удаляются пачками в своих транзакциях, корень — в транзакции задачи,
+        # там же сбрасывается кэш справочников
+        deleted = await delete_children(model.__table__, payload['id'], progress)
+        if await delete_root(db, payload['id']) is None:
+            raise LookupError(f'{entity_name} не найден(а)')
+        return {'detail': f'{entity_name} успешно удален(а)', 'dependent_rows': deleted}
+
+    async def enqueue_archive(db: AsyncSession, finished_before: datetime | None):
+        if finished_before is None:
+            finished_before = datetime.now(timezone.utc) - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+        elif finished_before.tzinfo is None:
+            finished_before = finished_before.replace(tzinfo=timezone.utc)
+        return await enqueue(db, 'archive_products', {'finished_before': finished_before.isoformat()})
+
+    @job_handler('archive_products')
+    async def archive_products(db: AsyncSession, payload: dict, progress):
+        # Каждая пачка — своя транзакция с паузой после неё, как у каскадного удаления
+        finished_before = datetime.fromisoformat(payload['finished_before'])
+        archived = 0
+        while True:
+            async with session_factory() as batch_db, batch_db.begin():
+                moved = await ArchiveOperations.archive_batch(batch_db, finished_before, settings.ARCHIVE_BATCH_SIZE)
+            if not moved:
+                break
+            archived += moved
+            await progress(archived)
+            await asyncio.sleep(settings.ARCHIVE_PAUSE)
+
+        result = {'archived_products': archived}
+        skipped, skipped_ids = await ArchiveOperations.held_by_brigades(db, finished_before)
+        if skipped:
+            # Бригаду нельзя отвязать без нового продукта, поэтому оставленные продукты
+            # перечисляются в результате: их бригады нужно перевести или удалить
+            result.update(skipped_products=skipped, skipped_product_ids=skipped_ids,
+                          detail='Продукты с живыми бригадами не перенесены в архив')
+        return result
+
+    @job_handler('bulk_import')
+    async def bulk_import(db: AsyncSession, payload: dict, progress):
+        operation, schema = BULK_OPERATIONS[payload['operation']]
+        # Повторная валидация возвращает типы (даты), потерянные при записи в JSONB
+        rows = [schema.model_validate(row).model_dump() for row in payload['rows']]
+        outcomes = [BulkRowResult.model_validate(outcome) for outcome in payload['outcomes']]
+        returned = await run_bulk(operation, db, rows, payload['on_conflict'], progress)
+        return bulk_result(outcomes, rows, payload['indexes'], returned).model_dump(mode='json')
+
+# Сущности поиска и колонка с именем; по каждой есть GIN-индекс gin_trgm_ops
+SEARCH_COLUMNS = {
+    'products': models.Product.name,
+    'product_categories': models.ProductCategory.name,
+    'personal_categories': models.PersonalCategory.name,
+    'workshops': models.Workshop.name,
+    'brigades': models.Brigades.name,
+    'laboratories': models.TestLaboratories.name,
+    'tools': models.Tools.name,
+    'works_with_product': models.WorksWithProduct.name,
+    'engineer_personal': models.EngineerPersonal.full_name,
+    'personal_workers': models.PersonalWorkers.full_name,
+    'personal_laboratories': models.PersonalLaboratories.full_name,
+}
+
+# Сколько совпадений из каждой таблицы ранжируется. Для слишком частых запросов
+# (например, общий префикс имен) ранжирование приблизительное, зато время ограничено
+SEARCH_CANDIDATES = 1000
+
+# Класс реализовывающий поиск по именам
+class SearchOperations:
+    async def search(db: AsyncSession, params: SearchParams):
+        ranked = []
+        for entity in params.entity or SEARCH_COLUMNS:
+            name_column = SEARCH_COLUMNS[entity]
+            model = name_column.class_
+            # Подстрока (ILIKE) или похожее слово (%> — word_similarity), оба условия идут по индексу
+            candidates = (select(model.id, name_column.label('name'))
+                          .where(or_(name_column.icontains(params.q, autoescape=True),
+                                     name_column.op('%>')(params.q)),
+                                 *live_rows(model))
+                          .limit(SEARCH_CANDIDATES)
+                          .subquery())
+            rank = func.word_similarity(params.q, candidates.c.name)
+            ranked.append(select(literal(entity, String).label('entity'), candidates.c.id,
+                                 candidates.c.name, rank.label('rank'))
+                          .order_by(rank.desc())
+                          .limit(params.offset + params.limit))
+
+        hits = union_all(*ranked).subquery()
+        query = (select(hits)
+                 .order_by(hits.c.rank.desc(), hits.c.entity, hits.c.id)
+                 .offset(params.offset)
+                 .limit(params.limit))
+        result = await db.execute(query)
+        return result.mappings().all()
+
+# Материализованные представления отчетов (создаются миграцией, в metadata их нет)
+category_units_view = table('report_category_units', column('product_category_id'),
+                            column('day'), column('products'), column('units'))
+laboratory_products_view = table('report_laboratory_products', column('laboratory_id'),
+                                 column('day'), column('products'))
+product_works_view = table('report_product_works', column('product_id'), column('day'), column('works'))
+headcount_view = table('report_headcount', column('workshop_id'), column('status'),
+                       column('engineers'), column('workers'))
+
+# Ключ advisory lock, чтобы представления обновлял только один процесс
+REPORTS_REFRESH_LOCK = 721_004_010
+
+def filter_period(query, date_column, period: ReportPeriod):
+    # Даты отчетов (process_start, test_date_start и day представлений) — timestamp без зоны
+    return filter_range(query, date_column, naive_utc(period.date_from), naive_utc(period.date_to))
+
+def day_period(period: ReportPeriod):
+    # В представлениях даты округлены до начала дня UTC
+    if period.date_from is None:
+        return period
+    date_from = naive_utc(period.date_from).replace(hour=0, minute=0, second=0, microsecond=0)
+    return period.model_copy(update={'date_from': date_from})
+
+# Класс реализовывающий агрегирующие отчеты
+class ReportsOperations:
+    async def get_category_units(db: AsyncSession, period: ReportPeriod):
+        if period.source == 'view':
+            units = category_units_view
+            query = (select(models.ProductCategory.id.label('product_category_id'), models.ProductCategory.name,
+                            func.sum(units.c.products).label('products'), func.sum(units.c.units).label('units'))
+                     .join(units, units.c.product_category_id == models.ProductCategory.id))
+            query = filter_period(query, units.c.day, day_period(period))
+        else:
+            query = (select(models.ProductCategory.id.label('product_category_id'), models.ProductCategory.name,
+                            func.count(models.Product.id).label('products'),
+                            func.coalesce(func.sum(models.Product.count), 0).label('units'))
+                     .join(models.Product, models.Product.product_category_id == models.ProductCategory.id)
+                     .where(models.Product.process_finish.is_(None), models.Product.deleted_at.is_(None)))
+            query = filter_period(query, models.Product.process_start, period)
+
+        result = await db.execute(query.group_by(models.ProductCategory.id).order_by(models.ProductCategory.id))
+        return result.mappings().all()
+
+    async def get_laboratory_products(db: AsyncSession, period: ReportPeriod):
+        if period.source == 'view':
+            products = laboratory_products_view
+            query = (select(models.TestLaboratories.id.label('laboratory_id'), models.TestLaboratories.name,
+                            products.c.products)
+                     .join(products, products.c.laboratory_id == models.TestLaboratories.id))
+            query = filter_period(query, products.c.day, day_period(period))
+        else:
+            query = (select(models.TestLaboratories.id.label('laboratory_id'), models.TestLaboratories.name,
+                            func.count(models.Product.id).label('products'))
+                     .join(models.Product, models.Product.laboratory_id == models.TestLaboratories.id)
+                     .where(models.Product.deleted_at.is_(None))
+                     .group_by(models.TestLaboratories.id))
+            query = filter_period(query, models.TestLaboratories.test_date_start, period)
+
+        result = await db.execute(query.order_by(models.TestLaboratories.id))
+        return result.mappings().all()
+
+    async def get_product_works(db: AsyncSession, period: ProductWorksPeriod):
+        if period.source == 'view':
+            works = product_works_view
+            query = (select(models.Product.id.label('product_id'), models.Product.name, works.c.works)
+                     .join(works, works.c.product_id == models.Product.id))
+            query = filter_period(query, works.c.day, day_period(period)).order_by(works.c.works.desc())
+        else:
+            works_count = func.count(models.WorksWithProduct.id)
+            query = (select(models.Product.id.label('product_id'), models.Product.name, works_count.label('works'))
+                     .join(models.WorksWithProduct, models.WorksWithProduct.product_id == models.Product.id)
+                     .where(models.Product.deleted_at.is_(None), models.WorksWithProduct.deleted_at.is_(None))
+                     .group_by(models.Product.id))
+            query = filter_period(query, models.Product.process_start, period).order_by(works_count.desc())
+
+        result = await db.execute(query.limit(period.limit))
+        return result.mappings().all()
+
+    async def get_headcount(db: AsyncSession, period: ReportPeriod):
+        if period.source == 'view':
+            query = select(headcount_view)
+        else:
+            engineers = (select(models.EngineerPersonal.workshop_id, models.EngineerPersonal.status,
+                                func.count().label('engineers'), literal_column('0').label('workers'))
+                         .group_by(models.EngineerPersonal.workshop_id, models.EngineerPersonal.status))
+            workers = (select(models.PersonalWorkers.workshop_id, models.PersonalWorkers.status,
+                              literal_column('0').label('engineers'), func.count().label('workers'))
+                       .group_by(models.PersonalWorkers.workshop_id, models.PersonalWorkers.status))
+            headcount = union_all(engineers, workers).subquery()
+            query = (select(headcount.c.workshop_id, headcount.c.status,
+                            func.sum(headcount.c.engineers).label('engineers'),
+                            func.sum(headcount.c.workers).label('workers'))
+                     .group_by(headcount.c.workshop_id, headcount.c.status))
+
+        result = await db.execute(query.order_by(text('workshop_id'), text('status')))
+        return result.mappings().all()
+
+    async def refresh_views(db: AsyncSession):
+        locked = await db.scalar(select(func.pg_try_advisory_xact_lock(REPORTS_REFRESH_LOCK)))
+        if locked:
+            # На полном объеме обновление дольше statement_timeout приложения; SET LOCAL
+            # действует до конца транзакции и не меняет настройку соединения в пуле
+            await db.execute(text('SET LOCAL statement_timeout = 0'))
+            await db.execute(select(func.refresh_report_views()))
+
+        return locked
+
+    async def refresh_views_periodically(interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as db, db.begin():
+                    await ReportsOperations.refresh_views(db)
+            except Exception:
+                # Ошибка обновления не должна останавливать цикл, следующая попытка через interval
+                logger.exception('Не удалось обновить представления отчетов')
@@ -1,15 +1,115 @@
+import asyncio
+import itertools
+import time
+
+from sqlalchemy import event, text
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncAttrs
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine, AsyncAttrs
 
 from src.config import settings
+from src.metrics import record_query
+from src.slow_queries import slow_query_log
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started
+    # Адаптер asyncpg сразу выбирает строки SELECT/RETURNING, для DML остаётся rowcount
+    rows = len(getattr(cursor, '_rows', ())) or max(cursor.rowcount, 0)
+    record_query(elapsed, rows)
+    slow_query_log.record(statement, parameters, elapsed, executemany)
+
+def make_engine(url: str) -> AsyncEngine:
+    # Одинаковые настройки пула и инструментирование для primary и реплик
+    new_engine = create_async_engine(
+        url=url,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            # Кэш подготовленных выражений SQLAlchemy и самого asyncpg
+            'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+            'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+            'server_settings': {'statement_timeout': str(settings.DB_STATEMENT_TIMEOUT)},
+        },
+    )
+    event.listen(new_engine.sync_engine, 'before_cursor_execute', start_query_timer)
+    event.listen(new_engine.sync_engine, 'after_cursor_execute', stop_query_timer)
+    return new_engine
 
+engine = make_engine(settings.DATABASE_URL)
 
-engine = create_async_engine(
-    url=settings.DATABASE_URL,
-    echo=True,
-)
+# Для GET: asyncpg начинает транзакцию сразу как BEGIN READ ONLY, без отдельного SET TRANSACTION
+read_only_engine = engine.execution_options(postgresql_readonly=True)
 
 session_factory = async_sessionmaker(engine, expire_on_commit=False)
 
+
+class ReplicaPool:
+    '''Реплики для чтения: выбор по кругу среди тех, что прошли последнюю проверку'''
+
+    def __init__(self, urls: list[str]):
+        self.engines = [make_engine(url) for url in urls]
+        self.readers = [replica.execution_options(postgresql_readonly=True) for replica in self.engines]
+        self.healthy = list(self.readers)
+        self.counter = itertools.count()
+        self.task: asyncio.Task | None = None
+
+    def choose(self) -> AsyncEngine | None:
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self.counter) % len(healthy)]
+
+    async def is_alive(self, replica: AsyncEngine) -> bool:
+        try:
+            async with asyncio.timeout(settings.DB_REPLICA_HEALTH_TIMEOUT):
+                async with replica.connect() as connection:
+                    await connection.execute(text('SELECT 1'))
+            return True
+        except Exception:
+            return False
+
+    async def check(self):
+        alive = await asyncio.gather(*(self.is_alive(replica) for replica in self.engines))
+        self.healthy = [reader for reader, ok in zip(self.readers, alive) if ok]
+
+    async def check_periodically(self, interval: float):
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+    async def start(self):
+        if self.engines:
+            self.task = asyncio.create_task(self.check_periodically(settings.DB_REPLICA_HEALTH_INTERVAL))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for replica in self.engines:
+            await replica.dispose()
+
+
+replica_pool = ReplicaPool(settings.DB_REPLICA_URLS)
+
+def routed_session(read_only: bool, use_replica: bool = True) -> AsyncSession:
+    # Чтение уходит на реплику, а если живых реплик нет — на primary в режиме READ ONLY.
+    # Запрос с записью целиком идет на primary, поэтому чтение после записи видит её.
+    # use_replica=False — для чтения того, что могло быть записано только что
+    if not read_only:
+        return session_factory()
+    replica = replica_pool.choose() if use_replica else None
+    return session_factory(bind=replica or read_only_engine)
+
 class Base(DeclarativeBase):
-    pass
\ No newline at end of file
+    pass
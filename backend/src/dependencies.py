@@ -1,21 +1,72 @@
+import csv
+import hashlib
+import io
+import json
+import re
+from datetime import datetime, timezone
 from typing import Any, Callable
-from fastapi import HTTPException
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+import orjson
+from pydantic import BaseModel, ValidationError
 
+from sqlalchemy import Select, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import src.models as models
+from src.database import Base, routed_session
+from src.jobs import enqueue
+from src.versions import table_version
+from src.schemas import BulkResult, BulkRowResult, Job, OnConflict, Pagination, TimeRangeFilter
 
-async def create_func(get_func: Callable, 
-                      create_func: Callable, 
+
+# SQLSTATE, который Postgres возвращает при нарушении уникального индекса
+UNIQUE_VIOLATION = '23505'
+# ... и при ссылке на несуществующую запись
+FOREIGN_KEY_VIOLATION = '23503'
+
+
+# Количество строк, которое выгрузка читает из серверного курсора за раз
+EXPORT_CHUNK_SIZE = 1000
+
+# Поля TimeRangeFilter применяются через filter_time_range, а не через filter_by
+TIME_RANGE_FIELDS = set(TimeRangeFilter.model_fields) - set(Pagination.model_fields)
+
+# Строк в одном INSERT массовой загрузки (лимит Postgres — 32767 параметров)
+BULK_BATCH_SIZE = 1000
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, 'sqlstate', None) == UNIQUE_VIOLATION
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, 'sqlstate', None) == FOREIGN_KEY_VIOLATION
+
+def foreign_key_not_found(error: IntegrityError) -> HTTPException:
+    # Исходная ошибка asyncpg лежит в __cause__, колонку Postgres называет в detail: Key (column)=(value)
+    column = re.search(r'Key \((\w+)\)', getattr(error.orig.__cause__, 'detail', None) or '')
+    if column is None:
+        return HTTPException(status_code=404, detail='Связанная запись не найдена')
+    return HTTPException(status_code=404, detail=f'Не найдена запись, на которую ссылается {column.group(1)}')
+
+async def create_func(create_func: Callable, 
                       db: AsyncSession, 
                       something: Any, 
                       entity_name: str):
     
-    check = await get_func(db)
-    if something.name in [item.name for item in check]:
-         raise HTTPException(status_code=400, detail=f'{entity_name} уже существует')
-
+    # Уникальность имени проверяет индекс в БД, отдельный SELECT не нужен
     try:
         result = await create_func(db, something)
+    except IntegrityError as error:
+        await db.rollback()
+        if is_unique_violation(error):
+            raise HTTPException(status_code=400, detail=f'{entity_name} уже существует')
+        if is_foreign_key_violation(error):
+            raise foreign_key_not_found(error)
+        raise HTTPException(status_code=500, detail='Ошибка на стороне сервера')
     except:
         raise HTTPException(status_code=500, detail='Ошибка на стороне сервера')
 
@@ -32,63 +83,284 @@ async def create_func_without_entity_name(create_func: Callable,
 
     return result
 
-async def update_func(get_func: Callable, 
-                      update_func: Callable, 
+async def bulk_func(bulk_func: Callable,
+                    schema: type[BaseModel],
+                    request: Request,
+                    db: AsyncSession,
+                    on_conflict: OnConflict,
+                    background: bool = False,
+                    response: Response | None = None):
+
+    try:
+        items = await read_bulk_body(request)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Ожидается JSON-массив или NDJSON')
+
+    outcomes, valid, indexes = validate_bulk_rows(items, schema)
+
+    if background:
+        # Тело проверено сразу, вставку выполнит воркер; строки хранятся в payload задачи как JSON
+        payload = {'operation': bulk_func.__qualname__,
+                   'on_conflict': on_conflict,
+                   'rows': [something.model_dump(mode='json') for something in valid],
+                   'indexes': indexes,
+                   'outcomes': [outcome.model_dump() for outcome in outcomes]}
+        job = await enqueue(db, 'bulk_import', payload, total=len(valid))
+        return job_accepted(job, response)
+
+    rows = [something.model_dump() for something in valid]
+    try:
+        returned = await run_bulk(bulk_func, db, rows, on_conflict)
+    except IntegrityError as error:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f'Ошибка в данных: {error.orig}')
+    except:
+        raise HTTPException(status_code=500, detail='Ошибка на стороне сервера')
+
+    return bulk_result(outcomes, rows, indexes, returned)
+
+def validate_bulk_rows(items: list, schema: type[BaseModel]):
+    outcomes, valid, indexes, names = [], [], [], set()
+    for index, item in enumerate(items):
+        try:
+            something = schema.model_validate_json(item) if isinstance(item, str) else schema.model_validate(item)
+        except ValidationError as error:
+            outcomes.append(BulkRowResult(index=index, status='invalid', detail=str(error)))
+            continue
+
+        # Повтор имени внутри одного запроса не может попасть в один ON CONFLICT
+        if something.name in names:
+            outcomes.append(BulkRowResult(index=index, status='duplicate'))
+            continue
+
+        names.add(something.name)
+        valid.append(something)
+        indexes.append(index)
+
+    return outcomes, valid, indexes
+
+async def run_bulk(bulk_func: Callable, db: AsyncSession, rows: list[dict], on_conflict: OnConflict,
+                   progress: Callable | None = None):
+    returned = {}
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        for row in await bulk_func(db, rows[start:start + BULK_BATCH_SIZE], on_conflict):
+            returned[row.name] = row
+        if progress is not None:
+            await progress(min(start + BULK_BATCH_SIZE, len(rows)))
+    return returned
+
+def bulk_result(outcomes: list[BulkRowResult], rows: list[dict], indexes: list[int], returned: dict):
+    for index, row in zip(indexes, rows):
+        result = returned.get(row['name'])
+        if result is None:
+            outcomes.append(BulkRowResult(index=index, status='skipped'))
+        else:
+            status = 'created' if result.inserted else 'updated'
+            outcomes.append(BulkRowResult(index=index, status=status, id=result.id))
+
+    outcomes.sort(key=lambda outcome: outcome.index)
+    statuses = [outcome.status for outcome in outcomes]
+    return BulkResult(created=statuses.count('created'),
+                      updated=statuses.count('updated'),
+                      skipped=statuses.count('skipped') + statuses.count('duplicate'),
+                      invalid=statuses.count('invalid'),
+                      rows=outcomes)
+
+def with_headers(result: Response, response: Response | None):
+    # Ответ, возвращенный напрямую, FastAPI отдает как есть: заголовки внедренного
+    # Response (ETag из etag_func) переносятся вручную, так же как это делает сам FastAPI
+    if response is not None:
+        result.headers.raw.extend(response.headers.raw)
+    return result
+
+def job_accepted(job: models.Job, response: Response | None = None):
+    return with_headers(JSONResponse(status_code=202, content=Job.model_validate(job).model_dump(mode='json'),
+                                     headers={'Location': f'/jobs/{job.id}'}), response)
+
+async def read_bulk_body(request: Request):
+    body = await request.body()
+    if request.headers.get('content-type', '').startswith('application/x-ndjson'):
+        # Строки NDJSON валидируются по отдельности, чтобы ошибка в одной не ломала весь запрос
+        return [line for line in body.decode().splitlines() if line.strip()]
+
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError('body is not a JSON array')
+    return items
+
+async def parse_body(request: Request, schema: type[BaseModel]):
+    # JSON разбирается напрямую pydantic, python-multipart нужен только формам
+    try:
+        if request.headers.get('content-type', '').startswith('application/json'):
+            return schema.model_validate_json(await request.body())
+
+        form = await request.form()
+        # Пустое поле формы считается непереданным, как у Form()
+        return schema.model_validate({key: value for key, value in form.items() if value != ''})
+    except ValidationError as error:
+        raise RequestValidationError([{**item, 'loc': ('body', *item['loc'])}
+                                      for item in error.errors(include_url=False)])
+
+def body_openapi(schema: type[BaseModel]):
+    body_schema = schema.model_json_schema()
+    return {'requestBody': {'required': True, 'content': {
+        'application/json': {'schema': body_schema},
+        'application/x-www-form-urlencoded': {'schema': body_schema},
+    }}}
+
+async def etag_func(request: Request, response: Response, db: AsyncSession, table_names: tuple[str, ...]):
+    # Версии только растут, поэтому их сумма меняется при любой записи в любую из таблиц
+    version = await table_version(db, table_names)
+    resource = f'{request.url.path}?{request.url.query}'.encode()
+    etag = f'W/"{version}-{hashlib.blake2b(resource, digest_size=8).hexdigest()}"'
+
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        raise HTTPException(status_code=304, headers={'ETag': etag})
+
+    response.headers['ETag'] = etag
+
+async def update_func(update_func: Callable, 
                       db: AsyncSession, 
                       something: Any, 
                       entity_name: str):
     
-    results = await get_func(db)
-    if something.id not in [item.id for item in results]:
-        raise HTTPException(status_code=404, detail=f'{entity_name} не найден')
-    
     try:
-        await update_func(db, something.id, something)
+        result = await update_func(db, something.id, something)
+    except IntegrityError as error:
+        await db.rollback()
+        if is_unique_violation(error):
+            raise HTTPException(status_code=400, detail=f'{entity_name} уже существует')
+        if is_foreign_key_violation(error):
+            raise foreign_key_not_found(error)
+        raise HTTPException(status_code=500, detail='Ошибка на стороне сервера')
     except:
         raise HTTPException(status_code=500, detail='Ошибка на стороне сервера')
+
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'{entity_name} не найден')
     
     return {'detail': f'{entity_name} успешно изменен' }
 
-async def delete_func(get_func: Callable,
-                      del_func: Callable, 
+async def delete_func(del_func: Callable, 
                       db: AsyncSession, 
                       something_id: int,
                       entity_name: str):
     
-    results = await get_func(db)
-    
-    if something_id not in [item.id for item in results]:
-        raise HTTPException(status_code=404, detail=f'{entity_name} не найден')
-    
     try:
-        await del_func(db, something_id)
+        result = await del_func(db, something_id)
     except:
         raise HTTPException(status_code=500, detail=f'{entity_name} на стороне сервера')
 
-    return {'detail': f'{entity_name} успешно удален'}
-
-async def db_update(something: Any, db: AsyncSession, something_data: Any):
-    result = something.scalars().first()
-    update_product = something_data.model_dump(exclude_unset=True)
-    
-    for field, value in update_product.items():
-        setattr(result, field, value)
-        
-    await db.commit()
-    await db.refresh(result)
-    
-    return result
+    if result is None:
+        raise HTTPException(status_code=404, detail=f'{entity_name} не найден')
 
-async def db_delete(something: Any, db: AsyncSession):
-    db_product = something.scalars().first()
-    await db.delete(db_product)
-    await db.commit()
-    
-    return db_product
+    return {'detail': f'{entity_name} успешно удален'}
 
 async def db_create(something: Any, db: AsyncSession):
+    # server_default колонки возвращаются через INSERT ... RETURNING,
+    # поэтому повторный refresh не нужен. flush, а не commit: нарушения
+    # ограничений видны сразу, а транзакцию фиксирует get_db
     db.add(something)
-    await db.commit()
-    await db.refresh(something)
+    await db.flush()
     
-    return something
\ No newline at end of file
+    return something
+
+def live_rows(model: type[Base]) -> list:
+    # У мягко удаляемых моделей (products, works_with_product) читаются и меняются только
+    # строки с deleted_at IS NULL — это условие частичных индексов этих таблиц
+    if 'deleted_at' not in model.__table__.c:
+        return []
+    return [model.deleted_at.is_(None)]
+
+async def db_bulk_upsert(model: type[Base], db: AsyncSession, rows: list[dict], on_conflict: OnConflict):
+    statement = insert(model).values(rows)
+    # Уникальный индекс имени у мягко удаляемых таблиц частичный, ON CONFLICT должен его назвать
+    index_where = live_rows(model)[0] if live_rows(model) else None
+    if on_conflict == 'update':
+        statement = statement.on_conflict_do_update(
+            index_elements=['name'],
+            index_where=index_where,
+            set_={field: statement.excluded[field] for field in rows[0]},
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=['name'], index_where=index_where)
+
+    # xmax = 0 только у только что вставленных строк, у обновленных он заполнен
+    statement = statement.returning(model.id, model.name, literal_column('xmax = 0').label('inserted'))
+    result = await db.execute(statement)
+    return result.all()
+
+def naive_utc(moment: datetime | None) -> datetime | None:
+    # Колонки timestamp без зоны хранят UTC; asyncpg не принимает для них значение с зоной
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def filter_range(query: Select, column: Any, start: Any, end: Any):
+    # Полуинтервал [start, end), пустые границы не ограничивают выборку
+    if start is not None:
+        query = query.where(column >= start)
+    if end is not None:
+        query = query.where(column < end)
+    return query
+
+def filter_time_range(query: Select, start_column: Any, finish_column: Any, params: TimeRangeFilter | None):
+    if params is None:
+        return query
+    # Начало (process_start, test_date_start) хранится без зоны, окончание — timestamptz
+    query = filter_range(query, start_column, naive_utc(params.started_from), naive_utc(params.started_to))
+    return filter_range(query, finish_column, params.finished_from, params.finished_to)
+
+def db_paginate(query: Select, model: type[Base], params: Pagination | None, exclude: set[str] = set()):
+    # Без параметров запрос остается как есть (полная выборка для внутренних нужд)
+    if params is None:
+        return query
+
+    filters = params.model_dump(exclude_none=True, exclude={'limit', 'after', 'format', *TIME_RANGE_FIELDS, *exclude})
+    query = query.filter_by(**filters).order_by(model.id)
+    if params.after is not None:
+        query = query.where(model.id > params.after)
+    if params.format == 'json' or 'limit' in params.model_fields_set:
+        query = query.limit(params.limit)
+
+    return query
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        # OPT_UTC_Z пишет UTC как Z, так же как pydantic
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+async def fast_json_response(query: Select, model: type[Base], schema: type[BaseModel], db: AsyncSession,
+                             response: Response | None = None):
+    # Только колонки схемы, без ORM-объектов, identity map и построчной валидации
+    columns = [model.__table__.c[field] for field in schema.model_fields]
+    result = await db.execute(query.with_only_columns(*columns))
+    keys = list(result.keys())
+
+    return with_headers(FastJSONResponse([dict(zip(keys, row)) for row in result]), response)
+
+def export_response(query: Select, schema: type[BaseModel], export_format: str, response: Response | None = None):
+    media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return with_headers(StreamingResponse(stream_export(query, schema, export_format), media_type=media_type), response)
+
+async def stream_export(query: Select, schema: type[BaseModel], export_format: str):
+    # Сессия из get_db закрывается до отправки тела ответа,
+    # поэтому выгрузка открывает собственную на время стрима (с реплики, если есть)
+    async with routed_session(read_only=True) as db:
+        result = await db.stream_scalars(query, execution_options={'yield_per': EXPORT_CHUNK_SIZE})
+
+        if export_format == 'csv':
+            yield encode_csv([list(schema.model_fields)])
+
+        async for rows in result.partitions():
+            items = [schema.model_validate(row, from_attributes=True) for row in rows]
+            if export_format == 'csv':
+                yield encode_csv([item.model_dump(mode='json').values() for item in items])
+            else:
+                yield ''.join(item.model_dump_json() + '\n' for item in items)
+
+def encode_csv(rows: list):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
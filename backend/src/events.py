@@ -0,0 +1,238 @@
+import asyncio
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import asyncpg
+from fastapi import WebSocket
+
+from src.config import settings
+
+
+# Канал NOTIFY; триггеры создаются миграцией change_events
+CHANNEL = 'entity_changes'
+
+EVENT_TABLES = ('product', 'product_category', 'personal_category', 'engineer_personal',
+                'personal_workers', 'brigades', 'workshop', 'test_laboratories',
+                'personal_laboratories', 'tools', 'works_with_product')
+
+# Служебные события: клиент должен перечитать данные, пропущенные изменения не восстановить
+OVERFLOW = ('overflow', '{}')
+RESYNC = ('resync', '{}')
+
+
+@dataclass
+class Topic:
+    '''Таблица и фильтры по колонкам строки: product:category=3,laboratory=1'''
+
+    table: str
+    filters: dict[str, str] = field(default_factory=dict)
+
+    def matches(self, event: dict) -> bool:
+        if event['table'] != self.table:
+            return False
+        row = event.get('row')
+        if row is None:
+            # Строка не поместилась в NOTIFY, проверить фильтры нельзя — событие отдается
+            return True
+        return all(str(filter_value(row, self.table, key)) == value for key, value in self.filters.items())
+
+
+def filter_value(row: dict, table: str, key: str):
+    # category у product означает product_category_id, workshop — workshop_id
+    for column in (key, f'{key}_id', f'{table}_{key}_id'):
+        if column in row:
+            return row[column]
+    return None
+
+def parse_topic(raw: str) -> Topic:
+    table, _, filter_part = raw.partition(':')
+    if table not in EVENT_TABLES:
+        raise ValueError(f'Неизвестная таблица {table!r}')
+
+    filters = {}
+    for condition in filter(None, filter_part.split(',')):
+        key, sep, value = condition.partition('=')
+        if not sep or not key or not value:
+            raise ValueError(f'Фильтр {condition!r} должен иметь вид колонка=значение')
+        filters[key] = value
+    return Topic(table, filters)
+
+
+class Subscription:
+    '''Очередь одного клиента; медленный клиент отключается, а не тормозит остальных'''
+
+    def __init__(self, topics: list[Topic]):
+        self.topics = topics
+        self.queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.closed = False
+
+    def matches(self, event: dict) -> bool:
+        return not self.topics or any(topic.matches(event) for topic in self.topics)
+
+    def push(self, message: tuple[str, str]):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Непрочитанные события выбрасываются, последним клиент получает overflow
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+            self.closed = True
+
+    async def next(self) -> tuple[str, str]:
+        return await self.queue.get()
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class ChangeFeed:
+    '''Одно соединение LISTEN на процесс, события раздаются подписчикам по таблицам'''
+
+    def __init__(self):
+        self.by_table: dict[str, set[Subscription]] = defaultdict(set)
+        self.all_tables: set[Subscription] = set()
+        self.count = 0
+        self.connected = False
+        self.task: asyncio.Task | None = None
+
+    def full(self) -> bool:
+        return self.count >= settings.EVENTS_MAX_SUBSCRIBERS
+
+    def subscribe(self, topics: list[Topic]) -> Subscription:
+        if self.full():
+            raise TooManySubscribers
+        subscription = Subscription(topics)
+        if not topics:
+            self.all_tables.add(subscription)
+        for topic in topics:
+            self.by_table[topic.table].add(subscription)
+        self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.all_tables.discard(subscription)
+        for topic in subscription.topics:
+            self.by_table[topic.table].discard(subscription)
+        subscription.closed = True
+        self.count -= 1
+
+    def on_notify(self, connection, pid, channel, payload):
+        # JSON разбирается один раз, клиентам уходит исходная строка без повторной сериализации
+        try:
+            event = json.loads(payload)
+            table = event['table']
+        except (ValueError, TypeError, KeyError):
+            # В канал может написать кто угодно с доступом к БД
+            return
+        for subscription in (*self.by_table.get(table, ()), *self.all_tables):
+            if subscription.matches(event):
+                subscription.push(('change', payload))
+
+    def broadcast(self, message: tuple[str, str]):
+        subscriptions = set(self.all_tables).union(*self.by_table.values())
+        for subscription in subscriptions:
+            subscription.push(message)
+
+    async def start(self):
+        self.task = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def listen(self):
+        # После обрыва соединения переподключается; события за время обрыва потеряны,
+        # поэтому подписчики получают resync
+        delay = 1
+        reconnected = False
+        while True:
+            connection: asyncpg.Connection | None = None
+            try:
+                connection = await asyncpg.connect(user=settings.POSTGRES_USER,
+                                                   password=settings.POSTGRES_PASSWORD,
+                                                   host=settings.POSTGRES_HOST,
+                                                   port=settings.POSTGRES_PORT,
+                                                   database=settings.POSTGRES_NAME)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, self.on_notify)
+                self.connected = True
+                delay = 1
+                if reconnected:
+                    self.broadcast(RESYNC)
+                reconnected = True
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), settings.EVENTS_HEARTBEAT)
+                    except TimeoutError:
+                        # Без трафика разрыв TCP может остаться незамеченным
+                        await connection.execute('SELECT 1')
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                pass
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+change_feed = ChangeFeed()
+
+
+async def sse_events(topics: list[Topic]):
+    # Подписка создается внутри генератора: finally гарантированно снимет её при отключении
+    subscription = change_feed.subscribe(topics)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event, data = await asyncio.wait_for(subscription.next(), settings.EVENTS_HEARTBEAT)
+            except TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield f'event: {event}\ndata: {data}\n\n'
+            if (event, data) == OVERFLOW:
+                return
+    finally:
+        change_feed.unsubscribe(subscription)
+
+async def websocket_events(websocket: WebSocket, topics: list[Topic]):
+    async def send():
+        while True:
+            event, data = await subscription.next()
+            await websocket.send_text(f'{{"event": "{event}", "data": {data}}}')
+            if (event, data) == OVERFLOW:
+                # 1013: попробуйте позже — клиент переподключается и перечитывает данные
+                await websocket.close(code=1013)
+                return
+
+    async def receive():
+        # Входящие сообщения не нужны, чтение только замечает отключение клиента
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+
+    subscription = change_feed.subscribe(topics)
+    tasks = []
+    try:
+        await websocket.accept()
+        tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Отписка до первого await: при отмене запроса ожидание задач может быть прервано
+        change_feed.unsubscribe(subscription)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import and_, event, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import src.models as models
+from src.config import settings
+from src.database import session_factory
+
+
+logger = logging.getLogger(__name__)
+
+# Флаг в session.info: транзакция поставила задачи, воркеры будятся после commit
+ENQUEUED_FLAG = 'jobs_enqueued'
+
+# Обработчик получает сессию задачи, payload и функцию отчета о прогрессе; возвращает result
+Progress = Callable[[int, int | None], Awaitable[None]]
+JOB_HANDLERS: dict[str, Callable[[AsyncSession, dict, Progress], Awaitable[Any]]] = {}
+
+
+def job_handler(kind: str):
+    def decorator(func: Callable):
+        JOB_HANDLERS[kind] = func
+        return func
+
+    return decorator
+
+async def enqueue(db: AsyncSession, kind: str, payload: dict, total: int | None = None) -> models.Job:
+    # Задача пишется в транзакции запроса: без commit воркеры её не увидят
+    job = models.Job(kind=kind, status='queued', payload=payload, total=total, progress=0, attempts=0)
+    db.add(job)
+    await db.flush()
+    db.info[ENQUEUED_FLAG] = True
+    return job
+
+@event.listens_for(Session, 'after_commit')
+def wake_after_commit(session: Session):
+    if session.info.pop(ENQUEUED_FLAG, False):
+        job_workers.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def reset_after_rollback(session: Session):
+    session.info.pop(ENQUEUED_FLAG, None)
+
+
+class JobWorkers:
+    '''Пул воркеров в процессе; задачи разбираются через SELECT ... FOR UPDATE SKIP LOCKED'''
+
+    def __init__(self):
+        self.tasks: list[asyncio.Task] = []
+        self.wakeup: asyncio.Event | None = None
+
+    def wake(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def start(self, count: int):
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(count)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.wakeup = None
+
+    async def work(self):
+        while True:
+            try:
+                claimed = await self.claim()
+            except Exception:
+                # БД недоступна: повтор после обычной паузы опроса
+                logger.exception('Воркер не смог взять задачу')
+                claimed = None
+
+            if claimed is not None:
+                try:
+                    await self.run(*claimed)
+                except Exception:
+                    # Не записался итог задачи (БД недоступна): воркер остается в пуле,
+                    # а задачу после истечения аренды подберет повторно
+                    logger.exception('Воркер не завершил задачу %s', claimed[0])
+                continue
+
+            # Другие процессы не будят этот пул, поэтому очередь ещё и опрашивается
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), settings.JOBS_POLL_INTERVAL)
+            except TimeoutError:
+                pass
+
+    async def claim(self):
+        # Аренда вместо долгой блокировки строки: транзакция короткая, а задачу
+        # упавшего процесса другой воркер подберет после истечения locked_until
+        job = models.Job
+        pending = (select(job.id)
+                   .where(or_(job.status == 'queued',
+                              and_(job.status == 'running', job.locked_until < func.now())))
+                   .order_by(job.id)
+                   .limit(1)
+                   .with_for_update(skip_locked=True)
+                   .scalar_subquery())
+        statement = (update(job)
+                     .where(job.id == pending)
+                     .values(status='running', attempts=job.attempts + 1, started_at=func.now(),
+                             locked_until=func.now() + lease())
+                     .returning(job.id, job.kind, job.payload, job.attempts))
+        async with session_factory() as db, db.begin():
+            return (await db.execute(statement)).first()
+
+    async def run(self, job_id: int, kind: str, payload: dict, attempts: int):
+        handler = JOB_HANDLERS.get(kind)
+        if handler is None:
+            return await finish(job_id, 'failed', error=f'Неизвестный тип задачи {kind}')
+        if attempts > settings.JOBS_MAX_ATTEMPTS:
+            return await finish(job_id, 'failed', error='Превышено число попыток')
+
+        renewal = asyncio.create_task(renew_lease(job_id))
+        try:
+            async with session_factory() as db, db.begin():
+                result = await handler(db, payload, lambda done, total=None: report_progress(job_id, done, total))
+                # Итог пишется в той же транзакции, что и сама работа
+                await db.execute(finished(job_id, 'done', result=result))
+        except Exception as error:
+            # Ошибка сохраняется в задаче, клиент увидит её в /jobs/{id}. У ошибок БД
+            # только текст драйвера, без SQL и значений параметров
+            error = getattr(error, 'orig', None) or error
+            await finish(job_id, 'failed', error=str(error) or type(error).__name__)
+        finally:
+            renewal.cancel()
+
+
+def lease():
+    return timedelta(seconds=settings.JOBS_LEASE)
+
+def finished(job_id: int, status: str, result: Any = None, error: str | None = None):
+    return (update(models.Job)
+            .filter_by(id=job_id)
+            .values(status=status, result=result, error=error,
+                    finished_at=func.now(), locked_until=None))
+
+async def finish(job_id: int, status: str, result: Any = None, error: str | None = None):
+    async with session_factory() as db, db.begin():
+        await db.execute(finished(job_id, status, result, error))
+
+async def report_progress(job_id: int, done: int, total: int | None = None):
+    # Отдельная короткая транзакция: прогресс виден, пока работа задачи не зафиксирована
+    values = {'progress': done, 'locked_until': func.now() + lease()}
+    if total is not None:
+        values['total'] = total
+    async with session_factory() as db, db.begin():
+        await db.execute(update(models.Job).filter_by(id=job_id).values(**values))
+
+async def renew_lease(job_id: int):
+    # Один долгий запрос без отчетов о прогрессе не должен отдавать задачу другому воркеру
+    while True:
+        await asyncio.sleep(settings.JOBS_LEASE / 3)
+        try:
+            async with session_factory() as db, db.begin():
+                await db.execute(update(models.Job)
+                                 .filter_by(id=job_id, status='running')
+                                 .values(locked_until=func.now() + lease()))
+        except Exception:
+            # Следующая попытка через треть аренды, до её истечения
+            pass
+
+
+job_workers = JobWorkers()
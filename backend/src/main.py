@@ -1,14 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 
+from src.cache import cache_listener
+from src.config import settings
+from src.crud import ReportsOperations
+from src.database import engine, replica_pool
+from src.events import change_feed
+from src.jobs import job_workers
+from src.metrics import MetricsMiddleware
+from src.slow_queries import slow_query_log
+from src.versions import compact_periodically
 from .router import product_router, product_category_router, personal_category_router, \
     engineer_personal_router, personal_workers_router, brigades_router, workshops_router, \
-    laboratories_router, personal_laboratories_router, tools_router, works_with_product_router
+    laboratories_router, personal_laboratories_router, tools_router, works_with_product_router, \
+    internal_router, reports_router, metrics_router, production_runs_router, search_router, \
+    events_router, jobs_router
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await cache_listener.start()
+    await change_feed.start()
+    await slow_query_log.start()
+    await replica_pool.start()
+    await job_workers.start(settings.JOBS_WORKERS)
+    compact_task = asyncio.create_task(compact_periodically(settings.TABLE_VERSIONS_COMPACT_INTERVAL))
+    refresh_task = None
+    if settings.REPORTS_REFRESH_INTERVAL > 0:
+        refresh_task = asyncio.create_task(
+            ReportsOperations.refresh_views_periodically(settings.REPORTS_REFRESH_INTERVAL))
+
+    yield
+
+    for task in (refresh_task, compact_task):
+        if task is None:
+            continue
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Прерванная задача останется running и будет взята снова после истечения аренды
+    await job_workers.stop()
+    await slow_query_log.stop()
+    await change_feed.stop()
+    await cache_listener.stop()
+    # Соединения закрываются штатно, а не обрываются вместе с процессом
+    await replica_pool.stop()
+    await engine.dispose()
+
 app = FastAPI(
     title='Car Factory',
+    lifespan=lifespan,
 )
 
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(product_router)
 
 app.include_router(product_category_router)
@@ -30,3 +76,17 @@ app.include_router(personal_laboratories_router)
 app.include_router(tools_router)
 
 app.include_router(works_with_product_router)
+
+app.include_router(production_runs_router)
+
+app.include_router(search_router)
+
+app.include_router(events_router)
+
+app.include_router(jobs_router)
+
+app.include_router(reports_router)
+
+app.include_router(internal_router)
+
+app.include_router(metrics_router)
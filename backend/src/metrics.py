@@ -0,0 +1,197 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable
+
+from fastapi.routing import APIRoute
+
+
+@dataclass
+class RequestMetrics:
+    '''Счётчики одного запроса; заполняются событиями движка и маршрутом'''
+
+    started: float
+    route: str | None = None
+    queries: int = 0
+    db_time: float = 0.0
+    rows: int = 0
+    endpoint_done: float | None = None
+    serialization_time: float = 0.0
+
+
+# Метрики текущего запроса; вне HTTP-запроса (фоновые задачи) значение None
+current_metrics: ContextVar[RequestMetrics | None] = ContextVar('current_metrics', default=None)
+
+
+def record_query(elapsed: float, rows: int):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        metrics.rows += rows
+
+
+class Histogram:
+    '''Гистограмма в формате Prometheus с отдельной серией на каждый набор меток'''
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...], labels: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, label_values: tuple, value: float):
+        # [счётчики по корзинам..., сумма, количество]
+        series = self.series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def expose(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for label_values, series in self.series.items():
+            labels = format_labels(self.labels, label_values)
+            cumulative = 0
+            for bucket, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.series: dict[tuple, float] = {}
+
+    def inc(self, label_values: tuple, value: float = 1):
+        self.series[label_values] = self.series.get(label_values, 0) + value
+
+    def expose(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for label_values, value in self.series.items():
+            lines.append(f'{self.name}{{{format_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def format_labels(names: tuple[str, ...], values: tuple) -> str:
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROUTE_LABELS = ('method', 'route')
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Полное время обработки запроса',
+                             LATENCY_BUCKETS, ROUTE_LABELS)
+DB_DURATION = Histogram('http_request_db_duration_seconds', 'Время выполнения SQL за запрос',
+                        LATENCY_BUCKETS, ROUTE_LABELS)
+DB_QUERIES = Histogram('http_request_db_queries', 'Число SQL-выражений за запрос',
+                       QUERY_BUCKETS, ROUTE_LABELS)
+SERIALIZATION_DURATION = Histogram('http_request_serialization_seconds',
+                                   'Время от возврата обработчика до начала ответа',
+                                   LATENCY_BUCKETS, ROUTE_LABELS)
+REQUESTS = Counter('http_requests_total', 'Число запросов', (*ROUTE_LABELS, 'status'))
+DB_ROWS = Counter('http_request_db_rows_total', 'Строк получено или изменено SQL', ROUTE_LABELS)
+
+METRICS = (REQUEST_DURATION, DB_DURATION, DB_QUERIES, SERIALIZATION_DURATION, REQUESTS, DB_ROWS)
+
+
+def expose_metrics() -> str:
+    # Метрики в памяти процесса: при нескольких воркерах каждый отдаёт свои
+    return '\n'.join(line for metric in METRICS for line in metric.expose()) + '\n'
+
+
+def timed_endpoint(endpoint: Callable):
+    endpoint = getattr(endpoint, '__timed__', endpoint)
+
+    @wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            metrics = current_metrics.get()
+            if metrics is not None:
+                metrics.endpoint_done = time.perf_counter()
+
+    wrapper.__timed__ = endpoint
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    '''Маршрут, который отмечает шаблон пути и момент возврата обработчика'''
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        # include_router пересоздаёт маршрут с префиксом, обёртка заменяется, а не вкладывается
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def route_handler(request):
+            # Шаблон пути отмечается до зависимостей: 304 от etag не доходит до обработчика
+            metrics = current_metrics.get()
+            if metrics is not None:
+                metrics.route = path
+            return await handler(request)
+
+        return route_handler
+
+
+class MetricsMiddleware:
+    '''ASGI-middleware: Server-Timing в заголовках ответа и гистограммы по маршрутам'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        metrics = RequestMetrics(started=time.perf_counter())
+        token = current_metrics.set(metrics)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                now = time.perf_counter()
+                if metrics.endpoint_done is not None:
+                    metrics.serialization_time = now - metrics.endpoint_done
+                message['headers'] = [*message.get('headers', []), (b'server-timing', server_timing(metrics, now))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_metrics.reset(token)
+            observe(scope, metrics, status)
+
+
+def server_timing(metrics: RequestMetrics, now: float) -> bytes:
+    return (f'db;dur={metrics.db_time * 1000:.3f};desc="queries={metrics.queries} rows={metrics.rows}", '
+            f'serialize;dur={metrics.serialization_time * 1000:.3f}, '
+            f'app;dur={(now - metrics.started) * 1000:.3f}').encode()
+
+def observe(scope, metrics: RequestMetrics, status: int):
+    # Несопоставленные пути не попадают в метки, иначе число серий не ограничено
+    route = metrics.route or ('unmatched' if 'endpoint' not in scope else scope['path'])
+    labels = (scope['method'], route)
+    REQUEST_DURATION.observe(labels, time.perf_counter() - metrics.started)
+    DB_DURATION.observe(labels, metrics.db_time)
+    DB_QUERIES.observe(labels, metrics.queries)
+    SERIALIZATION_DURATION.observe(labels, metrics.serialization_time)
+    REQUESTS.inc((*labels, status))
+    DB_ROWS.inc(labels, metrics.rows)
@@ -1,5 +1,6 @@
-from datetime import datetime
-from sqlalchemy import ForeignKey, text, DateTime
+from datetime import date, datetime
+from sqlalchemy import BigInteger, ForeignKey, Identity, Index, text, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Annotated
 
@@ -7,18 +8,33 @@ from src.database import Base
 
 intpk = Annotated[int, mapped_column(primary_key=True)]
 
+# Условие частичных индексов по живым строкам мягко удаляемых таблиц
+LIVE_ROWS = text('deleted_at IS NULL')
+
 class Product(Base):
     '''Таблица описывающая продукт'''
     
     __tablename__ = 'product'
+    # Составные индексы под фильтр по внешнему ключу с keyset-пагинацией по id
+    __table_args__ = (
+        Index('ix_product_product_category_id_id', 'product_category_id', 'id'),
+        Index('ix_product_laboratory_id_id', 'laboratory_id', 'id'),
+        Index('ix_product_process_start_brin', 'process_start', postgresql_using='brin'),
+        Index('ix_product_process_finish', 'process_finish'),
+        Index('ix_product_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Имя уникально среди живых продуктов, удаленный не мешает завести продукт с тем же именем
+        Index('ix_product_name', 'name', unique=True, postgresql_where=LIVE_ROWS),
+        Index('ix_product_live_id', 'id', postgresql_where=LIVE_ROWS),
+    )
 
     id: Mapped[intpk]
     name: Mapped[str]
     count: Mapped[int] = mapped_column(nullable=True)
     process_start: Mapped[datetime] = mapped_column(DateTime, server_default=text('NOW()'))
-    process_finish: Mapped[str | None]
+    process_finish: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     product_category_id: Mapped[int] = mapped_column(ForeignKey('product_category.id', ondelete='CASCADE'))
-    laboratory_id: Mapped[int | None] = mapped_column(ForeignKey('test_laboratories.id'))
+    laboratory_id: Mapped[int | None] = mapped_column(ForeignKey('test_laboratories.id', ondelete='SET NULL'))
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
     product_category = relationship('ProductCategory', back_populates='products')
     laboratory = relationship('TestLaboratories', back_populates='products')
@@ -28,9 +44,12 @@ class ProductCategory(Base):
     '''Таблица описывающая категорию продукта'''
 
     __tablename__ = 'product_category'
+    __table_args__ = (
+        Index('ix_product_category_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk]
-    name: Mapped[str]
+    name: Mapped[str] = mapped_column(unique=True, index=True)
 
     products = relationship('Product', back_populates='product_category')
     workshop = relationship('Workshop', back_populates='product_category')
@@ -39,9 +58,12 @@ class PersonalCategory(Base):
     '''Таблица описывающая категорию персонала'''
     
     __tablename__ = 'personal_category'
+    __table_args__ = (
+        Index('ix_personal_category_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk]
-    name: Mapped[str]
+    name: Mapped[str] = mapped_column(unique=True, index=True)
 
     eng_personal = relationship('EngineerPersonal', back_populates='personal_category')
 
@@ -49,10 +71,15 @@ class EngineerPersonal(Base):
     '''Таблица описывающая персонала инженеров'''
 
     __tablename__ = 'engineer_personal'
+    __table_args__ = (
+        Index('ix_engineer_personal_personal_category_id_id', 'personal_category_id', 'id'),
+        Index('ix_engineer_personal_workshop_id_id', 'workshop_id', 'id'),
+        Index('ix_engineer_personal_full_name_trgm', 'full_name', postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk]
     full_name: Mapped[str]
-    birthday: Mapped[str]
+    birthday: Mapped[date]
     status: Mapped[str]
     personal_category_id: Mapped[int] = mapped_column(ForeignKey('personal_category.id', ondelete="CASCADE"))
     workshop_id: Mapped[int] = mapped_column(ForeignKey('workshop.id'))
@@ -64,10 +91,15 @@ class PersonalWorkers(Base):
     '''Таблица описывающая персонал работников'''
 
     __tablename__ = 'personal_workers'
+    __table_args__ = (
+        Index('ix_personal_workers_personal_category_id_id', 'personal_category_id', 'id'),
+        Index('ix_personal_workers_workshop_id_id', 'workshop_id', 'id'),
+        Index('ix_personal_workers_full_name_trgm', 'full_name', postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk]
     full_name: Mapped[str]
-    birthday: Mapped[str]
+    birthday: Mapped[date]
     status: Mapped[str]
     personal_category_id: Mapped[int] = mapped_column(ForeignKey('personal_category.id', ondelete="CASCADE"))
     workshop_id: Mapped[int] = mapped_column(ForeignKey('workshop.id'))
@@ -76,19 +108,32 @@ class Brigades(Base):
     '''Таблица описывающая бригады'''
 
     __tablename__ = 'brigades'
+    __table_args__ = (
+        Index('ix_brigades_workshop_id_id', 'workshop_id', 'id'),
+        Index('ix_brigades_product_id_id', 'product_id', 'id'),
+        Index('ix_brigades_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Бригада удаляется мягко вместе со своим продуктом, окончательно — каскадом при его архивации
+        Index('ix_brigades_name', 'name', unique=True, postgresql_where=LIVE_ROWS),
+        Index('ix_brigades_live_id', 'id', postgresql_where=LIVE_ROWS),
+    )
 
     id: Mapped[intpk]
     name: Mapped[str]
     workshop_id: Mapped[int] = mapped_column(ForeignKey('workshop.id', ondelete='CASCADE'))
     product_id: Mapped[int] = mapped_column(ForeignKey('product.id', ondelete='CASCADE'))
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
 class Workshop(Base):
     '''Таблица описывающая цеха'''
 
     __tablename__ = 'workshop'
+    __table_args__ = (
+        Index('ix_workshop_product_category_id_id', 'product_category_id', 'id'),
+        Index('ix_workshop_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk]
-    name: Mapped[str]
+    name: Mapped[str] = mapped_column(unique=True, index=True)
     product_category_id: Mapped[int] = mapped_column(ForeignKey('product_category.id', ondelete="CASCADE"))
 
     eng_personal = relationship('EngineerPersonal', back_populates='workshop')
@@ -98,11 +143,16 @@ class TestLaboratories(Base):
     '''Таблица описывающая лаборатории'''
 
     __tablename__ = 'test_laboratories'
+    __table_args__ = (
+        Index('ix_test_laboratories_test_date_start_brin', 'test_date_start', postgresql_using='brin'),
+        Index('ix_test_laboratories_test_date_finish', 'test_date_finish'),
+        Index('ix_test_laboratories_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk]
-    name: Mapped[str]
+    name: Mapped[str] = mapped_column(unique=True, index=True)
     test_date_start: Mapped[datetime] = mapped_column(DateTime, server_default=text("NOW()"))
-    test_date_finish: Mapped[str | None]
+    test_date_finish: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
     products = relationship('Product', back_populates='laboratory')
     personal_lab = relationship('PersonalLaboratories', back_populates='laboratory')
@@ -112,10 +162,14 @@ class PersonalLaboratories(Base):
     '''Таблица описывающая персонал лабораторий'''
 
     __tablename__ = 'personal_laboratories'
+    __table_args__ = (
+        Index('ix_personal_laboratories_laboratory_id_id', 'laboratory_id', 'id'),
+        Index('ix_personal_laboratories_full_name_trgm', 'full_name', postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk] 
     full_name: Mapped[str]
-    birthday: Mapped[str]
+    birthday: Mapped[date]
     status: Mapped[str]
     laboratory_id: Mapped[int] = mapped_column(ForeignKey('test_laboratories.id'))
 
@@ -125,6 +179,10 @@ class Tools(Base):
     '''Таблица описывающая инструменты для лабораторий'''
 
     __tablename__ = 'tools'
+    __table_args__ = (
+        Index('ix_tools_laboratory_id_id', 'laboratory_id', 'id'),
+        Index('ix_tools_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[intpk]
     name: Mapped[str]
@@ -136,9 +194,94 @@ class WorksWithProduct(Base):
     '''Таблица описывающая работы с продуктом'''
 
     __tablename__ = 'works_with_product'
+    __table_args__ = (
+        Index('ix_works_with_product_product_id_id', 'product_id', 'id'),
+        Index('ix_works_with_product_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('ix_works_with_product_name', 'name', unique=True, postgresql_where=LIVE_ROWS),
+        Index('ix_works_with_product_live_id', 'id', postgresql_where=LIVE_ROWS),
+    )
 
     id: Mapped[intpk]
     name: Mapped[str]
     product_id: Mapped[int] = mapped_column(ForeignKey('product.id', ondelete="CASCADE"))
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+    product = relationship('Product', back_populates='works_for_product')
 
-    product = relationship('Product', back_populates='works_for_product')
\ No newline at end of file
+class ProductHistory(Base):
+    '''Архив завершенных продуктов, секционирован по месяцу process_finish'''
+
+    __tablename__ = 'product_history'
+    # Ключ секционирования обязан входить в первичный ключ. Внешних ключей нет:
+    # категория или лаборатория могут быть удалены, а история остается
+    __table_args__ = (
+        Index('ix_product_history_product_category_id', 'product_category_id'),
+        {'postgresql_partition_by': 'RANGE (process_finish)'},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str]
+    count: Mapped[int] = mapped_column(nullable=True)
+    process_start: Mapped[datetime] = mapped_column(DateTime)
+    process_finish: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    product_category_id: Mapped[int]
+    laboratory_id: Mapped[int | None]
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text('NOW()'))
+
+class WorksWithProductHistory(Base):
+    '''Архив работ с продуктом, секционирован так же, как архив продуктов'''
+
+    __tablename__ = 'works_with_product_history'
+    __table_args__ = (
+        Index('ix_works_with_product_history_product_id', 'product_id'),
+        {'postgresql_partition_by': 'RANGE (product_process_finish)'},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str]
+    product_id: Mapped[int]
+    # process_finish продукта: работы попадают в ту же месячную секцию, что и их продукт
+    product_process_finish: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text('NOW()'))
+
+class TableVersion(Base):
+    '''Таблица версий остальных таблиц: свернутое число записей, см. TableVersionChange'''
+
+    __tablename__ = 'table_versions'
+
+    table_name: Mapped[str] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, server_default=text('0'))
+
+class TableVersionChange(Base):
+    '''Журнал записей: строку на каждое изменяющее выражение вставляет триггер таблицы'''
+
+    __tablename__ = 'table_version_changes'
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(always=True), primary_key=True)
+    table_name: Mapped[str] = mapped_column(index=True)
+
+class Job(Base):
+    '''Таблица фоновых задач; воркеры берут их через FOR UPDATE SKIP LOCKED'''
+
+    __tablename__ = 'jobs'
+    # Очередь ищется только среди незавершенных задач
+    __table_args__ = (
+        Index('ix_jobs_pending', 'id', postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+    id: Mapped[intpk]
+    kind: Mapped[str]
+    status: Mapped[str] = mapped_column(server_default='queued')
+    # payload бывает большим (строки импорта), в статус задачи он не загружается
+    payload: Mapped[dict] = mapped_column(JSONB, deferred=True)
+    result: Mapped[dict | None] = mapped_column(JSONB)
+    error: Mapped[str | None]
+    progress: Mapped[int] = mapped_column(server_default=text('0'))
+    total: Mapped[int | None]
+    attempts: Mapped[int] = mapped_column(server_default=text('0'))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text('NOW()'))
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    locked_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
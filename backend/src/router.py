@@ -1,95 +1,235 @@
-from fastapi import APIRouter, Depends, Form, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 from typing import Annotated
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import session_factory
+from src.cache import reference_cache
+from src.config import settings
+from src.database import engine, replica_pool, routed_session
+from src.events import change_feed, parse_topic, sse_events, websocket_events
+from src.metrics import InstrumentedRoute, expose_metrics
+from src.slow_queries import slow_query_log
+import src.models as models
 import src.schemas as schemas
 from .dependencies import (create_func, 
                            create_func_without_entity_name, 
-                           update_func, delete_func)
+                           update_func, delete_func, export_response,
+                           bulk_func, etag_func, fast_json_response,
+                           parse_body, body_openapi, job_accepted)
 from .crud import (BrigadesOperations, LaboratoriesOperations, PersonalLaboratoriesOperations,
     PersonalWorkersOperations, ProductOperations, ProductCategoryOperations,
     PersonalCategoryOperations, EngineerPersonalOperations, ToolsOperations,
-    WorksWithProductOperations, WorkshopsOperations)
+    WorksWithProductOperations, WorkshopsOperations, ReportsOperations,
+    ProductionRunOperations, SearchOperations, JobOperations, ArchiveOperations)
 
 
 product_router = APIRouter(
     prefix='/products',
-    tags=['Products']
+    tags=['Products'],
+    route_class=InstrumentedRoute
 )
 
 product_category_router = APIRouter(
     prefix="/product_categories",
-    tags=['Product category']
+    tags=['Product category'],
+    route_class=InstrumentedRoute
 )
 
 personal_category_router = APIRouter(
     prefix='/personal_categories',
-    tags=['Personal category']
+    tags=['Personal category'],
+    route_class=InstrumentedRoute
 )
 
 engineer_personal_router = APIRouter(
     prefix='/engineer_personal',
-    tags=['Engineer personal']
+    tags=['Engineer personal'],
+    route_class=InstrumentedRoute
 )
 
 personal_workers_router = APIRouter(
     prefix='/personal_workers',
-    tags=['Personal workers']
+    tags=['Personal workers'],
+    route_class=InstrumentedRoute
 )
 
 brigades_router = APIRouter(
     prefix='/brigades',
-    tags=['Brigades']
+    tags=['Brigades'],
+    route_class=InstrumentedRoute
 )
 
 workshops_router = APIRouter(
     prefix='/workshops',
-    tags=['Workshops']
+    tags=['Workshops'],
+    route_class=InstrumentedRoute
 )
 
 laboratories_router = APIRouter(
     prefix='/laboratories',
-    tags=['Laboratories']
+    tags=['Laboratories'],
+    route_class=InstrumentedRoute
 )
 
 personal_laboratories_router = APIRouter(
     prefix='/personal_laboratories',
-    tags=['Personal laboratories']
+    tags=['Personal laboratories'],
+    route_class=InstrumentedRoute
 )
 
 tools_router = APIRouter(
     prefix='/tools',
-    tags=['Tools']
+    tags=['Tools'],
+    route_class=InstrumentedRoute
 )
 
 works_with_product_router = APIRouter(
     prefix='/works_with_product',
-    tags=['Works with product']
+    tags=['Works with product'],
+    route_class=InstrumentedRoute
 )
 
-async def get_db():
-    async with session_factory() as db:
-        try:
-            yield db
-        finally:
-            await db.close()
+reports_router = APIRouter(
+    prefix='/reports',
+    tags=['Reports'],
+    route_class=InstrumentedRoute
+)
+
+internal_router = APIRouter(
+    prefix='/internal',
+    tags=['Internal'],
+    route_class=InstrumentedRoute
+)
+
+production_runs_router = APIRouter(
+    prefix='/production-runs',
+    tags=['Production runs'],
+    route_class=InstrumentedRoute
+)
+
+search_router = APIRouter(
+    prefix='/search',
+    tags=['Search'],
+    route_class=InstrumentedRoute
+)
+
+events_router = APIRouter(
+    prefix='/events',
+    tags=['Events'],
+    route_class=InstrumentedRoute
+)
+
+jobs_router = APIRouter(
+    prefix='/jobs',
+    tags=['Jobs'],
+    route_class=InstrumentedRoute
+)
+
+metrics_router = APIRouter(
+    tags=['Internal'],
+    route_class=InstrumentedRoute
+)
+
+# Методы без записи: транзакция только для чтения и без commit
+READ_ONLY_METHODS = {'GET', 'HEAD'}
+
+def session_dependency(use_replica: bool):
+    async def get_db(request: Request):
+        # Одна транзакция на запрос. Соединение берется из пула при первом обращении
+        # к БД и возвращается после единственного commit (или rollback при ошибке).
+        # GET при наличии реплик читают с реплики, если маршрут не требует primary
+        read_only = request.method in READ_ONLY_METHODS
+        async with routed_session(read_only, use_replica) as db:
+            try:
+                yield db
+            except Exception:
+                await db.rollback()
+                raise
+            if not read_only:
+                await db.commit()
+
+    return get_db
+
+get_db = session_dependency(use_replica=True)
+
+# Для GET, на которые клиент переходит сразу после записи (Location ответа 202):
+# реплика с отставанием ответила бы 404 на только что созданную задачу
+get_primary_db = session_dependency(use_replica=False)
+
+def json_or_form(schema: type[BaseModel]):
+    # Тело выбирается по Content-Type: JSON для интеграций, форма для браузера
+    async def read_body(request: Request):
+        return await parse_body(request, schema)
+
+    return Depends(read_body)
+
+def etag(*table_names: str):
+    # 304 отдается до вызова обработчика, без выборки и сериализации
+    async def check_etag(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+        await etag_func(request, response, db, table_names)
+
+    return Depends(check_etag)
+
+# Таблицы, из которых собирается досье продукта
+DOSSIER_TABLES = ('product', 'product_category', 'test_laboratories',
+                  'tools', 'personal_laboratories', 'works_with_product')
 
 class ProductRouter:
-    @product_router.get('/', response_model=list[schemas.Product])
-    async def read_products(db: AsyncSession = Depends(get_db)):
-        return await ProductOperations.get_products(db)
-
-    @product_router.post('/', response_model=schemas.Product)
-    async def create_product(product: Annotated[schemas.CreateProduct, Form()], db: AsyncSession = Depends(get_db)):
-        return await create_func(ProductOperations.get_products,
-                                                      ProductOperations.create_product, 
-                                                      db, 
-                                                      product,
-                                                      'Продукт')
-
-    @product_router.get('/{product_name}', response_model=schemas.Product)
+    @product_router.get('/', response_model=list[schemas.Product], dependencies=[etag('product', 'workshop')])
+    async def read_products(params: Annotated[schemas.ProductFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(ProductOperations.products_query(params), schemas.Product, params.format, response)
+        if settings.DEBUG:
+            # В отладке ответ проходит полную валидацию по response_model
+            return await ProductOperations.get_products(db, params)
+        return await fast_json_response(ProductOperations.products_query(params), models.Product, schemas.Product, db, response)
+
+    @product_router.post('/', response_model=schemas.Product,
+                         openapi_extra=body_openapi(schemas.CreateProduct))
+    async def create_product(product: Annotated[schemas.CreateProduct, json_or_form(schemas.CreateProduct)], db: AsyncSession = Depends(get_db)):
+        return await create_func(create_func=ProductOperations.create_product,
+                                 db=db,
+                                 something=product,
+                                 entity_name='Продукт')
+
+    # Массовая загрузка: JSON-массив или NDJSON, ON CONFLICT (name) пропускает или обновляет
+    @product_router.post('/bulk', response_model=schemas.BulkResult, responses={202: {'model': schemas.Job}})
+    async def bulk_create_products(request: Request, response: Response, on_conflict: schemas.OnConflict = 'nothing', background: bool = False, db: AsyncSession = Depends(get_db)):
+        return await bulk_func(bulk_func=ProductOperations.bulk_create_products,
+                               schema=schemas.CreateProduct,
+                               request=request,
+                               response=response,
+                               db=db,
+                               on_conflict=on_conflict,
+                               background=background)
+
+    @product_router.get('/dossiers', response_model=list[schemas.ProductDossier], dependencies=[etag(*DOSSIER_TABLES)])
+    async def get_product_dossiers(ids: Annotated[list[int], Query(max_length=100)], db: AsyncSession = Depends(get_db)):
+        return await ProductOperations.get_product_dossiers(db, ids)
+
+    # Архив завершенных продуктов; finished_from/finished_to ограничивают читаемые секции
+    @product_router.get('/history', response_model=list[schemas.ProductHistory])
+    async def get_product_history(params: Annotated[schemas.ProductHistoryFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(ArchiveOperations.product_history_query(params), schemas.ProductHistory, params.format, response)
+        return await ArchiveOperations.get_product_history(db, params)
+
+    # Перенос завершенных продуктов с работами в историю выполняет воркер
+    @product_router.post('/archive', response_model=schemas.Job, status_code=202)
+    async def archive_products(params: Annotated[schemas.ArchiveParams, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        return job_accepted(await JobOperations.enqueue_archive(db, params.finished_before), response)
+
+    @product_router.get('/{product_id}/dossier', response_model=schemas.ProductDossier, dependencies=[etag(*DOSSIER_TABLES)])
+    async def get_product_dossier(product_id: int, db: AsyncSession = Depends(get_db)):
+        dossier = await ProductOperations.get_product_dossier(db, product_id)
+        if dossier is None:
+            raise HTTPException(status_code=404, detail='Продукт не найден')
+
+        return dossier
+
+    @product_router.get('/{product_name}', response_model=schemas.Product, dependencies=[etag('product')])
     async def get_product(product_name: str, db: AsyncSession = Depends(get_db)):
         db_product = await ProductOperations.get_product(db, product_name)
         if db_product is None:
@@ -97,73 +237,97 @@ class ProductRouter:
 
         return db_product
 
-    @product_router.patch('/{product_name}', response_model=dict)
-    async def update_product(product: Annotated[schemas.UpdateProduct, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=ProductOperations.get_products,
-                                 update_func=ProductOperations.update_product,
+    @product_router.patch('/{product_name}', response_model=dict,
+                          openapi_extra=body_openapi(schemas.UpdateProduct))
+    async def update_product(product: Annotated[schemas.UpdateProduct, json_or_form(schemas.UpdateProduct)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=ProductOperations.update_product,
                                  db=db, 
                                  something=product,
                                  entity_name='Продукт')
 
     @product_router.delete('/{product_id}', response_model=dict)
     async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=ProductOperations.get_products,
-                                 del_func=ProductOperations.delete_product,
+        return await delete_func(del_func=ProductOperations.delete_product,
                                  db=db, 
                                  something_id=product_id,
                                  entity_name='Продукт')
 
 class ProductCategoryRouter:
-    @product_category_router.get('/', response_model=list[schemas.ProductCategory])
-    async def get_product_categories(db: AsyncSession = Depends(get_db)):
-        categories = await ProductCategoryOperations.get_product_categories(db)
+    @product_category_router.get('/', response_model=list[schemas.ProductCategory], dependencies=[etag('product_category')])
+    async def get_product_categories(params: Annotated[schemas.Pagination, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(ProductCategoryOperations.product_categories_query(params), schemas.ProductCategory, params.format, response)
+        categories = await ProductCategoryOperations.get_product_categories(db, params)
         return categories
 
-    @product_category_router.post('/', response_model=schemas.ProductCategory)
-    async def create_product_category(product_category: Annotated[schemas.CreateProductCategory, Form()], 
+    @product_category_router.post('/', response_model=schemas.ProductCategory,
+                                  openapi_extra=body_openapi(schemas.CreateProductCategory))
+    async def create_product_category(product_category: Annotated[schemas.CreateProductCategory, json_or_form(schemas.CreateProductCategory)], 
                                       db: AsyncSession = Depends(get_db)):
-        return await create_func(get_func=ProductCategoryOperations.get_product_categories,
-                                                     create_func=ProductCategoryOperations.create_product_category, 
-                                                     db=db, 
-                                                     something=product_category,
-                                                     entity_name='Категория')
+        return await create_func(create_func=ProductCategoryOperations.create_product_category, 
+                                 db=db,
+                                 something=product_category,
+                                 entity_name='Категория')
+
+    @product_category_router.post('/bulk', response_model=schemas.BulkResult, responses={202: {'model': schemas.Job}})
+    async def bulk_create_product_categories(request: Request, response: Response, on_conflict: schemas.OnConflict = 'nothing', background: bool = False, db: AsyncSession = Depends(get_db)):
+        return await bulk_func(bulk_func=ProductCategoryOperations.bulk_create_product_categories,
+                               schema=schemas.CreateProductCategory,
+                               request=request,
+                               response=response,
+                               db=db,
+                               on_conflict=on_conflict,
+                               background=background)
 
     # PATCH для обновления категории продукта
-    @product_category_router.patch('/{category_id}', response_model=dict)
-    async def update_product_category(category: Annotated[schemas.ProductCategory, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=ProductCategoryOperations.get_product_categories,
-                                 update_func=ProductCategoryOperations.update_product_category,
+    @product_category_router.patch('/{category_id}', response_model=dict,
+                                   openapi_extra=body_openapi(schemas.ProductCategory))
+    async def update_product_category(category: Annotated[schemas.ProductCategory, json_or_form(schemas.ProductCategory)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=ProductCategoryOperations.update_product_category,
                                  db=db, 
                                  something=category,
                                  entity_name='Категория продукта')
 
-    # DELETE для удаления категории продукта
-    @product_category_router.delete('/{category_id}', response_model=dict)
-    async def delete_product_category(category_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=ProductOperations.get_products,
-                                 update_func=ProductOperations.delete_product,
-                                 db=db, 
-                                 something_id=category_id,
-                                 entity_name='Категория продукта')
+    # DELETE для удаления категории продукта: каскад по продуктам, работам и бригадам
+    # выполняет воркер, ответ 202 с задачей, статус в /jobs/{job_id}
+    @product_category_router.delete('/{category_id}', response_model=schemas.Job, status_code=202)
+    async def delete_product_category(category_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+        job = await JobOperations.enqueue_cascade_delete(db, models.ProductCategory, category_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail='Категория продукта не найдена')
+
+        return job_accepted(job, response)
 
 class PersonCategoryRouter:
-    @personal_category_router.get('/', response_model=list[schemas.PersonalCategory])
-    async def get_personal_categories(db: AsyncSession = Depends(get_db)):
-        return await PersonalCategoryOperations.get_personal_categories(db)
-
-    @personal_category_router.post('/', response_model=schemas.PersonalCategory)
-    async def create_personal_category(personal_category: Annotated[schemas.CreatePersonalCategory, Form()], db: AsyncSession = Depends(get_db)):
-        return await create_func(get_func=PersonalCategoryOperations.get_personal_categories,
-                                                     create_func=PersonalCategoryOperations.create_personal_category, 
-                                                     db=db, 
-                                                     something=personal_category,
-                                                     entity_name='Категория персонала')
+    @personal_category_router.get('/', response_model=list[schemas.PersonalCategory], dependencies=[etag('personal_category')])
+    async def get_personal_categories(params: Annotated[schemas.Pagination, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(PersonalCategoryOperations.personal_categories_query(params), schemas.PersonalCategory, params.format, response)
+        return await PersonalCategoryOperations.get_personal_categories(db, params)
+
+    @personal_category_router.post('/', response_model=schemas.PersonalCategory,
+                                   openapi_extra=body_openapi(schemas.CreatePersonalCategory))
+    async def create_personal_category(personal_category: Annotated[schemas.CreatePersonalCategory, json_or_form(schemas.CreatePersonalCategory)], db: AsyncSession = Depends(get_db)):
+        return await create_func(create_func=PersonalCategoryOperations.create_personal_category, 
+                                 db=db,
+                                 something=personal_category,
+                                 entity_name='Категория персонала')
+
+    @personal_category_router.post('/bulk', response_model=schemas.BulkResult, responses={202: {'model': schemas.Job}})
+    async def bulk_create_personal_categories(request: Request, response: Response, on_conflict: schemas.OnConflict = 'nothing', background: bool = False, db: AsyncSession = Depends(get_db)):
+        return await bulk_func(bulk_func=PersonalCategoryOperations.bulk_create_personal_categories,
+                               schema=schemas.CreatePersonalCategory,
+                               request=request,
+                               response=response,
+                               db=db,
+                               on_conflict=on_conflict,
+                               background=background)
 
     # PATCH для обновления категории персонала
-    @personal_category_router.patch('/{category_id}', response_model=dict)
-    async def update_personal_category(category: Annotated[schemas.PersonalCategory, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=PersonalCategoryOperations.get_personal_categories,
-                                 update_func=PersonalCategoryOperations.update_personal_category,
+    @personal_category_router.patch('/{category_id}', response_model=dict,
+                                    openapi_extra=body_openapi(schemas.PersonalCategory))
+    async def update_personal_category(category: Annotated[schemas.PersonalCategory, json_or_form(schemas.PersonalCategory)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=PersonalCategoryOperations.update_personal_category,
                                  db=db, 
                                  something=category,
                                  entity_name='Категория персонала')
@@ -171,24 +335,28 @@ class PersonCategoryRouter:
     # DELETE для удаления категории персонала
     @personal_category_router.delete('/{category_id}', response_model=dict)
     async def delete_personal_category(category_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=PersonalCategoryOperations.get_personal_categories,
-                                 update_func=PersonalCategoryOperations.delete_personal_category,
+        return await delete_func(del_func=PersonalCategoryOperations.delete_personal_category,
                                  db=db, 
                                  something_id=category_id,
                                  entity_name='Категория продукта')
 
 class EngineerPersonalRouter:
-    @engineer_personal_router.get('/', response_model=list[schemas.EngineerPersonal])
-    async def get_engineer_personal(db: AsyncSession = Depends(get_db)):
-        return await EngineerPersonalOperations.get_engineer_personal(db)
-
-    @engineer_personal_router.post('/', response_model=schemas.EngineerPersonal)
-    async def create_engineer_person(person: Annotated[schemas.CreateEngineerPersonal, Form()], db: AsyncSession = Depends(get_db)):
+    @engineer_personal_router.get('/', response_model=list[schemas.EngineerPersonal], dependencies=[etag('engineer_personal')])
+    async def get_engineer_personal(params: Annotated[schemas.EngineerPersonalFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(EngineerPersonalOperations.engineer_personal_query(params), schemas.EngineerPersonal, params.format, response)
+        if settings.DEBUG:
+            return await EngineerPersonalOperations.get_engineer_personal(db, params)
+        return await fast_json_response(EngineerPersonalOperations.engineer_personal_query(params), models.EngineerPersonal, schemas.EngineerPersonal, db, response)
+
+    @engineer_personal_router.post('/', response_model=schemas.EngineerPersonal,
+                                   openapi_extra=body_openapi(schemas.CreateEngineerPersonal))
+    async def create_engineer_person(person: Annotated[schemas.CreateEngineerPersonal, json_or_form(schemas.CreateEngineerPersonal)], db: AsyncSession = Depends(get_db)):
         return await create_func_without_entity_name(create_func=EngineerPersonalOperations.create_engineer_personal,
                                           db=db,
                                           something=person)
 
-    @engineer_personal_router.get('/{person_id}', response_model=schemas.EngineerPersonal)
+    @engineer_personal_router.get('/{person_id}', response_model=schemas.EngineerPersonal, dependencies=[etag('engineer_personal')])
     async def get_engineer_person(person_id: int, db: AsyncSession = Depends(get_db)):
         db_person = await EngineerPersonalOperations.get_engineer_person(db, person_id)
         if db_person is None:
@@ -197,10 +365,10 @@ class EngineerPersonalRouter:
         return db_person
 
     # PATCH для обновления инженера
-    @engineer_personal_router.patch('/{person_id}', response_model=dict)
-    async def update_engineer_person(person: Annotated[schemas.UpdateEngineerPersonal, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=EngineerPersonalOperations.get_engineer_personal,
-                                 update_func=EngineerPersonalOperations.update_engineer_personal,
+    @engineer_personal_router.patch('/{person_id}', response_model=dict,
+                                    openapi_extra=body_openapi(schemas.UpdateEngineerPersonal))
+    async def update_engineer_person(person: Annotated[schemas.UpdateEngineerPersonal, json_or_form(schemas.UpdateEngineerPersonal)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=EngineerPersonalOperations.update_engineer_personal,
                                  db=db, 
                                  something=person,
                                  entity_name='Инженер')
@@ -208,24 +376,28 @@ class EngineerPersonalRouter:
     # DELETE для удаления инженера
     @engineer_personal_router.delete('/{person_id}', response_model=dict)
     async def delete_engineer_person(person_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=EngineerPersonalOperations.get_engineer_personal,
-                                 update_func=EngineerPersonalOperations.delete_engineer_personal,
+        return await delete_func(del_func=EngineerPersonalOperations.delete_engineer_personal,
                                  db=db, 
                                  something_id=person_id,
                                  entity_name='Инженер')
 
 class PersonalWorkersRouter:
-    @personal_workers_router.get('/', response_model=list[schemas.PersonalWorkers])
-    async def get_personal_workers(db: AsyncSession = Depends(get_db)):
-        return await PersonalWorkersOperations.get_personal_workers(db)
-
-    @personal_workers_router.post('/', response_model=schemas.PersonalWorkers)
-    async def create_personal_worker(worker: Annotated[schemas.CreatePersonalWorkers, Form()], db: AsyncSession = Depends(get_db)):
+    @personal_workers_router.get('/', response_model=list[schemas.PersonalWorkers], dependencies=[etag('personal_workers')])
+    async def get_personal_workers(params: Annotated[schemas.PersonalWorkersFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(PersonalWorkersOperations.personal_workers_query(params), schemas.PersonalWorkers, params.format, response)
+        if settings.DEBUG:
+            return await PersonalWorkersOperations.get_personal_workers(db, params)
+        return await fast_json_response(PersonalWorkersOperations.personal_workers_query(params), models.PersonalWorkers, schemas.PersonalWorkers, db, response)
+
+    @personal_workers_router.post('/', response_model=schemas.PersonalWorkers,
+                                  openapi_extra=body_openapi(schemas.CreatePersonalWorkers))
+    async def create_personal_worker(worker: Annotated[schemas.CreatePersonalWorkers, json_or_form(schemas.CreatePersonalWorkers)], db: AsyncSession = Depends(get_db)):
         return await create_func_without_entity_name(create_func=PersonalWorkersOperations.create_personal_worker,
                                           db=db,
                                           something=worker)
 
-    @personal_workers_router.get('/{person_id}', response_model=schemas.PersonalWorkers)
+    @personal_workers_router.get('/{person_id}', response_model=schemas.PersonalWorkers, dependencies=[etag('personal_workers')])
     async def get_personal_worker(worker_id: int, db: AsyncSession = Depends(get_db)):
         db_worker = await PersonalWorkersOperations.get_personal_worker(db, worker_id)
         if db_worker is None:
@@ -234,10 +406,10 @@ class PersonalWorkersRouter:
         return db_worker
 
     # PATCH для обновления персонала лаборатории
-    @personal_workers_router.patch('/{person_id}', response_model=dict)
-    async def update_personal_workers(person: Annotated[schemas.UpdatePersonalWorkers, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=PersonalWorkersOperations.get_personal_workers,
-                                 update_func=PersonalWorkersOperations.update_personal_worker,
+    @personal_workers_router.patch('/{person_id}', response_model=dict,
+                                   openapi_extra=body_openapi(schemas.UpdatePersonalWorkers))
+    async def update_personal_workers(person: Annotated[schemas.UpdatePersonalWorkers, json_or_form(schemas.UpdatePersonalWorkers)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=PersonalWorkersOperations.update_personal_worker,
                                  db=db, 
                                  something=person,
                                  entity_name='Работник')
@@ -245,26 +417,39 @@ class PersonalWorkersRouter:
     # DELETE для удаления персонала лаборатории
     @personal_workers_router.delete('/{person_id}', response_model=dict)
     async def delete_personal_workers(person_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=PersonalWorkersOperations.get_personal_workers,
-                                 update_func=PersonalWorkersOperations.delete_personal_worker,
+        return await delete_func(del_func=PersonalWorkersOperations.delete_personal_worker,
                                  db=db, 
                                  something_id=person_id,
                                  entity_name='Работник')
 
 class BrigadesRouter:
-    @brigades_router.get('/', response_model=list[schemas.Brigades])
-    async def get_brigades(db: AsyncSession = Depends(get_db)):
-        return await BrigadesOperations.get_brigades(db)
-
-    @brigades_router.post('/', response_model=schemas.Brigades)
-    async def create_brigade(brigade: Annotated[schemas.CreateBrigades, Form()], db: AsyncSession = Depends(get_db)):
-        return await create_func(get_func=BrigadesOperations.get_brigades,
-                                 create_func=BrigadesOperations.create_brigade,
+    @brigades_router.get('/', response_model=list[schemas.Brigades], dependencies=[etag('brigades')])
+    async def get_brigades(params: Annotated[schemas.BrigadesFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(BrigadesOperations.brigades_query(params), schemas.Brigades, params.format, response)
+        if settings.DEBUG:
+            return await BrigadesOperations.get_brigades(db, params)
+        return await fast_json_response(BrigadesOperations.brigades_query(params), models.Brigades, schemas.Brigades, db, response)
+
+    @brigades_router.post('/', response_model=schemas.Brigades,
+                          openapi_extra=body_openapi(schemas.CreateBrigades))
+    async def create_brigade(brigade: Annotated[schemas.CreateBrigades, json_or_form(schemas.CreateBrigades)], db: AsyncSession = Depends(get_db)):
+        return await create_func(create_func=BrigadesOperations.create_brigade,
                                  db=db,
                                  something=brigade,
                                  entity_name='Бригада')
 
-    @brigades_router.get('/{brigade_id}', response_model=schemas.Brigades)
+    @brigades_router.post('/bulk', response_model=schemas.BulkResult, responses={202: {'model': schemas.Job}})
+    async def bulk_create_brigades(request: Request, response: Response, on_conflict: schemas.OnConflict = 'nothing', background: bool = False, db: AsyncSession = Depends(get_db)):
+        return await bulk_func(bulk_func=BrigadesOperations.bulk_create_brigades,
+                               schema=schemas.CreateBrigades,
+                               request=request,
+                               response=response,
+                               db=db,
+                               on_conflict=on_conflict,
+                               background=background)
+
+    @brigades_router.get('/{brigade_id}', response_model=schemas.Brigades, dependencies=[etag('brigades')])
     async def get_brigade(brigade_id: int, db: AsyncSession = Depends(get_db)):
         try:
             db_brigade = await BrigadesOperations.get_brigade(db, brigade_id)
@@ -277,10 +462,10 @@ class BrigadesRouter:
         return db_brigade
 
     # PATCH для обновления бригады
-    @brigades_router.patch('/{brigade_id}', response_model=dict)
-    async def update_brigade(brigade: Annotated[schemas.UpdateBrigades, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=BrigadesOperations.get_brigades,
-                                 update_func=BrigadesOperations.update_brigade,
+    @brigades_router.patch('/{brigade_id}', response_model=dict,
+                           openapi_extra=body_openapi(schemas.UpdateBrigades))
+    async def update_brigade(brigade: Annotated[schemas.UpdateBrigades, json_or_form(schemas.UpdateBrigades)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=BrigadesOperations.update_brigade,
                                  db=db, 
                                  something=brigade,
                                  entity_name='Бригада')
@@ -288,57 +473,81 @@ class BrigadesRouter:
     # DELETE для удаления бригады
     @brigades_router.delete('/{brigade_id}', response_model=dict)
     async def delete_brigade(brigade_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=BrigadesOperations.get_brigades,
-                                 update_func=BrigadesOperations.delete_brigade,
+        return await delete_func(del_func=BrigadesOperations.delete_brigade,
                                  db=db, 
                                  something_id=brigade_id,
                                  entity_name='Бригада')
 
 class WorkshopsRouter:
-    @workshops_router.get('/', response_model=list[schemas.Workshop])
-    async def get_workshops(db: AsyncSession = Depends(get_db)):
-        return await WorkshopsOperations.get_workshops(db)
-
-    @workshops_router.post('/', response_model=schemas.Workshop)
-    async def create_workshop(workshop: Annotated[schemas.CreateWorkshop, Form()], db: AsyncSession = Depends(get_db)):
-        return await create_func(get_func=WorkshopsOperations.get_workshops,
-                                 create_func=WorkshopsOperations.create_workshop,
+    @workshops_router.get('/', response_model=list[schemas.Workshop], dependencies=[etag('workshop')])
+    async def get_workshops(params: Annotated[schemas.WorkshopFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(WorkshopsOperations.workshops_query(params), schemas.Workshop, params.format, response)
+        return await WorkshopsOperations.get_workshops(db, params)
+
+    @workshops_router.post('/', response_model=schemas.Workshop,
+                           openapi_extra=body_openapi(schemas.CreateWorkshop))
+    async def create_workshop(workshop: Annotated[schemas.CreateWorkshop, json_or_form(schemas.CreateWorkshop)], db: AsyncSession = Depends(get_db)):
+        return await create_func(create_func=WorkshopsOperations.create_workshop,
                                  db=db,
                                  something=workshop,
                                  entity_name='Цех')
 
+    @workshops_router.post('/bulk', response_model=schemas.BulkResult, responses={202: {'model': schemas.Job}})
+    async def bulk_create_workshops(request: Request, response: Response, on_conflict: schemas.OnConflict = 'nothing', background: bool = False, db: AsyncSession = Depends(get_db)):
+        return await bulk_func(bulk_func=WorkshopsOperations.bulk_create_workshops,
+                               schema=schemas.CreateWorkshop,
+                               request=request,
+                               response=response,
+                               db=db,
+                               on_conflict=on_conflict,
+                               background=background)
+
     # PATCH для обновления цеха
-    @workshops_router.patch('/{workshop_id}', response_model=dict)
-    async def update_workshop(workshop: Annotated[schemas.UpdateWorkshop, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=WorkshopsOperations.get_workshops,
-                                 update_func=WorkshopsOperations.update_workshop,
+    @workshops_router.patch('/{workshop_id}', response_model=dict,
+                            openapi_extra=body_openapi(schemas.UpdateWorkshop))
+    async def update_workshop(workshop: Annotated[schemas.UpdateWorkshop, json_or_form(schemas.UpdateWorkshop)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=WorkshopsOperations.update_workshop,
                                  db=db, 
                                  something=workshop,
                                  entity_name='Цех')
 
     # DELETE для удаления цеха
-    @workshops_router.delete('/{workshop_id}', response_model=dict)
-    async def delete_workshop(workshop_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=WorkshopsOperations.get_workshops,
-                                 update_func=WorkshopsOperations.delete_workshop,
-                                 db=db, 
-                                 something_id=workshop_id,
-                                 entity_name='Цех')
+    # Бригады цеха удаляются пачками в фоновой задаче
+    @workshops_router.delete('/{workshop_id}', response_model=schemas.Job, status_code=202)
+    async def delete_workshop(workshop_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+        job = await JobOperations.enqueue_cascade_delete(db, models.Workshop, workshop_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail='Цех не найден')
+
+        return job_accepted(job, response)
 
 class LaboratoriesRouter:
-    @laboratories_router.get('/', response_model=list[schemas.TestLaboratories])
-    async def get_laboratories(db: AsyncSession = Depends(get_db)):
-        return await LaboratoriesOperations.get_laboratories(db)
-
-    @laboratories_router.post('/', response_model=schemas.TestLaboratories)
-    async def create_laboratory(laboratory: Annotated[schemas.CreateLaboratory, Form()], db: AsyncSession = Depends(get_db)):
-        return await create_func(get_func=LaboratoriesOperations.get_laboratories,
-                                 create_func=LaboratoriesOperations.create_laboratory,
+    @laboratories_router.get('/', response_model=list[schemas.TestLaboratories], dependencies=[etag('test_laboratories')])
+    async def get_laboratories(params: Annotated[schemas.LaboratoriesFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(LaboratoriesOperations.laboratories_query(params), schemas.TestLaboratories, params.format, response)
+        return await LaboratoriesOperations.get_laboratories(db, params)
+
+    @laboratories_router.post('/', response_model=schemas.TestLaboratories,
+                              openapi_extra=body_openapi(schemas.CreateLaboratory))
+    async def create_laboratory(laboratory: Annotated[schemas.CreateLaboratory, json_or_form(schemas.CreateLaboratory)], db: AsyncSession = Depends(get_db)):
+        return await create_func(create_func=LaboratoriesOperations.create_laboratory,
                                  db=db,
                                  something=laboratory,
                                  entity_name='Лаборатория')
 
-    @laboratories_router.get('/{laboratory_name}', response_model=schemas.TestLaboratories)
+    @laboratories_router.post('/bulk', response_model=schemas.BulkResult, responses={202: {'model': schemas.Job}})
+    async def bulk_create_laboratories(request: Request, response: Response, on_conflict: schemas.OnConflict = 'nothing', background: bool = False, db: AsyncSession = Depends(get_db)):
+        return await bulk_func(bulk_func=LaboratoriesOperations.bulk_create_laboratories,
+                               schema=schemas.CreateLaboratory,
+                               request=request,
+                               response=response,
+                               db=db,
+                               on_conflict=on_conflict,
+                               background=background)
+
+    @laboratories_router.get('/{laboratory_name}', response_model=schemas.TestLaboratories, dependencies=[etag('test_laboratories')])
     async def get_laboratory(laboratory_name: str, db: AsyncSession = Depends(get_db)):
         laboratory = await LaboratoriesOperations.get_laboratory(db, laboratory_name)
         if laboratory is None:
@@ -346,35 +555,41 @@ class LaboratoriesRouter:
         return laboratory
 
     # PATCH для обновления лаборатории
-    @laboratories_router.patch('/{laboratory_id}', response_model=dict)
-    async def update_laboratory(laboratory: Annotated[schemas.TestLaboratories, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=LaboratoriesOperations.get_laboratories,
-                                 update_func=LaboratoriesOperations.update_laboratory,
+    @laboratories_router.patch('/{laboratory_id}', response_model=dict,
+                               openapi_extra=body_openapi(schemas.TestLaboratories))
+    async def update_laboratory(laboratory: Annotated[schemas.TestLaboratories, json_or_form(schemas.TestLaboratories)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=LaboratoriesOperations.update_laboratory,
                                  db=db, 
                                  something=laboratory,
                                  entity_name='Лаборатория')
 
     # DELETE для удаления лаборатории
-    @laboratories_router.delete('/{laboratory_id}', response_model=dict)
-    async def delete_laboratory(laboratory_id: int, db: AsyncSession = Depends(get_db)):
-       return await delete_func(get_func=LaboratoriesOperations.get_laboratories,
-                                 update_func=LaboratoriesOperations.delete_laboratory,
-                                 db=db, 
-                                 something_id=laboratory_id,
-                                 entity_name='Лаборатория')
+    # Инструменты удаляются, а продукты отвязываются от лаборатории пачками в фоновой задаче
+    @laboratories_router.delete('/{laboratory_id}', response_model=schemas.Job, status_code=202)
+    async def delete_laboratory(laboratory_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+        job = await JobOperations.enqueue_cascade_delete(db, models.TestLaboratories, laboratory_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail='Лаборатория не найдена')
 
-class PersonalLaboratoriesRouter:
-    @personal_laboratories_router.get('/', response_model=list[schemas.PersonalLaboratories])
-    async def get_personal_laboratories(db: AsyncSession = Depends(get_db)):
-        return await PersonalLaboratoriesOperations.get_personal_laboratories(db)
+        return job_accepted(job, response)
 
-    @personal_laboratories_router.post('/', response_model=schemas.PersonalLaboratories)
-    async def create_person_laboratory(person: Annotated[schemas.CreatePersonalLaboratory, Form()], db: AsyncSession = Depends(get_db)):
+class PersonalLaboratoriesRouter:
+    @personal_laboratories_router.get('/', response_model=list[schemas.PersonalLaboratories], dependencies=[etag('personal_laboratories')])
+    async def get_personal_laboratories(params: Annotated[schemas.PersonalLaboratoriesFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(PersonalLaboratoriesOperations.personal_laboratories_query(params), schemas.PersonalLaboratories, params.format, response)
+        if settings.DEBUG:
+            return await PersonalLaboratoriesOperations.get_personal_laboratories(db, params)
+        return await fast_json_response(PersonalLaboratoriesOperations.personal_laboratories_query(params), models.PersonalLaboratories, schemas.PersonalLaboratories, db, response)
+
+    @personal_laboratories_router.post('/', response_model=schemas.PersonalLaboratories,
+                                       openapi_extra=body_openapi(schemas.CreatePersonalLaboratory))
+    async def create_person_laboratory(person: Annotated[schemas.CreatePersonalLaboratory, json_or_form(schemas.CreatePersonalLaboratory)], db: AsyncSession = Depends(get_db)):
         return await create_func_without_entity_name(create_func=PersonalLaboratoriesOperations.create_person_laboratory,
                                           db=db,
                                           something=person)
 
-    @personal_laboratories_router.get('/{person_id}', response_model=schemas.PersonalLaboratories)
+    @personal_laboratories_router.get('/{person_id}', response_model=schemas.PersonalLaboratories, dependencies=[etag('personal_laboratories')])
     async def get_person_laboratory(person_id: int, db: AsyncSession = Depends(get_db)):
         db_person = await PersonalLaboratoriesOperations.get_person_laboratory(db, person_id)
         if not db_person:
@@ -383,10 +598,10 @@ class PersonalLaboratoriesRouter:
         return db_person
 
     # PATCH для обновления персонала лаборатории
-    @personal_laboratories_router.patch('/{person_id}', response_model=dict)
-    async def update_personal_laboratory(person: Annotated[schemas.UpdatePersonalLaboratory, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=PersonalLaboratoriesOperations.get_personal_laboratories,
-                                 update_func=PersonalLaboratoriesOperations.update_personal_laboratory,
+    @personal_laboratories_router.patch('/{person_id}', response_model=dict,
+                                        openapi_extra=body_openapi(schemas.UpdatePersonalLaboratory))
+    async def update_personal_laboratory(person: Annotated[schemas.UpdatePersonalLaboratory, json_or_form(schemas.UpdatePersonalLaboratory)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=PersonalLaboratoriesOperations.update_personal_laboratory,
                                  db=db, 
                                  something=person,
                                  entity_name='Работник')
@@ -394,28 +609,32 @@ class PersonalLaboratoriesRouter:
     # DELETE для удаления персонала лаборатории
     @personal_laboratories_router.delete('/{person_id}', response_model=dict)
     async def delete_personal_laboratory(person_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=PersonalLaboratoriesOperations.get_personal_laboratories,
-                                 update_func=PersonalLaboratoriesOperations.delete_personal_laboratory,
+        return await delete_func(del_func=PersonalLaboratoriesOperations.delete_personal_laboratory,
                                  db=db, 
                                  something_id=person_id,
                                  entity_name='Работник')
 
 class ToolsRouter:
-    @tools_router.get('/', response_model=list[schemas.Tools])
-    async def get_tools(db: AsyncSession = Depends(get_db)):
-        return await ToolsOperations.get_tools(db)
-
-    @tools_router.post('/', response_model=schemas.Tools)
-    async def create_tool(tool: Annotated[schemas.CreateTool, Form()], db: AsyncSession = Depends(get_db)):
+    @tools_router.get('/', response_model=list[schemas.Tools], dependencies=[etag('tools')])
+    async def get_tools(params: Annotated[schemas.ToolsFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(ToolsOperations.tools_query(params), schemas.Tools, params.format, response)
+        if settings.DEBUG:
+            return await ToolsOperations.get_tools(db, params)
+        return await fast_json_response(ToolsOperations.tools_query(params), models.Tools, schemas.Tools, db, response)
+
+    @tools_router.post('/', response_model=schemas.Tools,
+                       openapi_extra=body_openapi(schemas.CreateTool))
+    async def create_tool(tool: Annotated[schemas.CreateTool, json_or_form(schemas.CreateTool)], db: AsyncSession = Depends(get_db)):
         return await create_func_without_entity_name(create_func=ToolsOperations.create_tools,
                                                      db=db,
                                                      something=tool)
 
     # PATCH для обновления инструмента
-    @tools_router.patch('/{tool_id}', response_model=dict)
-    async def update_tool(tool: Annotated[schemas.UpdateTool, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=ToolsOperations.get_tools,
-                                 update_func=ToolsOperations.update_tool,
+    @tools_router.patch('/{tool_id}', response_model=dict,
+                        openapi_extra=body_openapi(schemas.UpdateTool))
+    async def update_tool(tool: Annotated[schemas.UpdateTool, json_or_form(schemas.UpdateTool)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=ToolsOperations.update_tool,
                                  db=db, 
                                  something=tool,
                                  entity_name='Инструмент')
@@ -423,30 +642,50 @@ class ToolsRouter:
     # DELETE для удаления инструмента
     @tools_router.delete('/{tool_id}', response_model=dict)
     async def delete_tool(tool_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=ToolsOperations.get_tools,
-                                 update_func=ToolsOperations.delete_tool,
+        return await delete_func(del_func=ToolsOperations.delete_tool,
                                  db=db, 
                                  something_id=tool_id,
                                  entity_name='Инструмент')
 
 class WorksWithProductRouter:
-    @works_with_product_router.get('/', response_model=list[schemas.WorksWithProduct])
-    async def get_works_for_product(db: AsyncSession = Depends(get_db)):
-        return await WorksWithProductOperations.get_works_with_product(db)
-
-    @works_with_product_router.post('/', response_model=schemas.WorksWithProduct)
-    async def create_work_for_product(work: Annotated[schemas.CreateWorkForProduct, Form()], db: AsyncSession = Depends(get_db)):
-        return await create_func(get_func=WorksWithProductOperations.get_works_with_product,
-                                 create_func=WorksWithProductOperations.create_work_for_product,
+    @works_with_product_router.get('/', response_model=list[schemas.WorksWithProduct], dependencies=[etag('works_with_product')])
+    async def get_works_for_product(params: Annotated[schemas.WorksWithProductFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(WorksWithProductOperations.works_with_product_query(params), schemas.WorksWithProduct, params.format, response)
+        if settings.DEBUG:
+            return await WorksWithProductOperations.get_works_with_product(db, params)
+        return await fast_json_response(WorksWithProductOperations.works_with_product_query(params), models.WorksWithProduct, schemas.WorksWithProduct, db, response)
+
+    @works_with_product_router.post('/', response_model=schemas.WorksWithProduct,
+                                    openapi_extra=body_openapi(schemas.CreateWorkForProduct))
+    async def create_work_for_product(work: Annotated[schemas.CreateWorkForProduct, json_or_form(schemas.CreateWorkForProduct)], db: AsyncSession = Depends(get_db)):
+        return await create_func(create_func=WorksWithProductOperations.create_work_for_product,
                                  db=db,
                                  something=work,
                                  entity_name='Работа для продукта')
 
+    @works_with_product_router.post('/bulk', response_model=schemas.BulkResult, responses={202: {'model': schemas.Job}})
+    async def bulk_create_works_for_product(request: Request, response: Response, on_conflict: schemas.OnConflict = 'nothing', background: bool = False, db: AsyncSession = Depends(get_db)):
+        return await bulk_func(bulk_func=WorksWithProductOperations.bulk_create_works_for_product,
+                               schema=schemas.CreateWorkForProduct,
+                               request=request,
+                               response=response,
+                               db=db,
+                               on_conflict=on_conflict,
+                               background=background)
+
+    # Архив работ перенесенных продуктов; finished_from/finished_to ограничивают читаемые секции
+    @works_with_product_router.get('/history', response_model=list[schemas.WorksWithProductHistory])
+    async def get_works_history(params: Annotated[schemas.WorksHistoryFilter, Query()], response: Response, db: AsyncSession = Depends(get_db)):
+        if params.format != 'json':
+            return export_response(ArchiveOperations.works_history_query(params), schemas.WorksWithProductHistory, params.format, response)
+        return await ArchiveOperations.get_works_history(db, params)
+
     # PATCH для обновления работы с продуктом
-    @works_with_product_router.patch('/{work_id}', response_model=dict)
-    async def update_work_with_product(work: Annotated[schemas.UpdateWorkForProduct, Form()], db: AsyncSession = Depends(get_db)):
-        return await update_func(get_func=WorksWithProductOperations.get_works_with_product,
-                                 update_func=WorksWithProductOperations.update_work_with_product,
+    @works_with_product_router.patch('/{work_id}', response_model=dict,
+                                     openapi_extra=body_openapi(schemas.UpdateWorkForProduct))
+    async def update_work_with_product(work: Annotated[schemas.UpdateWorkForProduct, json_or_form(schemas.UpdateWorkForProduct)], db: AsyncSession = Depends(get_db)):
+        return await update_func(update_func=WorksWithProductOperations.update_work_with_product,
                                  db=db, 
                                  something=work,
                                  entity_name='Работа с продуктом')
@@ -454,8 +693,119 @@ class WorksWithProductRouter:
     # DELETE для удаления работы с продуктом
     @works_with_product_router.delete('/{work_id}', response_model=dict)
     async def delete_work_with_product(work_id: int, db: AsyncSession = Depends(get_db)):
-        return await delete_func(get_func=WorksWithProductOperations.get_works_with_product,
-                                 update_func=WorksWithProductOperations.delete_work_with_product,
+        return await delete_func(del_func=WorksWithProductOperations.delete_work_with_product,
                                  db=db, 
                                  something_id=work_id,
                                  entity_name='Работа с продуктом')
+
+class ProductionRunRouter:
+    # Вложенная структура передается только JSON, формой ее не описать
+    @production_runs_router.post('/', response_model=schemas.ProductionRun)
+    async def create_production_run(run: schemas.CreateProductionRun, db: AsyncSession = Depends(get_db)):
+        result = await create_func(create_func=ProductionRunOperations.create_production_run,
+                                   db=db,
+                                   something=run,
+                                   entity_name='Продукт, работа или бригада с таким именем')
+        if result is None:
+            raise HTTPException(status_code=404, detail='Бригада не найдена')
+        return result
+
+class SearchRouter:
+    @search_router.get('/', response_model=list[schemas.SearchHit])
+    async def search(params: Annotated[schemas.SearchParams, Query()], db: AsyncSession = Depends(get_db)):
+        return await SearchOperations.search(db, params)
+
+class JobsRouter:
+    @jobs_router.get('/{job_id}', response_model=schemas.Job)
+    async def get_job(job_id: int, db: AsyncSession = Depends(get_primary_db)):
+        job = await JobOperations.get_job(db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail='Задача не найдена')
+
+        return job
+
+def parse_topics(topic: list[str]):
+    try:
+        return [parse_topic(raw) for raw in topic]
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+
+class EventsRouter:
+    # Поток изменений вместо опроса списков; topic вида product:category=3, без topic — все таблицы
+    @events_router.get('/', response_class=StreamingResponse)
+    async def subscribe_events(topic: Annotated[list[str], Query()] = []):
+        topics = parse_topics(topic)
+        if change_feed.full():
+            raise HTTPException(status_code=503, detail='Слишком много подписчиков')
+
+        # X-Accel-Buffering отключает буферизацию nginx, иначе события приходят пачками
+        return StreamingResponse(sse_events(topics), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @events_router.websocket('/ws')
+    async def subscribe_websocket(websocket: WebSocket, topic: Annotated[list[str], Query()] = []):
+        try:
+            topics = [parse_topic(raw) for raw in topic]
+        except ValueError as error:
+            raise WebSocketException(code=1008, reason=str(error))
+        if change_feed.full():
+            raise WebSocketException(code=1013, reason='Слишком много подписчиков')
+
+        await websocket_events(websocket, topics)
+
+class ReportsRouter:
+    # Незавершенные продукты (process_finish пуст) и их количество по категориям
+    @reports_router.get('/category_units', response_model=list[schemas.CategoryUnitsReport])
+    async def get_category_units(period: Annotated[schemas.ReportPeriod, Query()], db: AsyncSession = Depends(get_db)):
+        return await ReportsOperations.get_category_units(db, period)
+
+    @reports_router.get('/laboratory_products', response_model=list[schemas.LaboratoryProductsReport])
+    async def get_laboratory_products(period: Annotated[schemas.ReportPeriod, Query()], db: AsyncSession = Depends(get_db)):
+        return await ReportsOperations.get_laboratory_products(db, period)
+
+    @reports_router.get('/product_works', response_model=list[schemas.ProductWorksReport])
+    async def get_product_works(period: Annotated[schemas.ProductWorksPeriod, Query()], db: AsyncSession = Depends(get_db)):
+        return await ReportsOperations.get_product_works(db, period)
+
+    # Численность инженеров и рабочих по цехам и статусам, период не учитывается
+    @reports_router.get('/headcount', response_model=list[schemas.HeadcountReport])
+    async def get_headcount(period: Annotated[schemas.ReportPeriod, Query()], db: AsyncSession = Depends(get_db)):
+        return await ReportsOperations.get_headcount(db, period)
+
+    @reports_router.post('/refresh', response_model=dict)
+    async def refresh_reports(db: AsyncSession = Depends(get_db)):
+        if not await ReportsOperations.refresh_views(db):
+            raise HTTPException(status_code=409, detail='Отчеты уже обновляются')
+
+        return {'detail': 'Отчеты обновлены'}
+
+class InternalRouter:
+    @internal_router.get('/pool', response_model=schemas.PoolStatus)
+    async def get_pool_status():
+        pool = engine.pool
+        return schemas.PoolStatus(size=pool.size(),
+                                  checked_out=pool.checkedout(),
+                                  idle=pool.checkedin(),
+                                  overflow=max(pool.overflow(), 0),
+                                  max_overflow=settings.DB_MAX_OVERFLOW)
+
+    @internal_router.get('/replicas', response_model=list[schemas.ReplicaStatus])
+    async def get_replicas_status():
+        return [schemas.ReplicaStatus(url=reader.url.render_as_string(hide_password=True),
+                                      healthy=reader in replica_pool.healthy,
+                                      checked_out=reader.pool.checkedout())
+                for reader in replica_pool.readers]
+
+    @internal_router.get('/cache', response_model=schemas.CacheStatus)
+    async def get_cache_status():
+        return reference_cache.stats()
+
+    @internal_router.get('/slow-queries', response_model=list[schemas.SlowQuery])
+    async def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+        # Сначала самые свежие
+        return list(reversed(slow_query_log.records))[:limit]
+
+class MetricsRouter:
+    @metrics_router.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+    async def get_metrics():
+        return PlainTextResponse(expose_metrics(), media_type='text/plain; version=0.0.4')
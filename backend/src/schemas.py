@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from datetime import date, datetime
+from typing import Any, Literal
 
 
 class Product(BaseModel):
@@ -7,7 +8,7 @@ class Product(BaseModel):
     name: str
     count: int
     process_start: datetime
-    process_finish: str | None = None
+    process_finish: datetime | None = None
     product_category_id: int
     laboratory_id: int | None = None
 
@@ -24,7 +25,7 @@ class UpdateProduct(BaseModel):
     id: int
     name: str | None = None
     count: int | None = None
-    process_finish: str | None = None
+    process_finish: datetime | None = None
 
 class ProductCategory(BaseModel):
     id: int
@@ -50,7 +51,7 @@ class CreatePersonalCategory(BaseModel):
 class EngineerPersonal(BaseModel):
     id: int
     full_name: str
-    birthday: str
+    birthday: date
     status: str
     personal_category_id: int
     workshop_id: int
@@ -60,7 +61,7 @@ class EngineerPersonal(BaseModel):
 
 class CreateEngineerPersonal(BaseModel):
     full_name: str
-    birthday: str
+    birthday: date
     status: str
     personal_category_id: int
     workshop_id: int
@@ -68,13 +69,13 @@ class CreateEngineerPersonal(BaseModel):
 class UpdateEngineerPersonal(BaseModel):
     id: int
     full_name: str | None = None
-    birthday: str | None = None
+    birthday: date | None = None
     status: str | None = None
 
 class PersonalWorkers(BaseModel):
     id: int
     full_name: str
-    birthday: str
+    birthday: date
     status: str
     personal_category_id: int
     workshop_id: int
@@ -84,7 +85,7 @@ class PersonalWorkers(BaseModel):
 
 class CreatePersonalWorkers(BaseModel):
     full_name: str
-    birthday: str
+    birthday: date
     status: str
     personal_category_id: int
     workshop_id: int
@@ -92,13 +93,13 @@ class CreatePersonalWorkers(BaseModel):
 class UpdatePersonalWorkers(BaseModel):
     id: int
     full_name: str | None = None
-    birthday: str | None = None
+    birthday: date | None = None
     status: str | None = None
 
 class PersonalLaboratories(BaseModel):
     id: int
     full_name: str
-    birthday: str
+    birthday: date
     status: str
     laboratory_id: int
 
@@ -107,14 +108,14 @@ class PersonalLaboratories(BaseModel):
 
 class CreatePersonalLaboratory(BaseModel):
     full_name: str
-    birthday: str
+    birthday: date
     status: str
     laboratory_id: int
     
 class UpdatePersonalLaboratory(BaseModel):
     id: int
     full_name: str | None = None
-    birthday: str | None = None
+    birthday: date | None = None
     status: str | None = None
 
 class Brigades(BaseModel):
@@ -156,7 +157,7 @@ class TestLaboratories(BaseModel):
     id: int
     name: str
     test_date_start: datetime
-    test_date_finish: str | None = None
+    test_date_finish: datetime | None = None
 
     class Config:
         from_attributes = True
@@ -194,4 +195,225 @@ class CreateWorkForProduct(BaseModel):
     
 class UpdateWorkForProduct(BaseModel):
     id: int
-    name: str | None = None
\ No newline at end of file
+    name: str | None = None
+
+# Параметры списков: keyset-пагинация по id и фильтры по внешним ключам.
+# Следующую страницу запрашивают с after равным id последней записи.
+# Форматы ndjson и csv выгружают всю выборку потоком, limit для них
+# применяется только если передан явно.
+class Pagination(BaseModel):
+    limit: int = Field(100, ge=1, le=1000)
+    after: int | None = None
+    format: Literal['json', 'ndjson', 'csv'] = 'json'
+
+# Интервалы по времени: *_from включительно, *_to не включительно
+class TimeRangeFilter(Pagination):
+    started_from: datetime | None = None
+    started_to: datetime | None = None
+    finished_from: datetime | None = None
+    finished_to: datetime | None = None
+
+class ProductFilter(TimeRangeFilter):
+    product_category_id: int | None = None
+    laboratory_id: int | None = None
+    workshop_id: int | None = None
+
+class LaboratoriesFilter(TimeRangeFilter):
+    pass
+
+class EngineerPersonalFilter(Pagination):
+    personal_category_id: int | None = None
+    workshop_id: int | None = None
+
+class PersonalWorkersFilter(Pagination):
+    personal_category_id: int | None = None
+    workshop_id: int | None = None
+
+class PersonalLaboratoriesFilter(Pagination):
+    laboratory_id: int | None = None
+
+class BrigadesFilter(Pagination):
+    workshop_id: int | None = None
+    product_id: int | None = None
+
+class WorkshopFilter(Pagination):
+    product_category_id: int | None = None
+
+class ToolsFilter(Pagination):
+    laboratory_id: int | None = None
+
+class WorksWithProductFilter(Pagination):
+    product_id: int | None = None
+
+# История: фильтр по process_finish продукта отсекает лишние месячные секции
+class HistoryFilter(Pagination):
+    finished_from: datetime | None = None
+    finished_to: datetime | None = None
+
+class ProductHistoryFilter(HistoryFilter):
+    product_category_id: int | None = None
+    laboratory_id: int | None = None
+
+class WorksHistoryFilter(HistoryFilter):
+    product_id: int | None = None
+
+class ProductHistory(Product):
+    process_finish: datetime
+    deleted_at: datetime | None = None
+    archived_at: datetime
+
+class WorksWithProductHistory(WorksWithProduct):
+    product_process_finish: datetime
+    deleted_at: datetime | None = None
+    archived_at: datetime
+
+class ArchiveParams(BaseModel):
+    # По умолчанию — сейчас минус ARCHIVE_AFTER_DAYS
+    finished_before: datetime | None = None
+
+# Результат массовой загрузки: итог по каждой строке в порядке тела запроса
+OnConflict = Literal['nothing', 'update']
+
+class BulkRowResult(BaseModel):
+    index: int
+    status: Literal['created', 'updated', 'skipped', 'duplicate', 'invalid']
+    id: int | None = None
+    detail: str | None = None
+
+class BulkResult(BaseModel):
+    created: int
+    updated: int
+    skipped: int
+    invalid: int
+    rows: list[BulkRowResult]
+
+class PoolStatus(BaseModel):
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: int
+
+class ReplicaStatus(BaseModel):
+    url: str
+    healthy: bool
+    checked_out: int
+
+class CacheStatus(BaseModel):
+    size: int
+    hits: int
+    misses: int
+
+# Параметры запроса в журнале заменены на имена типов
+class SlowQuery(BaseModel):
+    statement: str
+    parameters: list[str]
+    route: str | None = None
+    duration_ms: float
+    recorded_at: datetime
+    plan: str | None = None
+
+    class Config:
+        from_attributes = True
+
+# Фоновая задача: DELETE категории и bulk с background=true отвечают 202 и этой схемой
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: Literal['queued', 'running', 'done', 'failed']
+    progress: int
+    total: int | None = None
+    result: Any = None
+    error: str | None = None
+    attempts: int
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+# Досье продукта: продукт со всеми связанными сущностями одним ответом
+class LaboratoryDossier(TestLaboratories):
+    tools: list[Tools] = []
+    personal_lab: list[PersonalLaboratories] = []
+
+class ProductDossier(Product):
+    product_category: ProductCategory
+    laboratory: LaboratoryDossier | None = None
+    works_for_product: list[WorksWithProduct] = []
+
+# Отчеты: live считает GROUP BY по живым таблицам, view читает
+# материализованные представления (период в них округлен до дня)
+class ReportPeriod(BaseModel):
+    date_from: datetime | None = None
+    date_to: datetime | None = None
+    source: Literal['live', 'view'] = 'live'
+
+class ProductWorksPeriod(ReportPeriod):
+    limit: int = Field(100, ge=1, le=1000)
+
+class CategoryUnitsReport(BaseModel):
+    product_category_id: int
+    name: str
+    products: int
+    units: int
+
+class LaboratoryProductsReport(BaseModel):
+    laboratory_id: int
+    name: str
+    products: int
+
+class ProductWorksReport(BaseModel):
+    product_id: int
+    name: str
+    works: int
+
+class HeadcountReport(BaseModel):
+    workshop_id: int
+    status: str
+    engineers: int
+    workers: int
+
+# Запуск производства: продукт, его работы и бригада создаются одной транзакцией.
+# Бригада либо существующая (brigade_id, ей назначается новый продукт), либо новая (brigade)
+class ProductionRunBrigade(BaseModel):
+    name: str
+    workshop_id: int
+
+class CreateProductionRun(BaseModel):
+    product: CreateProduct
+    works: list[str] = Field([], max_length=1000)
+    brigade_id: int | None = None
+    brigade: ProductionRunBrigade | None = None
+
+    @model_validator(mode='after')
+    def check_brigade(self):
+        if self.brigade_id is not None and self.brigade is not None:
+            raise ValueError('Нужно указать либо brigade_id, либо brigade')
+        return self
+
+class ProductionRun(BaseModel):
+    product_id: int
+    work_ids: list[int]
+    brigade_id: int | None = None
+    laboratory_id: int | None = None
+
+# Поиск по имени сразу по всем сущностям. entity совпадает с префиксом роутера,
+# чтобы по результату можно было собрать ссылку на запись
+SearchEntity = Literal['products', 'product_categories', 'personal_categories', 'workshops',
+                       'brigades', 'laboratories', 'tools', 'works_with_product',
+                       'engineer_personal', 'personal_workers', 'personal_laboratories']
+
+class SearchParams(BaseModel):
+    # Короче трех символов триграммный индекс не помогает
+    q: str = Field(min_length=3, max_length=100)
+    entity: list[SearchEntity] | None = None
+    limit: int = Field(20, ge=1, le=100)
+    offset: int = Field(0, ge=0, le=1000)
+
+class SearchHit(BaseModel):
+    entity: SearchEntity
+    id: int
+    name: str
+    rank: float
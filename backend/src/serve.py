@@ -0,0 +1,71 @@
+'''Запуск в продакшене: миграции под advisory-блокировкой, затем N воркеров uvicorn
+
+    python -m src.serve [--workers N] [--no-migrate]
+'''
+import argparse
+import logging
+import math
+import os
+from pathlib import Path
+
+import uvicorn
+from alembic import command
+from alembic.config import Config
+
+from src.config import settings
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    # Учитываются привязка к ядрам и квота cgroup v2, которую выставляет docker --cpus
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    try:
+        quota, period = Path('/sys/fs/cgroup/cpu.max').read_text().split()
+        if quota != 'max':
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+def run_migrations():
+    # Блокировку берёт alembic/env.py, поэтому одновременно стартующие контейнеры
+    # мигрируют по очереди, а опоздавшие видят уже актуальную схему
+    config = Config(str(BASE_DIR / 'alembic.ini'))
+    config.set_main_option('script_location', str(BASE_DIR / 'alembic'))
+    command.upgrade(config, 'head')
+
+def main():
+    parser = argparse.ArgumentParser(description='Запуск сервера Car Factory')
+    parser.add_argument('--workers', type=int, default=settings.WEB_WORKERS,
+                        help='число процессов, 0 — по числу ядер')
+    parser.add_argument('--no-migrate', action='store_true', help='не выполнять alembic upgrade head')
+    args = parser.parse_args()
+    # Точка входа процесса: без настройки сообщения уровня INFO не выводятся
+    logging.basicConfig(level=logging.INFO)
+
+    if not args.no_migrate:
+        # В главном процессе до запуска воркеров: миграции выполняются один раз
+        run_migrations()
+
+    workers = args.workers or available_cpus()
+    # Пул соединений у каждого воркера свой
+    logger.info('Воркеров: %d, соединений с БД не больше %d',
+                workers, workers * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW))
+
+    uvicorn.run('src.main:app',
+                host=settings.WEB_HOST,
+                port=settings.WEB_PORT,
+                workers=workers,
+                loop='uvloop',
+                http='httptools',
+                proxy_headers=True,
+                # Сначала дожидаются текущие запросы, затем lifespan закрывает пул соединений
+                timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import asyncio
+import re
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+import asyncpg
+
+from src.config import settings
+from src.metrics import current_metrics
+
+
+# Сколько планов может ждать EXPLAIN; лишние медленные запросы остаются без плана
+EXPLAIN_QUEUE_SIZE = 16
+
+# SELECT, которые нельзя выполнять повторно ради ANALYZE: блокировки строк (захват задач,
+# пачки каскада и архивации) и функции с побочным эффектом. Для них только план без выполнения
+SIDE_EFFECTS = re.compile(r'''
+    \bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b
+    | \b(pg_(try_)?advisory\w*|pg_notify|nextval|setval|set_config|refresh_report_views)\s*\(
+''', re.IGNORECASE | re.VERBOSE)
+
+
+@dataclass
+class SlowQueryRecord:
+    statement: str
+    parameters: list[str]
+    route: str | None
+    duration_ms: float
+    recorded_at: datetime
+    plan: str | None = None
+
+
+def redact(parameters: Any, executemany: bool) -> list[str]:
+    # Значения могут содержать персональные данные, в журнал попадают только типы
+    if executemany:
+        return [f'executemany: {len(parameters)} наборов']
+    if isinstance(parameters, dict):
+        return [f'{key}: {type(value).__name__}' for key, value in parameters.items()]
+    return [type(value).__name__ for value in parameters or ()]
+
+def explain_options(statement: str) -> str | None:
+    # ANALYZE выполняет запрос, поэтому только SELECT; WITH может содержать изменяющие CTE
+    if statement.lstrip()[:6].upper() != 'SELECT':
+        return None
+    if SIDE_EFFECTS.search(statement):
+        return 'COSTS'
+    return 'ANALYZE, BUFFERS'
+
+
+class SlowQueryLog:
+    '''Кольцевой буфер медленных запросов с фоновым EXPLAIN на отдельном соединении asyncpg'''
+
+    def __init__(self, size: int, threshold_ms: float, explain: bool):
+        self.records: deque[SlowQueryRecord] = deque(maxlen=size)
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.queue: asyncio.Queue | None = None
+        self.task: asyncio.Task | None = None
+
+    def record(self, statement: str, parameters: Any, elapsed: float, executemany: bool):
+        # Вызывается из after_cursor_execute, поэтому только синхронные операции
+        if not self.threshold or elapsed < self.threshold:
+            return
+
+        metrics = current_metrics.get()
+        record = SlowQueryRecord(statement=statement,
+                                 parameters=redact(parameters, executemany),
+                                 route=metrics.route if metrics is not None else None,
+                                 duration_ms=round(elapsed * 1000, 3),
+                                 recorded_at=datetime.now(timezone.utc))
+        self.records.append(record)
+
+        options = explain_options(statement)
+        if self.queue is not None and not executemany and options is not None:
+            try:
+                # Настоящие значения параметров живут только до выполнения EXPLAIN
+                self.queue.put_nowait((record, statement, options, tuple(parameters or ())))
+            except asyncio.QueueFull:
+                pass
+
+    async def start(self):
+        if self.explain and self.threshold:
+            self.queue = asyncio.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+            self.task = asyncio.create_task(self.explain_worker())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            self.queue = None
+
+    async def explain_worker(self):
+        connection: asyncpg.Connection | None = None
+        try:
+            while True:
+                record, statement, options, parameters = await self.queue.get()
+                try:
+                    if connection is None or connection.is_closed():
+                        connection = await asyncpg.connect(
+                            user=settings.POSTGRES_USER,
+                            password=settings.POSTGRES_PASSWORD,
+                            host=settings.POSTGRES_HOST,
+                            port=settings.POSTGRES_PORT,
+                            database=settings.POSTGRES_NAME,
+                            server_settings={'statement_timeout': str(settings.DB_STATEMENT_TIMEOUT)},
+                        )
+                    # Транзакция всегда откатывается: EXPLAIN ANALYZE не должен ничего оставить
+                    transaction = connection.transaction(readonly=True)
+                    await transaction.start()
+                    try:
+                        rows = await connection.fetch(f'EXPLAIN ({options}) {statement}', *parameters)
+                    finally:
+                        await transaction.rollback()
+                    record.plan = '\n'.join(row[0] for row in rows)
+                except Exception as error:
+                    # Ошибка одного плана не должна останавливать воркер
+                    record.plan = f'EXPLAIN не выполнен: {error}'
+        finally:
+            if connection is not None:
+                await connection.close()
+
+
+slow_query_log = SlowQueryLog(size=settings.SLOW_QUERY_LOG_SIZE,
+                              threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+                              explain=settings.SLOW_QUERY_EXPLAIN)
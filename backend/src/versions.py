@@ -0,0 +1,71 @@
+import asyncio
+import logging
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import src.models as models
+from src.database import session_factory
+
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock: журнал сворачивает один процесс за раз
+COMPACT_LOCK = 721_004_008
+
+# Версии, уже прочитанные в транзакции (session.info): etag() и кэш справочников
+# спрашивают одно и то же, второй запрос не нужен
+VERSIONS_INFO = 'table_versions'
+
+
+def version_query(table_names: tuple[str, ...]):
+    # Версия — число зафиксированных изменяющих выражений: свернутая часть плюс журнал.
+    # Транзакция видит строки журнала только после commit писателя, поэтому версия
+    # меняется вместе с данными, а не раньше
+    folded = (select(func.coalesce(func.sum(models.TableVersion.version), 0))
+              .where(models.TableVersion.table_name.in_(table_names))
+              .scalar_subquery())
+    pending = (select(func.count())
+               .select_from(models.TableVersionChange)
+               .where(models.TableVersionChange.table_name.in_(table_names))
+               .scalar_subquery())
+    return select(folded + pending)
+
+async def table_version(db: AsyncSession, table_names: tuple[str, ...]) -> int:
+    versions = db.info.setdefault(VERSIONS_INFO, {})
+    if table_names not in versions:
+        versions[table_names] = await db.scalar(version_query(table_names))
+    return versions[table_names]
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_versions(session: Session, transaction):
+    session.info.pop(VERSIONS_INFO, None)
+
+async def compact(db: AsyncSession) -> bool:
+    # Сумма folded + pending не меняется: удаленные строки журнала и прибавка к версии
+    # фиксируются одной транзакцией. Писатели table_versions не трогают, блокировка строки
+    # версии ждет только другой свертки
+    locked = await db.scalar(select(func.pg_try_advisory_xact_lock(COMPACT_LOCK)))
+    if not locked:
+        return False
+
+    changes = models.TableVersionChange
+    folded = delete(changes).returning(changes.table_name).cte('folded')
+    counts = (select(folded.c.table_name, func.count().label('changes'))
+              .group_by(folded.c.table_name)
+              .cte('counts'))
+    await db.execute(update(models.TableVersion)
+                     .where(models.TableVersion.table_name == counts.c.table_name)
+                     .values(version=models.TableVersion.version + counts.c.changes))
+    return True
+
+async def compact_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db, db.begin():
+                await compact(db)
+        except Exception:
+            # Несвернутый журнал только растет, версии остаются верными; следующая попытка через interval
+            logger.exception('Не удалось свернуть журнал версий таблиц')